@@ -0,0 +1,91 @@
+#   -*- coding: utf-8 -*-
+""" measure wall time of skewed workloads split into fixed slices per process versus pool chunk scheduling and
+    longest processing time first ordering
+"""
+import json
+import time
+import random
+import logging
+import argparse
+from mpmq import MPmq
+
+logger = logging.getLogger(__name__)
+
+
+def get_costs(items, skew, seed, placement):
+    """ return item costs where a quarter of the items, at the front or back, are skew times more expensive
+    """
+    rng = random.Random(seed)
+    costs = [rng.uniform(.5, 1.5) * (skew if index < items // 4 else 1) for index in range(items)]
+    return costs if placement == 'front' else costs[::-1]
+
+
+def do_slice(costs=None, unit=None):
+    for cost in costs:
+        time.sleep(cost * unit)
+        logger.debug('processed item')
+
+
+def do_item(cost=None, unit=None):
+    time.sleep(cost * unit)
+    logger.debug('processed item')
+
+
+def run_mode(mode, costs, processes, unit):
+    if mode == 'slices':
+        size = -(-len(costs) // processes)
+        process_data = [{'costs': costs[index:index + size]} for index in range(0, len(costs), size)]
+        client = MPmq(function=do_slice, process_data=process_data, shared_data={'unit': unit})
+    elif mode in ('processes', 'processes-lpt'):
+        process_data = [{'cost': cost} for cost in costs]
+        client = MPmq(
+            function=do_item, process_data=process_data, shared_data={'unit': unit}, processes_to_start=processes,
+            cost=costs if mode == 'processes-lpt' else None)
+    else:
+        process_data = [{'cost': cost} for cost in costs]
+        client = MPmq(
+            function=do_item, process_data=process_data, shared_data={'unit': unit}, processes_to_start=processes,
+            pool=True, chunksize=mode.replace('-lpt', ''), cost=costs if mode.endswith('-lpt') else None)
+    start = time.perf_counter()
+    client.execute(raise_if_error=True)
+    return time.perf_counter() - start
+
+
+def run(processes, items, skew, unit, seed, placement, modes):
+    costs = get_costs(items, skew, seed, placement)
+    ideal = sum(costs) * unit / processes
+    results = []
+    for mode in modes:
+        wall_time = run_mode(mode, costs, processes, unit)
+        results.append({
+            'benchmark': 'load_balance',
+            'mode': mode,
+            'processes': processes,
+            'items': items,
+            'skew': skew,
+            'placement': placement,
+            'wall_time': wall_time,
+            'ideal_wall_time': ideal,
+            'efficiency': ideal / wall_time
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--items', type=int, default=400)
+    parser.add_argument('--skew', type=float, default=4)
+    parser.add_argument('--unit', type=float, default=.005)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--placement', choices=['front', 'back'], default='front')
+    parser.add_argument(
+        '--modes', default='slices,auto,guided',
+        help='comma separated list of slices, processes, processes-lpt, auto, auto-lpt, guided and guided-lpt')
+    args = parser.parse_args()
+    modes = args.modes.split(',')
+    print(json.dumps(run(args.processes, args.items, args.skew, args.unit, args.seed, args.placement, modes), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#   -*- coding: utf-8 -*-
+""" measure parent process CPU time spent per message dispatched by MPmq.run
+"""
+import json
+import time
+import logging
+import argparse
+from mpmq import MPmq
+
+logger = logging.getLogger(__name__)
+
+
+class CountingMPmq(MPmq):
+    def __init__(self, **kwargs):
+        super(CountingMPmq, self).__init__(**kwargs)
+        self.messages = 0
+
+    def process_message(self, offset, message):
+        self.messages += 1
+
+
+def do_work(messages=None, delay=None):
+    for index in range(messages):
+        logger.debug(f'processed item {index}')
+        time.sleep(delay)
+
+
+def run(processes, messages, delay, message_batch_size=None):
+    process_data = [{} for _ in range(processes)]
+    shared_data = {'messages': messages, 'delay': delay}
+    client = CountingMPmq(
+        function=do_work, process_data=process_data, shared_data=shared_data, message_batch_size=message_batch_size)
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    client.execute(raise_if_error=True)
+    cpu_time = time.process_time() - cpu_start
+    wall_time = time.perf_counter() - wall_start
+    return {
+        'benchmark': 'message_loop',
+        'processes': processes,
+        'messages_per_process': messages,
+        'delay': delay,
+        'message_batch_size': message_batch_size,
+        'messages': client.messages,
+        'wall_time': wall_time,
+        'parent_cpu_time': cpu_time,
+        'parent_cpu_time_per_message': cpu_time / client.messages if client.messages else None,
+        'parent_cpu_utilization': cpu_time / wall_time
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--delay', type=float, default=.01)
+    parser.add_argument('--message-batch-size', type=int, default=None)
+    args = parser.parse_args()
+    print(json.dumps(run(args.processes, args.messages, args.delay, message_batch_size=args.message_batch_size), indent=2))
+
+
+if __name__ == '__main__':
+    main()
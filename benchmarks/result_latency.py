@@ -0,0 +1,43 @@
+#   -*- coding: utf-8 -*-
+""" measure the time between the last worker producing its result and MPmq.execute returning
+"""
+import json
+import time
+import argparse
+from mpmq import MPmq
+
+
+def do_work(duration=None):
+    time.sleep(duration)
+    # wall clock time is comparable across processes
+    return time.time()
+
+
+def run(processes, duration, pool):
+    process_data = [{} for _ in range(processes)]
+    client = MPmq(function=do_work, process_data=process_data, shared_data={'duration': duration}, pool=pool)
+    start = time.perf_counter()
+    results = client.execute(raise_if_error=True)
+    returned = time.time()
+    wall_time = time.perf_counter() - start
+    return {
+        'benchmark': 'result_latency',
+        'processes': processes,
+        'duration': duration,
+        'pool': pool,
+        'wall_time': wall_time,
+        'latency_after_last_result': returned - max(results)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=.1)
+    parser.add_argument('--pool', action='store_true')
+    args = parser.parse_args()
+    print(json.dumps(run(args.processes, args.duration, args.pool), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+#   -*- coding: utf-8 -*-
+""" measure result transfer throughput through the result queue and through shared memory across result sizes
+"""
+import json
+import time
+import argparse
+from mpmq import MPmq
+
+
+def do_work(size=None):
+    return b'X' * size
+
+
+def run(processes, size, result_threshold):
+    process_data = [{} for _ in range(processes)]
+    client = MPmq(
+        function=do_work,
+        process_data=process_data,
+        shared_data={'size': size},
+        result_threshold=result_threshold)
+    start = time.perf_counter()
+    results = client.execute(raise_if_error=True)
+    wall_time = time.perf_counter() - start
+    total = sum(len(result) for result in results)
+    return {
+        'benchmark': 'result_transfer',
+        'processes': processes,
+        'result_size': size,
+        'result_threshold': result_threshold,
+        'wall_time': wall_time,
+        'throughput_mb_per_second': total / wall_time / 1_000_000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 1_000_000, 10_000_000, 100_000_000])
+    parser.add_argument('--threshold', type=int, default=1_000_000)
+    args = parser.parse_args()
+    results = []
+    for size in args.sizes:
+        for result_threshold in (None, args.threshold):
+            results.append(run(args.processes, size, result_threshold))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
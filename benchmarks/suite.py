@@ -0,0 +1,169 @@
+#   -*- coding: utf-8 -*-
+""" measure MPmq.execute throughput and latency across a matrix of tasks, processes, messages per task, result size,
+    shared_data size and process start methods; results are written as json so runs can be compared for regressions
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import itertools
+import multiprocessing
+from importlib import metadata
+from mpmq import MPmq
+
+logger = logging.getLogger(__name__)
+
+BASELINE = {
+    'tasks': 32,
+    'processes': 4,
+    'messages': 100,
+    'result_size': 1_000,
+    'shared_size': 1_000,
+    'start_method': 'fork'
+}
+
+MATRIX = {
+    'tasks': [8, 32, 128],
+    'processes': [1, 4, 8],
+    'messages': [0, 100, 1_000],
+    'result_size': [0, 1_000, 1_000_000],
+    'shared_size': [0, 1_000, 10_000_000],
+    'start_method': ['fork', 'spawn', 'forkserver']
+}
+
+
+class CountingMPmq(MPmq):
+    def __init__(self, **kwargs):
+        super(CountingMPmq, self).__init__(**kwargs)
+        self.messages = 0
+
+    def process_message(self, offset, message):
+        self.messages += 1
+
+
+def do_task(messages=None, result_size=None, blob=None):
+    for index in range(messages):
+        logger.debug(f'processed message {index}')
+    return bytes(result_size)
+
+
+def get_cases(full, start_methods):
+    """ return list of parameter dictionaries to run
+        unless full each parameter is varied on its own around the baseline
+    """
+    matrix = dict(MATRIX, start_method=start_methods)
+    if full:
+        return [dict(zip(matrix, values)) for values in itertools.product(*matrix.values())]
+    baseline = dict(BASELINE)
+    if baseline['start_method'] not in start_methods:
+        baseline['start_method'] = start_methods[0]
+    cases = []
+    for name, values in matrix.items():
+        for value in values:
+            case = dict(baseline)
+            case[name] = value
+            if case not in cases:
+                cases.append(case)
+    return cases
+
+
+def run_case(case, repeat):
+    """ return measurements of executing case repeat times, times are the median of the repeats
+    """
+    process_data = [{'messages': case['messages'], 'result_size': case['result_size']} for _ in range(case['tasks'])]
+    shared_data = {'blob': bytes(case['shared_size'])}
+    runs = []
+    for _ in range(repeat):
+        client = CountingMPmq(
+            function=do_task, process_data=process_data, shared_data=shared_data, processes_to_start=case['processes'],
+            start_method=case['start_method'])
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        client.execute(raise_if_error=True)
+        wall_time = time.perf_counter() - wall_start
+        cpu_time = time.process_time() - cpu_start
+        metrics = client.metrics()
+        processes = metrics['processes'].values()
+        runs.append({
+            'wall_time': wall_time,
+            'parent_cpu_time': cpu_time,
+            'throughput': case['tasks'] / wall_time,
+            'messages_received': client.messages,
+            'mean_run_time': sum(process['run_time'] for process in processes) / case['tasks'],
+            'mean_start_latency': sum(process['start_latency'] or 0 for process in processes) / case['tasks'],
+            'mean_queue_wait': sum(process['queue_wait'] for process in processes) / case['tasks'],
+            'max_rss': metrics['summary']['max_rss']
+        })
+    measurements = {key: sorted(run[key] for run in runs)[len(runs) // 2] for key in runs[0]}
+    return dict(benchmark='suite', repeat=repeat, **case, **measurements)
+
+
+def compare(results, baseline, tolerance):
+    """ return list of regressions where the throughput of a case dropped by more than tolerance from the baseline
+    """
+    baseline_throughput = {
+        tuple(result[name] for name in MATRIX): result['throughput'] for result in baseline['results']
+    }
+    regressions = []
+    for result in results:
+        previous = baseline_throughput.get(tuple(result[name] for name in MATRIX))
+        if previous and result['throughput'] < previous * (1 - tolerance):
+            regressions.append({
+                'case': {name: result[name] for name in MATRIX},
+                'baseline_throughput': previous,
+                'throughput': result['throughput']
+            })
+    return regressions
+
+
+def get_environment():
+    """ return dictionary describing the environment the suite was run in
+    """
+    try:
+        version = metadata.version('mpmq')
+    except metadata.PackageNotFoundError:
+        version = None
+    return {
+        'mpmq': version,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpu_count': multiprocessing.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z')
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--full', action='store_true', help='run the full cartesian product of the matrix')
+    parser.add_argument('--repeat', type=int, default=3, help='number of times each case is executed')
+    parser.add_argument(
+        '--start-methods', nargs='+', default=multiprocessing.get_all_start_methods(),
+        choices=multiprocessing.get_all_start_methods())
+    parser.add_argument('--output', help='file to write json results to, defaults to stdout')
+    parser.add_argument('--baseline', help='json results of an earlier run to check the throughput of each case against')
+    parser.add_argument(
+        '--tolerance', type=float, default=.2, help='fraction the throughput of a case may drop below the baseline')
+    args = parser.parse_args()
+    results = []
+    for case in get_cases(args.full, args.start_methods):
+        print(f'running {case}', file=sys.stderr)
+        results.append(run_case(case, args.repeat))
+    report = {'environment': get_environment(), 'results': results}
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            report['regressions'] = compare(results, json.load(baseline), args.tolerance)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(json.dumps(report, indent=2) + '\n')
+    else:
+        print(json.dumps(report, indent=2))
+    if report.get('regressions'):
+        print(f"{len(report['regressions'])} cases regressed beyond the tolerance", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -19,16 +19,40 @@ from os import getenv
 
 __all__ = [
     'MPmq',
-    'queue_handler'
+    'ProcessLost',
+    'AsyncMPmq',
+    'Session',
+    'Checkpoint',
+    'ResultCache',
+    'queue_handler',
+    'stop_requested'
 ]
 
 def __getattr__(name):
     if name == 'MPmq':
         from .mpmq import MPmq
         return MPmq
+    if name == 'ProcessLost':
+        from .mpmq import ProcessLost
+        return ProcessLost
+    if name == 'AsyncMPmq':
+        from .aio import AsyncMPmq
+        return AsyncMPmq
+    if name == 'Session':
+        from .session import Session
+        return Session
+    if name == 'Checkpoint':
+        from .checkpoint import Checkpoint
+        return Checkpoint
+    if name == 'ResultCache':
+        from .cache import ResultCache
+        return ResultCache
     if name == 'queue_handler':
         from .handler import queue_handler
         return queue_handler
+    if name == 'stop_requested':
+        from .handler import stop_requested
+        return stop_requested
 
     # If the requested attribute isn't one of the known top-level symbols,
     # try to lazily import a submodule (e.g. `thread_order.scheduler`) so
@@ -0,0 +1,101 @@
+
+# Copyright (c) 2021 Intel Corporation
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#      http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import logging
+from queue import Empty
+from concurrent.futures import ThreadPoolExecutor
+
+from .mpmq import MPmq
+from .mpmq import NoActiveProcesses
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncMPmq(MPmq):
+    """ MPmq that is driven from an asyncio event loop
+        the blocking waits on the message and result queues run on a dedicated thread so the event loop is never
+        blocked and can drive several jobs at once
+    """
+    def __init__(self, function, **kwargs):
+        """ AsyncMPmq constructor
+        """
+        super(AsyncMPmq, self).__init__(function, **kwargs)
+        # a single thread serializes all calls into the MPmq state machine
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mpmq')
+        self.started = False
+        self.completed = False
+
+    async def call(self, function, *args):
+        """ run function on the executor thread and return its result
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def messages(self):
+        """ async generator of (offset, message) tuples for the log messages sent by the processes
+            processes are started on first iteration and the generator ends once all processes have completed
+            breaking out of the iteration leaves the processes running, iterating again resumes where it left off
+        """
+        if not self.started:
+            self.started = True
+            await self.call(self.start_processes)
+        while not self.completed:
+            try:
+                await self.call(self.check_processes)
+                message = await self.call(self.get_message)
+                if message['control']:
+                    await self.call(self.process_control_message, message['offset'], message['control'])
+                    continue
+            except Empty:
+                # no message arrived within the wait timeout
+                continue
+            except NoActiveProcesses:
+                logger.info('there are no more active processses - quitting')
+                self.completed = True
+                await self.call(self.stop)
+                continue
+            yield message['offset'], message['message']
+
+    async def execute_async(self, raise_if_error=False):
+        """ public execute api for asyncio
+            log messages not consumed through messages are passed to process_message
+            returns the results of all processes ordered by offset
+        """
+        return await self.results(raise_if_error=raise_if_error)
+
+    async def results(self, raise_if_error=False):
+        """ return the results of all processes ordered by offset once they have completed
+            processes are started if messages was not iterated, log messages not consumed through messages are passed
+            to process_message
+        """
+        try:
+            async for offset, message in self.messages():
+                self.process_message(offset, message)
+            results = await self.call(self.get_results)
+            if raise_if_error:
+                self.check_results(results)
+            return results
+
+        except asyncio.CancelledError:
+            logger.info('execution cancelled - killing all active processes')
+            await self.call(self.terminate_processes)
+            raise
+
+        finally:
+            self.leave_session()
+            self.close_checkpoint()
+            self.release_shared_memory()
+            self.final()
+            self.executor.shutdown(wait=False)
@@ -0,0 +1,140 @@
+
+# Copyright (c) 2021 Intel Corporation
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#      http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+# only files written by mpmq itself are unpickled
+import pickle  # nosec B403
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# default maximum total size in bytes of the cached results
+CACHE_MAX_SIZE = 1024 ** 3
+CACHE_SUFFIX = '.pickle'
+# fraction of max_size the cache is evicted down to so eviction does not run again on the next result
+CACHE_LOW_WATER = .9
+
+
+def get_digest(*values):
+    """ return stable digest of the pickled values
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    for value in values:
+        digest.update(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    return digest.hexdigest()
+
+
+class ResultCache():
+    """ directory of function results keyed by a digest of the function, its version, shared_data and process_data
+        each result is stored in its own file; once the total size of the files exceeds max_size the least recently
+        used results are evicted until it is below CACHE_LOW_WATER of max_size, a file's modification time records
+        when it was last used
+    """
+    def __init__(self, directory, max_size=CACHE_MAX_SIZE, version=None):
+        """ ResultCache constructor
+        """
+        if not isinstance(max_size, int) or max_size < 1:
+            raise ValueError('max_size must be a positive integer')
+        self.directory = directory
+        self.max_size = max_size
+        self.version = version
+        # (size, last used time) of the cached results by file name, built when the cache is first used
+        self.index = None
+        self.size = 0
+
+    def get_namespace(self, function, shared_data):
+        """ return digest identifying the results of function executed with shared_data
+        """
+        return get_digest(f'{function.__module__}.{function.__qualname__}', self.version, shared_data)
+
+    @staticmethod
+    def get_key(namespace, process_data):
+        """ return key of the result of process_data within namespace
+        """
+        return get_digest(namespace, process_data)
+
+    def get_path(self, key):
+        """ return path of the file of key
+        """
+        return os.path.join(self.directory, f'{key}{CACHE_SUFFIX}')
+
+    def load_index(self):
+        """ build the index of the cached results from the cache directory
+        """
+        if self.index is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self.index = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(CACHE_SUFFIX) and entry.is_file():
+                    stat = entry.stat()
+                    self.index[entry.name] = (stat.st_size, stat.st_mtime)
+        self.size = sum(size for (size, _) in self.index.values())
+        logger.debug(f'cache {self.directory} has {len(self.index)} results of {self.size} bytes')
+
+    def get(self, key):
+        """ return tuple of True and the cached result of key or False and None if it is not cached
+        """
+        self.load_index()
+        path = self.get_path(key)
+        try:
+            with open(path, 'rb') as file:
+                # the file was written by ResultCache.put of this or an earlier execution
+                result = pickle.load(file)  # nosec B301
+            # mark the result as recently used
+            os.utime(path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return (False, None)
+        name = os.path.basename(path)
+        if name in self.index:
+            self.index[name] = (self.index[name][0], os.path.getmtime(path))
+        return (True, result)
+
+    def put(self, key, result):
+        """ cache result of key and evict the least recently used results if the cache is full
+        """
+        self.load_index()
+        path = self.get_path(key)
+        data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_size:
+            logger.debug(f'result of {len(data)} bytes is larger than the cache')
+            return
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(data)
+        os.replace(temporary, path)
+        name = os.path.basename(path)
+        (previous, _) = self.index.get(name, (0, None))
+        self.index[name] = (len(data), os.path.getmtime(path))
+        self.size += len(data) - previous
+        if self.size > self.max_size:
+            self.evict()
+
+    def evict(self):
+        """ remove the least recently used results until the cache is below the low water mark
+        """
+        for name in sorted(self.index, key=lambda name: self.index[name][1]):
+            if self.size <= self.max_size * CACHE_LOW_WATER:
+                break
+            (size, _) = self.index.pop(name)
+            self.size -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                # evicted by another job sharing the cache
+                pass
+            logger.debug(f'evicted cached result {name} of {size} bytes')
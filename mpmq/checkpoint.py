@@ -0,0 +1,116 @@
+
+# Copyright (c) 2021 Intel Corporation
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#      http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import time
+# only files written by mpmq itself are unpickled
+import pickle  # nosec B403
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# default number of results buffered before they are written to the checkpoint file
+CHECKPOINT_BATCH_SIZE = 100
+# default maximum number of seconds a result is buffered before it is written to the checkpoint file
+CHECKPOINT_INTERVAL = 1
+
+
+class Checkpoint():
+    """ append-only file of the results of completed process_data offsets so an interrupted execution can be resumed
+        each record is a pickled (offset, digest, result) tuple where digest identifies the process_data element the
+        result was computed from; results are buffered and appended in batches of batch_size records or interval
+        seconds after the last write, whichever comes first
+    """
+    def __init__(self, path, batch_size=CHECKPOINT_BATCH_SIZE, interval=CHECKPOINT_INTERVAL):
+        """ Checkpoint constructor
+        """
+        if not isinstance(batch_size, int) or batch_size < 1:
+            raise ValueError('batch_size must be a positive integer')
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self.buffer = []
+        self.file = None
+        self.write_time = time.monotonic()
+
+    @staticmethod
+    def get_digest(process_data):
+        """ return digest identifying process_data
+        """
+        return hashlib.blake2b(pickle.dumps(process_data, protocol=pickle.HIGHEST_PROTOCOL), digest_size=16).hexdigest()
+
+    def load(self):
+        """ return dictionary of (digest, result) tuples by offset of the results in the checkpoint file
+            a record cut short by an interruption is removed from the file
+        """
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+        position = 0
+        with open(self.path, 'rb') as file:
+            while True:
+                try:
+                    # the file was written by this or an earlier execution of the same job
+                    (offset, digest, result) = pickle.load(file)  # nosec B301
+                except EOFError:
+                    break
+                except (pickle.UnpicklingError, ValueError, TypeError):
+                    break
+                records[offset] = (digest, result)
+                position = file.tell()
+        if position < os.path.getsize(self.path):
+            logger.warning(f'truncating incomplete record at position {position} of checkpoint {self.path}')
+            os.truncate(self.path, position)
+        logger.debug(f'loaded {len(records)} results from checkpoint {self.path}')
+        return records
+
+    def add(self, offset, process_data, result):
+        """ buffer result of the process_data element at offset and write the batch if it is full
+        """
+        self.buffer.append((offset, self.get_digest(process_data), result))
+        if len(self.buffer) >= self.batch_size:
+            self.write()
+        else:
+            self.write_if_due()
+
+    def write_if_due(self):
+        """ write the buffered results if the oldest was buffered interval seconds ago
+        """
+        if self.buffer and time.monotonic() - self.write_time >= self.interval:
+            self.write()
+
+    def write(self):
+        """ append the buffered results to the checkpoint file as a single write
+        """
+        self.write_time = time.monotonic()
+        if not self.buffer:
+            return
+        if not self.file:
+            self.file = open(self.path, 'ab')
+        data = b''.join(pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL) for record in self.buffer)
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        logger.debug(f'wrote {len(self.buffer)} results to checkpoint {self.path}')
+        self.buffer = []
+
+    def close(self):
+        """ write any buffered results and close the checkpoint file
+        """
+        self.write()
+        if self.file:
+            self.file.close()
+            self.file = None
@@ -13,57 +13,284 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
 import logging
+import threading
+from queue import Full
 from logging import Handler
 from functools import wraps
+from collections import deque
+
+from .shared import attach_arguments
+from .shared import share_result
+from .metrics import get_usage
+from .metrics import get_usage_since
 
 logger = logging.getLogger(__name__)
 
+# message records put on the message queue are tuples of (offset, level, kind, payload, timestamp)
+LOG_MESSAGE = 0
+CONTROL_MESSAGE = 1
+DONE = 'DONE'
+ERROR = 'ERROR'
+# sent by the parent to itself when a session process slot may be available
+START = 'START'
+# default maximum number of seconds a log message record is held by BufferedQueueHandler before it is sent
+MESSAGE_BATCH_INTERVAL = .1
+# policies applied to log message records when a bounded message queue is full
+# BLOCK waits for room, DROP_OLDEST holds the latest records and drops the oldest, SAMPLE is a tail drop of the new
+# records
+BLOCK = 'block'
+DROP_OLDEST = 'drop_oldest'
+SAMPLE = 'sample'
+MESSAGE_POLICIES = (BLOCK, DROP_OLDEST, SAMPLE)
+# event set by the parent when MPmq is executed with fail_fast and a process failed
+stop_event = None
+
+
+def stop_requested():
+    """ return True if the functions running in the worker processes were asked to stop because a process failed
+        functions executed with fail_fast should poll it and return early when it is set
+    """
+    return stop_event is not None and stop_event.is_set()
+
+
+def set_stop_event(event):
+    """ set the event polled by stop_requested in this worker process
+    """
+    global stop_event
+    stop_event = event
+
+
+def put_control_message(message_queue, offset, control, block=True):
+    """ put control message record for offset on message queue
+        raises Full if block is not set and the bounded message queue is full
+    """
+    record = (offset, None, CONTROL_MESSAGE, control, time.time())
+    if block:
+        message_queue.put(record)
+    else:
+        message_queue.put_nowait(record)
+
 
 class QueueHandler(Handler):
     """ subclass Handler enabling log messages to be sent to message queue
+        the handler stays installed between executions, records are only sent while offset is set
+        if the message queue is bounded the message policy decides what happens to records when it is full: BLOCK
+        waits for room, DROP_OLDEST holds up to max_messages records sending them as room frees and dropping the oldest,
+        SAMPLE is a tail drop that drops new records until there is room; control messages are not sent by the handler
+        and are never dropped
     """
-    def __init__(self, message_queue, offset):
+    def __init__(self, message_queue, offset, message_policy=BLOCK, max_messages=None):
         super(QueueHandler, self).__init__()
         self.message_queue = message_queue
         self.offset = offset
+        self.message_policy = message_policy
+        # records waiting for room on the message queue with the DROP_OLDEST policy
+        self.pending = deque()
+        self.max_pending = max_messages or 1
+        # number of log message records dropped since the last call to drain
+        self.dropped = 0
 
     def emit(self, record):
-        message = record.msg
+        """ put log message record on message queue, formatting is deferred to the consumer
+        """
+        if self.offset is None:
+            return
+        self.send((self.offset, record.levelno, LOG_MESSAGE, str(record.msg), record.created))
 
-        if record.levelno >= 40:
-            message = f'ERROR: {message}'
-        elif record.levelno >= 30:
-            message = f'WARN: {message}'
-        elif record.levelno == 20:
-            message = f'INFO: {message}'
+    @staticmethod
+    def count(item):
+        """ return number of log message records in item, a record or a batch of records
+        """
+        return len(item) if isinstance(item, list) else 1
 
-        message = f'#{self.offset}-{message}'
-        self.message_queue.put(message)
+    def send(self, item):
+        """ put item on message queue applying the message policy if the queue is full
+        """
+        if self.message_policy == BLOCK:
+            self.message_queue.put(item)
+            return
+        if self.message_policy == DROP_OLDEST:
+            # records already waiting are sent first to keep the records in order
+            self.send_pending()
+            if self.pending:
+                self.hold(item)
+                return
+        try:
+            self.message_queue.put(item, block=False)
+        except Full:
+            if self.message_policy == DROP_OLDEST:
+                self.hold(item)
+            else:
+                self.dropped += self.count(item)
+
+    def hold(self, item):
+        """ add item to the records waiting for room dropping the oldest records if there are too many
+        """
+        self.pending.append(item)
+        while len(self.pending) > self.max_pending:
+            self.dropped += self.count(self.pending.popleft())
+
+    def send_pending(self):
+        """ put the records waiting for room on message queue until it is full
+        """
+        while self.pending:
+            try:
+                self.message_queue.put(self.pending[0], block=False)
+            except Full:
+                return
+            self.pending.popleft()
+
+    def drain(self):
+        """ send the records held for room on message queue, waiting for room since they are the latest records
+            return the number of log message records dropped since the last drain
+        """
+        with self.lock:
+            # at most max_messages records are held and the control message that follows waits for room anyway
+            while self.pending:
+                self.message_queue.put(self.pending.popleft())
+            dropped = self.dropped
+            self.dropped = 0
+            return dropped
 
 
-def queue_handler(function):
+class LoggerFilter(logging.Filter):
+    """ filter log records by the name of the logger that created them
+        a logger name matches a name in include or exclude if it is the same logger or one of its children
+    """
+    def __init__(self, include=None, exclude=None):
+        super(LoggerFilter, self).__init__()
+        self.include = tuple(include) if include else ()
+        self.exclude = tuple(exclude) if exclude else ()
+
+    @staticmethod
+    def matches(name, names):
+        """ return True if logger name is one of names or a child of one of them
+        """
+        return any(name == match or name.startswith(f'{match}.') for match in names)
+
+    def filter(self, record):
+        """ return True if the record should be sent to the message queue
+        """
+        if self.include and not self.matches(record.name, self.include):
+            return False
+        return not self.matches(record.name, self.exclude)
+
+
+class BufferedQueueHandler(QueueHandler):
+    """ QueueHandler that sends log message records to the message queue in batches
+        a batch is sent as a list of records when it reaches batch_size records or interval seconds after its first
+        record was buffered, whichever comes first
+    """
+    def __init__(self, message_queue, offset, batch_size, interval=MESSAGE_BATCH_INTERVAL, message_policy=BLOCK,
+                 max_messages=None):
+        super(BufferedQueueHandler, self).__init__(
+            message_queue, offset, message_policy=message_policy, max_messages=max_messages)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.buffer = []
+        self.timer = None
+
+    def emit(self, record):
+        """ add log message record to buffer and send the batch if it is full
+        """
+        if self.offset is None:
+            return
+        with self.lock:
+            self.buffer.append((self.offset, record.levelno, LOG_MESSAGE, str(record.msg), record.created))
+            if len(self.buffer) >= self.batch_size:
+                self.flush()
+            elif not self.timer:
+                self.timer = threading.Timer(self.interval, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        """ send buffered log message records to message queue as a single batch
+        """
+        with self.lock:
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+            if self.buffer:
+                self.send(self.buffer)
+                self.buffer = []
+
+    def close(self):
+        """ send any buffered log message records and close handler
+        """
+        self.flush()
+        super(BufferedQueueHandler, self).close()
+
+
+def queue_handler(function, result_threshold=None, message_batch_size=None, message_batch_interval=MESSAGE_BATCH_INTERVAL,
+                  message_level=logging.DEBUG, include_loggers=None, exclude_loggers=None, message_policy=BLOCK,
+                  max_messages=None):
     """ adds QueueHandler to rootLogger in order to send log messages to a message queue
+        results whose length is at least result_threshold are passed through shared memory instead of the result queue
+        if message_batch_size is set log messages are sent in batches of up to message_batch_size records
+        only log messages of at least message_level from loggers in include_loggers and not in exclude_loggers are sent
+        the handler is installed on the first call and reused by later calls with the same message queue, such as the
+        tasks executed by a pool worker; only its offset changes between calls, so outside of a worker process the
+        handler stays on rootLogger until remove_handler of the decorated function is called
+        message_policy is applied to log messages when the message queue bounded to max_messages is full, the number
+        of messages dropped by a call is added to its result
     """
+    log_formatter = logging.Formatter('%(asctime)s %(processName)s %(name)s [%(funcName)s] %(levelname)s %(message)s')
+    handler = None
+
+    def install_handler(message_queue):
+        """ return handler for message queue adding it to rootLogger unless already installed
+        """
+        nonlocal handler
+        if handler and handler.message_queue is message_queue:
+            return handler
+        root_logger = logging.getLogger()
+        if handler:
+            root_logger.removeHandler(handler)
+            handler.close()
+        logger.debug(f"configuring message queue log handler for '{function.__name__}'")
+        if message_batch_size:
+            handler = BufferedQueueHandler(
+                message_queue, None, message_batch_size, interval=message_batch_interval, message_policy=message_policy,
+                max_messages=max_messages)
+        else:
+            handler = QueueHandler(message_queue, None, message_policy=message_policy, max_messages=max_messages)
+        handler.setFormatter(log_formatter)
+        handler.setLevel(message_level)
+        if include_loggers or exclude_loggers:
+            handler.addFilter(LoggerFilter(include=include_loggers, exclude=exclude_loggers))
+        root_logger.addHandler(handler)
+        # records below message_level are not created at all
+        root_logger.setLevel(message_level)
+        return handler
+
+    def remove_handler():
+        """ remove the handler from rootLogger, the next call with a message queue installs it again
+        """
+        nonlocal handler
+        if not handler:
+            return
+        logging.getLogger().removeHandler(handler)
+        handler.close()
+        handler = None
 
     @wraps(function)
     def _queue_handler(*args, **kwargs):
         """ internal decorator for message queue handler
         """
-        root_logger = logging.getLogger()
-
         offset = kwargs.pop('offset', 0)
         message_queue = kwargs.pop('message_queue', None)
         result_queue = kwargs.pop('result_queue', None)
+        event = kwargs.pop('stop_event', None)
+        if event is not None:
+            set_stop_event(event)
         result = None
         if message_queue:
-            logger.debug(f"configuring message queue log handler for '{function.__name__}' offset:{offset}")
-            handler = QueueHandler(message_queue, offset)
-            log_formatter = logging.Formatter('%(asctime)s %(processName)s %(name)s [%(funcName)s] %(levelname)s %(message)s')
-            handler.setFormatter(log_formatter)
-            root_logger.addHandler(handler)
-            root_logger.setLevel(logging.DEBUG)
+            install_handler(message_queue).offset = offset
 
+        usage = get_usage() if result_queue is not None else None
         try:
             result = function(*args, **kwargs)
             return result
@@ -71,36 +298,82 @@ def queue_handler(function):
         except Exception as exception:
             result = exception
             logger.error(str(exception), exc_info=True)
-            # log control message that an error occurred
-            logger.debug('ERROR')
+            # send control message that an error occurred
+            if message_queue:
+                handler.flush()
+                put_control_message(message_queue, offset, ERROR)
 
         finally:
-            # add result to result queue with offset index
-            if result_queue:
+            if result_queue is not None:
                 logger.debug(f"adding '{function.__name__}' offset:{offset} result to result queue")
-                result_queue.put({
-                    'offset': offset,
-                    'result': result
-                })
             logger.debug(f'execution of {function.__name__} offset:{offset} ended')
-            # log control message that method completed
-            logger.debug('DONE')
+            dropped = None
+            if message_queue:
+                # send any buffered log messages ahead of the control message that method completed
+                handler.flush()
+                handler.offset = None
+                if message_policy != BLOCK:
+                    # counted after the last log message of the call so the count is complete
+                    dropped = handler.drain()
+            # add result to result queue with offset index
+            if result_queue is not None:
+                record = {
+                    'offset': offset,
+                    'result': share_result(result, result_threshold),
+                    'usage': get_usage_since(usage)
+                }
+                if dropped is not None:
+                    record['dropped'] = dropped
+                result_queue.put(record)
             if message_queue:
-                root_logger.removeHandler(handler)
+                put_control_message(message_queue, offset, DONE)
 
+    _queue_handler.remove_handler = remove_handler
     return _queue_handler
 
 
 class QueueHandlerDecorator():
     """ QueueHandlerDecorator to facilitate pickling of decorated functions with multiprocessing
     """
-    def __init__(self, function):
+    def __init__(self, function, result_threshold=None, message_batch_size=None, message_batch_interval=MESSAGE_BATCH_INTERVAL,
+                 message_level=logging.DEBUG, include_loggers=None, exclude_loggers=None, message_policy=BLOCK,
+                 max_messages=None):
         """ class constructor
         """
         self.function = function
+        self.result_threshold = result_threshold
+        self.message_batch_size = message_batch_size
+        self.message_batch_interval = message_batch_interval
+        self.message_level = message_level
+        self.include_loggers = include_loggers
+        self.exclude_loggers = exclude_loggers
+        self.message_policy = message_policy
+        self.max_messages = max_messages
+        # decorated function is created once per process on first call
+        self.decorated = None
+
+    def __getstate__(self):
+        """ exclude the decorated function from pickling, each process decorates the function itself
+        """
+        state = self.__dict__.copy()
+        state['decorated'] = None
+        return state
 
     def __call__(self, *args, **kwargs):
-        """ decorate function with queue handler
+        """ call function decorated with queue handler
+            any shared memory handles in the arguments are replaced by their zero-copy views
         """
-        logger.debug(f'decorating function {self.function.__name__} with queue_handler')
-        return queue_handler(self.function)(*args, **kwargs)
+        if not self.decorated:
+            logger.debug(f'decorating function {self.function.__name__} with queue_handler')
+            self.decorated = queue_handler(
+                self.function,
+                result_threshold=self.result_threshold,
+                message_batch_size=self.message_batch_size,
+                message_batch_interval=self.message_batch_interval,
+                message_level=self.message_level,
+                include_loggers=self.include_loggers,
+                exclude_loggers=self.exclude_loggers,
+                message_policy=self.message_policy,
+                max_messages=self.max_messages)
+        (args, kwargs) = attach_arguments(args, kwargs)
+        return self.decorated(*args, **kwargs)
@@ -0,0 +1,110 @@
+
+# Copyright (c) 2021 Intel Corporation
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#      http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import logging
+
+try:
+    import resource
+except ImportError:
+    # resource usage is not available on windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_METRICS = [
+    ('completed', 'mpmq_processes_completed_total', 'counter', 'Number of completed processes.'),
+    ('active', 'mpmq_processes_active', 'gauge', 'Number of active processes.'),
+    ('wall_time', 'mpmq_wall_time_seconds', 'gauge', 'Seconds since the first process was started.'),
+    ('queue_wait', 'mpmq_queue_wait_seconds_total', 'counter', 'Seconds completed processes waited in the process queue.'),
+    ('run_time', 'mpmq_run_time_seconds_total', 'counter', 'Seconds from start to completion of completed processes.'),
+    ('cpu_time', 'mpmq_cpu_time_seconds_total', 'counter', 'CPU seconds used by the function across all processes.'),
+    ('max_rss', 'mpmq_max_rss_bytes', 'gauge', 'Largest maximum resident set size of any process.'),
+    ('cache_hits', 'mpmq_cache_hits_total', 'counter', 'Number of results found in the result cache.'),
+    ('cache_misses', 'mpmq_cache_misses_total', 'counter', 'Number of results not found in the result cache.'),
+    ('dropped_messages', 'mpmq_dropped_messages_total', 'counter', 'Number of log messages dropped by the message policy.')
+]
+
+PROCESS_METRICS = [
+    ('queue_wait', 'mpmq_process_queue_wait_seconds', 'Seconds the process waited in the process queue.'),
+    ('start_latency', 'mpmq_process_start_latency_seconds', 'Seconds from start to the first message of the process.'),
+    ('run_time', 'mpmq_process_run_time_seconds', 'Seconds from start to completion of the process.'),
+    ('cpu_time', 'mpmq_process_cpu_time_seconds', 'CPU seconds used by the function of the process.'),
+    ('max_rss', 'mpmq_process_max_rss_bytes', 'Maximum resident set size of the process.')
+]
+
+WORKER_METRICS = [
+    ('tasks', 'mpmq_worker_tasks_total', 'counter', 'Number of process_data elements executed by the pool worker.'),
+    ('cpu_time', 'mpmq_worker_cpu_time_seconds_total', 'counter', 'CPU seconds used by the function in the pool worker.'),
+    ('max_rss', 'mpmq_worker_max_rss_bytes', 'gauge', 'Maximum resident set size of the pool worker.')
+]
+
+
+def get_usage():
+    """ return tuple of the cpu time in seconds and the maximum resident set size in bytes of this process
+        return None if resource usage is not available
+    """
+    if not resource:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss is in bytes on macos and in kilobytes elsewhere
+    max_rss = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    return (usage.ru_utime + usage.ru_stime, max_rss)
+
+
+def get_usage_since(start):
+    """ return dictionary of the pid, the cpu time used since start usage and the maximum resident set size of this
+        process or None if resource usage is not available
+    """
+    stop = get_usage()
+    if not start or not stop:
+        return None
+    return {
+        'pid': os.getpid(),
+        'cpu_time': stop[0] - start[0],
+        'max_rss': stop[1]
+    }
+
+
+def get_seconds(start, stop):
+    """ return seconds elapsed between start and stop nanosecond timestamps or None if either is not set
+    """
+    if start is None or stop is None:
+        return None
+    return (stop - start) / 1e9
+
+
+def format_prometheus(metrics):
+    """ return metrics formatted in the prometheus text exposition format
+    """
+    lines = []
+    for (key, name, metric_type, description) in SUMMARY_METRICS:
+        value = metrics['summary'].get(key)
+        if value is None:
+            continue
+        lines.extend([f'# HELP {name} {description}', f'# TYPE {name} {metric_type}', f'{name} {value}'])
+    for (key, name, description) in PROCESS_METRICS:
+        samples = [
+            f'{name}{{offset="{offset}"}} {process[key]}'
+            for offset, process in metrics['processes'].items() if process.get(key) is not None
+        ]
+        if samples:
+            lines.extend([f'# HELP {name} {description}', f'# TYPE {name} gauge'] + samples)
+    for (key, name, metric_type, description) in WORKER_METRICS:
+        samples = [f'{name}{{pid="{pid}"}} {worker[key]}' for pid, worker in metrics['workers'].items()]
+        if samples:
+            lines.extend([f'# HELP {name} {description}', f'# TYPE {name} {metric_type}'] + samples)
+    return '\n'.join(lines) + '\n'
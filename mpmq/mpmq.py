@@ -13,21 +13,58 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
 import re
 import sys
+import json
+import time
+import heapq
 import logging
 import datetime
+import multiprocessing
 from inspect import signature
 from multiprocessing import Queue
 from multiprocessing import Process
+from multiprocessing import RawArray
+from multiprocessing import Event
+from multiprocessing.connection import wait
 from queue import Queue as SimpleQueue
 from queue import Empty
+from queue import Full
+from collections import deque
+from collections.abc import Sized
+from collections.abc import Mapping
 
 from .handler import QueueHandlerDecorator
+from .handler import CONTROL_MESSAGE
+from .handler import MESSAGE_BATCH_INTERVAL
+from .handler import DONE
+from .handler import START
+from .handler import BLOCK
+from .handler import MESSAGE_POLICIES
+from .handler import put_control_message
+from .shared import share_value
+from .shared import load_result
+from .shared import discard_result
+from .checkpoint import Checkpoint
+from .cache import ResultCache
+from .metrics import get_seconds
+from .metrics import format_prometheus
 
 logger = logging.getLogger(__name__)
 
 TIMEOUT = 3
+WAIT_TIMEOUT = .5
+# log messages are passed to process_messages grouped by offset, all of them or only the latest of each offset
+COALESCE_ALL = 'all'
+COALESCE_LATEST = 'latest'
+# default number of seconds between calls to process_messages when messages are coalesced
+REFRESH_INTERVAL = .1
+# legacy string messages formatted as '#offset-message'
+CONTROL_MESSAGE_REGEX = re.compile(r'^#(?P<offset>\d+)-(?P<control>DONE|ERROR)$')
+MESSAGE_REGEX = re.compile(r'^#(?P<offset>\d+)-(?P<message>.*)$', re.DOTALL)
+# number of worker status slots per pool worker: chunk end offset, offset and monotonic start time of the running item
+WORKER_STATUS_SIZE = 3
 
 
 class NoActiveProcesses(Exception):
@@ -36,6 +73,87 @@ class NoActiveProcesses(Exception):
     pass
 
 
+class ProcessLost(Exception):
+    """ result of the process at offset that exited or timed out without returning a result on every attempt
+    """
+    def __init__(self, offset, reason, attempts):
+        super(ProcessLost, self).__init__(f'process at offset:{offset} was lost after {attempts} attempts - {reason}')
+        self.offset = offset
+        self.reason = reason
+        self.attempts = attempts
+
+
+class LazyQueue():
+    """ process queue that pulls (offset, process_data) items from an iterable only when they are requested
+    """
+    def __init__(self, iterable):
+        self.iterator = iter(iterable)
+        self.items = deque()
+
+    def put(self, item):
+        self.items.append(item)
+
+    def get(self):
+        if self.empty():
+            raise Empty()
+        return self.items.popleft()
+
+    def empty(self):
+        if not self.items:
+            try:
+                self.items.append(next(self.iterator))
+            except StopIteration:
+                return True
+        return False
+
+    def qsize(self):
+        """ return the number of items pulled from the iterable but not yet consumed
+        """
+        return len(self.items)
+
+    def clear(self):
+        self.items.clear()
+        self.iterator = iter(())
+
+
+class ResultBatch(list):
+    """ collects the results of a chunk of tasks so they can be put on the result queue as a single batch
+    """
+    def put(self, item):
+        self.append(item)
+
+
+def pool_worker(function, task_queue, message_queue, result_queue, shared_data, use_kwargs, status=None, index=0,
+                stop_event=None):
+    """ execute chunks of tasks pulled from the task queue until a None sentinel is received
+        target of the long-lived worker processes started when MPmq is executed in pool mode
+        the chunk and item being executed are recorded in the worker's slots of status so the parent can recover them
+        if the worker dies; once stop_event is set the remaining tasks are skipped
+    """
+    logger.debug('pool worker started')
+    base = index * WORKER_STATUS_SIZE
+    while True:
+        chunk = task_queue.get()
+        if chunk is None:
+            break
+        results = ResultBatch()
+        for (offset, process_data) in chunk:
+            if stop_event is not None and stop_event.is_set():
+                logger.debug(f'stop requested - skipping task at offset:{offset}')
+                break
+            if status is not None:
+                status[base:base + WORKER_STATUS_SIZE] = [chunk[-1][0], offset, time.monotonic_ns()]
+            (args, kwargs) = MPmq.get_arguments(process_data, shared_data, use_kwargs)
+            if stop_event is not None:
+                kwargs['stop_event'] = stop_event
+            function(*args, offset=offset, message_queue=message_queue, result_queue=results, **kwargs)
+        result_queue.put(results)
+        if status is not None:
+            # the worker is idle until it pulls the next chunk
+            status[base + 2] = -1
+    logger.debug('pool worker received stop sentinel - exiting')
+
+
 class MPmq():
     """ The mpmq module provides a convenient way to scale execution of a function across multiple input values by
         distributing the input across a specified number of background processes. It also provides the means for the
@@ -45,38 +163,405 @@ class MPmq():
         processes along with the input data for each process is specified as a list of dictionaries. The number of
         elements in the list dictates the total number of processes to execute. The result of each function is returned
         as a list to the caller after all background workers complete.
+        When pool is set a fixed set of long-lived worker processes is started instead of one process per process_data
+        element; the workers pull process_data elements from a task queue and execute the function for each of them.
+        In pool mode consecutive process_data elements can be dispatched in chunks of chunksize elements, the results
+        of a chunk are returned to the parent as a single batch. With guided chunksize each worker that frees up is
+        dispatched the next chunk sized to a fraction of the remaining elements so chunks get smaller towards the end.
+        When shared_memory is set bytes, bytearray, array.array and numpy array values of shared_data are copied into
+        shared memory once and the workers receive zero-copy views of them instead of a pickled copy per process.
+        Results that are str, bytes or bytearray values of at least result_threshold in length are passed from the
+        workers through shared memory instead of being pickled through the result queue.
+        When cost is set process_data elements are dispatched in order of decreasing cost, longest processing time
+        first, so expensive elements do not end up in a long tail; results are still returned in offset order.
+        Queues and processes are created from the multiprocessing context of start_method or context when specified,
+        modules listed in preload are imported once by the forkserver so forked workers do not import them again.
+        Processes and pool workers that die, or run a process_data element for longer than task_timeout seconds, are
+        detected through their sentinels; the elements they lost are retried up to retries times with an exponential
+        backoff starting at retry_backoff seconds, after which their result is a ProcessLost exception.
+        When fail_fast is set the first error also sets an event that the running functions can poll through
+        stop_requested, processes still running grace_period seconds later are terminated.
+        When checkpoint is set the result of each offset is appended to a checkpoint file as it completes; executing
+        again with the same checkpoint skips the offsets whose process_data element already has a result.
+        When cache is set results are also cached by function, shared_data and process_data element, cached results
+        are returned without starting a process.
+        When max_messages is set at most max_messages log messages or message batches are queued for the parent at a
+        time; message_policy decides what the workers do when the queue is full: block until there is room, drop_oldest
+        to hold the latest messages and drop the oldest, or sample to tail drop new messages until there is room. Control
+        messages are never dropped, the number of dropped messages is reported in the metrics summary.
+        When coalesce is set log messages are not passed to process_message as they arrive, instead they are grouped
+        by offset and passed to process_messages at most every refresh_interval seconds; with the latest coalesce only
+        the latest message of each offset is kept. Control messages are still processed as they arrive.
+        The process_data may also be an iterator or generator; its elements are then pulled only when a process or
+        worker is available to execute them and meta-data is kept only for the processes that are in flight.
     """
-    def __init__(self, function, *, process_data=None, shared_data=None, processes_to_start=None, timeout=None):
+    def __init__(self, function, *, process_data=None, shared_data=None, processes_to_start=None, timeout=None,
+                 pool=False, chunksize=1, shared_memory=False, result_threshold=None, message_batch_size=None,
+                 message_batch_interval=MESSAGE_BATCH_INTERVAL, message_level=logging.DEBUG, include_loggers=None,
+                 exclude_loggers=None, session=None, priority=0, cost=None, start_method=None, context=None,
+                 preload=None, retries=0, retry_backoff=1, task_timeout=None, fail_fast=False, grace_period=TIMEOUT,
+                 checkpoint=None, cache=None, max_messages=None, message_policy=BLOCK, coalesce=None,
+                 refresh_interval=REFRESH_INTERVAL):
         """ MPmq constructor
         """
         logger.debug('executing MPmq constructor')
-        self.function = QueueHandlerDecorator(function)
+        message_level = self.get_message_level(message_level)
+        if isinstance(include_loggers, str):
+            include_loggers = [include_loggers]
+        if isinstance(exclude_loggers, str):
+            exclude_loggers = [exclude_loggers]
+        if message_batch_size is not None and (not isinstance(message_batch_size, int) or message_batch_size < 1):
+            raise ValueError('message_batch_size must be a positive integer')
+        if not isinstance(retries, int) or retries < 0:
+            raise ValueError('retries must be a non-negative integer')
+        if task_timeout is not None and task_timeout <= 0:
+            raise ValueError('task_timeout must be a positive number of seconds')
+        if grace_period < 0:
+            raise ValueError('grace_period must be a non-negative number of seconds')
+        if max_messages is not None and (not isinstance(max_messages, int) or max_messages < 1):
+            raise ValueError('max_messages must be a positive integer')
+        if message_policy not in MESSAGE_POLICIES:
+            raise ValueError(f"message_policy must be one of {', '.join(MESSAGE_POLICIES)}")
+        if coalesce not in (None, COALESCE_ALL, COALESCE_LATEST):
+            raise ValueError(f"coalesce must be one of {COALESCE_ALL}, {COALESCE_LATEST}")
+        if refresh_interval < 0:
+            raise ValueError('refresh_interval must be a non-negative number of seconds')
+        self.function = QueueHandlerDecorator(
+            function,
+            result_threshold=result_threshold,
+            message_batch_size=message_batch_size,
+            message_batch_interval=message_batch_interval,
+            message_level=message_level,
+            include_loggers=include_loggers,
+            exclude_loggers=exclude_loggers,
+            # the policy only applies when the message queue is bounded
+            message_policy=message_policy if max_messages else BLOCK,
+            max_messages=max_messages)
         self._function = function
         self.process_data = [{}] if process_data is None else process_data
+        # process data without a length is consumed lazily as processes are started
+        self.lazy = not isinstance(self.process_data, Sized)
         self.shared_data = {} if shared_data is None else shared_data
+        self.shared_memory = shared_memory
+        self.context = self.get_context(start_method, context, preload)
+        self.shared_segments = []
         self.processes = {}
-        self.message_queue = Queue()
-        self.result_queue = Queue()
-        self.process_queue = SimpleQueue()
-        self.processes_to_start = processes_to_start if processes_to_start else len(self.process_data)
+        self._results = {}
+        self.pending_results = set()
+        self.next_result_offset = 0
+        self.reorder_buffer = None
+        self.max_messages = max_messages
+        self.message_queue = self.create_queue(max_messages or 0)
+        # records of a message batch that have not been processed yet
+        self.pending_messages = deque()
+        self.coalesce = coalesce
+        self.refresh_interval = refresh_interval
+        # lists of the log messages received since the last refresh by offset
+        self.coalesced_messages = {}
+        self.refresh_time = 0
+        self.result_queue = self.create_queue()
+        self.process_queue = LazyQueue(enumerate(self.process_data)) if self.lazy else SimpleQueue()
+        if processes_to_start:
+            self.processes_to_start = processes_to_start
+        else:
+            self.processes_to_start = os.cpu_count() if self.lazy else len(self.process_data)
         self.timeout = timeout if timeout else TIMEOUT
+        self.pool = pool
+        if chunksize != 1 and not pool:
+            raise ValueError('chunksize can only be set in pool mode')
+        if cost is not None and self.lazy:
+            raise ValueError('cost requires process_data with a length')
+        self.cost = cost
+        self.guided = chunksize == 'guided'
+        self.chunksize = self.get_chunksize(chunksize, None if self.lazy else len(self.process_data), self.processes_to_start)
+        self.task_queue = self.create_queue() if pool else None
+        self.workers = []
+        self.worker_status = self.create_worker_status() if pool else None
+        # chunks dispatched to the worker pool by the offset of their last item until their results are received
+        self.chunks = {}
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.task_timeout = task_timeout
+        # attempt number of the offsets that have been retried
+        self.attempts = {}
+        # heap of (ready time, offset, process_data) of lost offsets waiting to be retried
+        self.retry_queue = []
+        self.check_time = 0
+        # offsets completed when their process exited whose DONE message may still arrive
+        self.exited_offsets = set()
+        self.fail_fast = fail_fast
+        self.grace_period = grace_period
+        self.stop_event = self.create_event() if fail_fast else None
+        # monotonic nanosecond time after which processes that have not stopped are terminated
+        self.stop_deadline = None
+        self.checkpoint = Checkpoint(checkpoint) if isinstance(checkpoint, (str, os.PathLike)) else checkpoint
+        # (digest, result) tuples by offset loaded from the checkpoint that have not been resumed yet
+        self.checkpoint_records = {}
+        self.resumed_processes = 0
+        self.cache = ResultCache(cache) if isinstance(cache, (str, os.PathLike)) else cache
+        # digest of the function and shared_data computed before shared_data is moved into shared memory
+        self.cache_namespace = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # if all function parameters have defaults or are variable keywords then
+        # pass process_data and shared_data as key word arguments to the function
+        # this ensures backwards compatability for older versions of mpmq
+        function_signature = signature(function)
+        self.use_kwargs = all(
+            (parameter.default != parameter.empty) or (parameter.kind == parameter.VAR_KEYWORD)
+            for parameter in function_signature.parameters.values())
         self.active_processes = 0
         self.completed_processes = 0
+        self.session = session
+        self.priority = priority
+        # offsets that end a process or pool task, each of which holds one session process slot
+        self.task_ends = set()
+        # monotonic nanosecond timestamps of each process by offset
+        self.timings = {}
+        self.queued_time = None
+        self.run_start_time = None
+        self.run_stop_time = None
+        self.worker_usage = {}
+        self.totals = {'queue_wait': 0, 'run_time': 0, 'cpu_time': 0.0, 'max_rss': 0}
+        self.dropped_messages = 0
+
+    @staticmethod
+    def get_context(start_method, context, preload):
+        """ return the multiprocessing context for start_method or context or None to use the default context
+            modules in preload are imported by the forkserver when it starts, which requires the forkserver start method
+        """
+        if start_method and context:
+            raise ValueError('only one of start_method or context can be specified')
+        if start_method:
+            context = multiprocessing.get_context(start_method)
+        if preload:
+            if not context or context.get_start_method() != 'forkserver':
+                raise ValueError('preload requires the forkserver start method')
+            # only takes effect if the forkserver has not been started yet
+            context.set_forkserver_preload(list(preload))
+        return context
+
+    def create_queue(self, maxsize=0):
+        """ return a new queue from the multiprocessing context holding at most maxsize items if maxsize is set
+        """
+        if self.context:
+            return self.context.Queue(maxsize)
+        return Queue(maxsize)
+
+    def create_event(self):
+        """ return event from the multiprocessing context
+        """
+        if self.context:
+            return self.context.Event()
+        return Event()
+
+    def create_worker_status(self):
+        """ return shared array in which each pool worker records the chunk and item it is executing
+        """
+        size = WORKER_STATUS_SIZE * self.processes_to_start
+        if self.context:
+            return self.context.RawArray('q', [-1] * size)
+        return RawArray('q', [-1] * size)
+
+    def create_process(self, **kwargs):
+        """ return a new process from the multiprocessing context
+        """
+        if self.context:
+            return self.context.Process(**kwargs)
+        return Process(**kwargs)
+
+    @staticmethod
+    def get_message_level(message_level):
+        """ return numeric log level of message_level which can be a level number or name
+        """
+        if isinstance(message_level, str):
+            message_level = logging.getLevelName(message_level.upper())
+        if not isinstance(message_level, int):
+            raise ValueError('message_level must be a log level number or name')
+        return message_level
+
+    @staticmethod
+    def get_chunksize(chunksize, total, processes):
+        """ return the number of process_data elements to dispatch per task
+            if chunksize is 'auto' it is computed so that each worker receives about four chunks
+            if chunksize is 'guided' the size of each chunk is computed as it is dispatched so 1 is returned
+        """
+        if chunksize in ('auto', 'guided') and total is None:
+            raise ValueError(f'chunksize {chunksize} requires process_data with a length')
+        if chunksize == 'guided':
+            return 1
+        if chunksize == 'auto':
+            # processes_to_start defaults to the number of process_data elements which may be zero
+            (chunksize, extra) = divmod(total, max(processes, 1) * 4)
+            if extra:
+                chunksize += 1
+            return max(chunksize, 1)
+        if not isinstance(chunksize, int) or chunksize < 1:
+            raise ValueError('chunksize must be a positive integer, auto or guided')
+        return chunksize
+
+    @staticmethod
+    def get_guided_chunksize(remaining, processes):
+        """ return the size of the next guided chunk for the number of remaining process_data elements
+            each chunk takes a quarter of a worker's fair share of the remaining elements so the first chunks are the
+            same size as auto chunks and they shrink as the remaining elements run out
+        """
+        (chunksize, extra) = divmod(remaining, processes * 4)
+        if extra:
+            chunksize += 1
+        return max(chunksize, 1)
 
     def populate_process_queue(self):
         """ populate process queue from process data offset
+            lazy process data is pulled from the process queue as processes are started instead
         """
+        if self.checkpoint:
+            self.checkpoint_records = self.checkpoint.load()
+        if self.lazy:
+            logger.debug('process data will be pulled lazily as processes are started')
+            if self.checkpoint_records or self.cache:
+                self.process_queue = LazyQueue(item for item in enumerate(self.process_data) if not self.resume(*item))
+            return
         logger.debug('populating the process queue')
-        for offset, data in enumerate(self.process_data):
-            item = (offset, data)
+        self.queued_time = time.monotonic_ns()
+        items = [item for item in enumerate(self.process_data) if not self.resume(*item)]
+        if self.resumed_processes:
+            logger.info(f'resumed the results of {self.resumed_processes} offsets from the checkpoint')
+        if self.cache_hits:
+            logger.info(f'found the results of {self.cache_hits} offsets in the cache')
+        if self.cost is not None:
+            logger.debug('ordering the process queue by decreasing cost')
+            items.sort(key=self.get_cost(), reverse=True)
+        for item in items:
             logger.debug(f'adding {item} to the process queue')
             self.process_queue.put(item)
         logger.debug(f'added {self.process_queue.qsize()} items to the process queue')
 
+    def resume(self, offset, process_data):
+        """ return True if the checkpoint or the cache has the result of process_data at offset and add it to results
+        """
+        record = self.checkpoint_records.pop(offset, None)
+        if record:
+            (digest, result) = record
+            if digest == Checkpoint.get_digest(process_data):
+                self._results[offset] = result
+                self.resumed_processes += 1
+                return True
+            logger.debug(f'process_data at offset:{offset} changed since it was checkpointed')
+        if not self.cache:
+            return False
+        (hit, result) = self.cache.get(ResultCache.get_key(self.cache_namespace, process_data))
+        if not hit:
+            self.cache_misses += 1
+            return False
+        self._results[offset] = result
+        self.cache_hits += 1
+        if self.checkpoint:
+            self.checkpoint.add(offset, process_data, result)
+        return True
+
+    def store_result(self, offset, process_data):
+        """ add the result of the process at offset to the checkpoint and the cache unless it is an exception
+            a result passed through shared memory is loaded so its value is written
+        """
+        result = self._results[offset] = load_result(self._results[offset])
+        if isinstance(result, Exception):
+            return
+        if self.checkpoint:
+            self.checkpoint.add(offset, process_data, result)
+        if self.cache:
+            self.cache.put(ResultCache.get_key(self.cache_namespace, process_data), result)
+
+    def close_checkpoint(self):
+        """ write all buffered results to the checkpoint and close it
+        """
+        if self.checkpoint:
+            self.checkpoint.close()
+
+    def get_cost(self):
+        """ return key function returning the cost of an (offset, data) process queue item
+            cost is either a function of the process_data element or a sequence or mapping of costs by offset, offsets
+            missing from a mapping are given the mean cost
+        """
+        if callable(self.cost):
+            return lambda item: self.cost(item[1])
+        if isinstance(self.cost, Mapping):
+            default = sum(self.cost.values()) / len(self.cost) if self.cost else 0
+            return lambda item: self.cost.get(item[0], default)
+        return lambda item: self.cost[item[0]]
+
+    def get_durations(self):
+        """ return dictionary of the duration in seconds of each completed process by offset
+            can be passed as the cost of a later execution with the same process_data
+        """
+        return {
+            offset: (meta['stop_time'] - meta['start_time']).total_seconds()
+            for offset, meta in self.processes.items() if meta['stop_time']
+        }
+
+    def start_worker(self, index=None):
+        """ start a long-lived pool worker process
+            if index is specified the worker replaces the worker at index
+        """
+        if index is None:
+            index = len(self.workers)
+            self.workers.append(None)
+        worker = self.create_process(
+            target=pool_worker,
+            args=(self.function, self.task_queue, self.message_queue, self.result_queue, self.shared_data, self.use_kwargs,
+                  self.worker_status, index, self.stop_event))
+        worker.start()
+        logger.info(f'started pool worker process with id:{worker.pid} name:{worker.name}')
+        self.workers[index] = worker
+
+    def stop_workers(self):
+        """ signal all pool worker processes to stop and join them
+        """
+        logger.debug(f'stopping {len(self.workers)} pool worker processes')
+        for _ in self.workers:
+            self.task_queue.put(None)
+        # a worker can not exit until its last result batch has been read from the result queue
+        self.receive_pending_results()
+        for worker in self.workers:
+            logger.info(f'joining pool worker process with id:{worker.pid} name:{worker.name}')
+            worker.join(self.timeout)
+        self.workers = []
+
+    def share_shared_data(self):
+        """ copy the shareable values of shared_data into shared memory and replace them with their handles
+        """
+        if not isinstance(self.shared_data, dict):
+            return
+        shared_data = dict(self.shared_data)
+        for key, value in self.shared_data.items():
+            shared = share_value(value)
+            if not shared:
+                continue
+            (handle, segment) = shared
+            logger.debug(f'shared data {key} was copied into shared memory segment {segment.name}')
+            shared_data[key] = handle
+            self.shared_segments.append(segment)
+        self.shared_data = shared_data
+
+    def release_shared_memory(self):
+        """ close and remove all shared memory segments created for shared_data
+        """
+        for segment in self.shared_segments:
+            logger.debug(f'releasing shared memory segment {segment.name}')
+            segment.close()
+            segment.unlink()
+        self.shared_segments = []
+
     def start_processes(self):
         """ start processes
         """
+        if self.cache:
+            self.cache_namespace = self.cache.get_namespace(self._function, self.shared_data)
+        if self.shared_memory:
+            self.share_shared_data()
         self.populate_process_queue()
+        if self.session:
+            self.session.register(self, priority=self.priority)
 
         logger.debug(f'there are {self.process_queue.qsize()} items in the process queue')
         logger.debug(f'starting {self.processes_to_start} background processes')
@@ -84,40 +569,137 @@ class MPmq():
             if self.process_queue.empty():
                 logger.debug('the process queue is empty - no more processes need to be started')
                 break
+            if not self.can_start_process():
+                break
             self.start_next_process()
         logger.info(f'started {self.active_processes} background processes')
+        if not self.active_processes and self.process_queue.empty():
+            # there is nothing to execute, for example when all offsets were resumed from the checkpoint
+            put_control_message(self.message_queue, None, DONE)
 
     def on_start_process(self):
         pass
 
+    @staticmethod
+    def get_arguments(process_data, shared_data, use_kwargs):
+        """ return args and kwargs to execute the function with for the given process_data and shared_data
+        """
+        args = ()
+        kwargs = {}
+        if use_kwargs:
+            kwargs.update(**process_data)
+            kwargs.update(**shared_data)
+        else:
+            args = (process_data, shared_data)
+        return args, kwargs
+
     def start_next_process(self):
         """ start next process in the process queue
+            in pool mode the next chunk of the process queue is dispatched to the worker pool instead
         """
+        if self.pool:
+            self.start_next_task()
+            return
         (offset, process_data) = self.process_queue.get()
-        kwargs = {
+        (args, kwargs) = self.get_arguments(process_data, self.shared_data, self.use_kwargs)
+        kwargs.update({
             'message_queue': self.message_queue,
             'offset': offset,
             'result_queue': self.result_queue
-        }
-        # if all function parameters have defaults or are variable keywords then
-        # pass process_data and shared_data as key word arguments to the function
-        # this ensures backwards compatability for older versions of mpmq
-        function_signature = signature(self._function)
-        use_kwargs = all(
-            (parameter.default != parameter.empty) or (parameter.kind == parameter.VAR_KEYWORD)
-            for parameter in function_signature.parameters.values())
-        args = ()
-        if use_kwargs:
-            kwargs.update(**process_data)
-            kwargs.update(**self.shared_data)
-        else:
-            args = (process_data, self.shared_data)
-        process = Process(target=self.function, args=args, kwargs=kwargs)
+        })
+        if self.stop_event is not None:
+            kwargs['stop_event'] = self.stop_event
+        process = self.create_process(target=self.function, args=args, kwargs=kwargs)
         process.start()
+        self.task_ends.add(offset)
         logger.info(f'started background process at offset:{offset} with id:{process.pid} name:{process.name}')
+        self.add_process(offset, process, process_data)
+
+    def start_next_task(self):
+        """ dispatch the next chunk of the process queue to the worker pool
+        """
+        chunksize = self.chunksize
+        if self.guided:
+            chunksize = self.get_guided_chunksize(self.process_queue.qsize(), self.processes_to_start)
+        chunk = []
+        while len(chunk) < chunksize and not self.process_queue.empty():
+            chunk.append(self.process_queue.get())
+        # workers are started as chunks are dispatched so no more workers are started than there are chunks
+        if len(self.workers) < self.processes_to_start:
+            self.start_worker()
+        self.task_queue.put(chunk)
+        # pool workers execute the items of a chunk in order so the task ends with its last item
+        self.task_ends.add(chunk[-1][0])
+        self.chunks[chunk[-1][0]] = chunk
+        logger.info(f'dispatched {len(chunk)} items starting at offset:{chunk[0][0]} to the worker pool')
+        for (offset, process_data) in chunk:
+            self.add_process(offset, None, process_data)
+
+    def can_start_process(self):
+        """ return True if there is capacity to start the next process
+            in pool mode a chunk is dispatched only when a full chunk worth of tasks has completed or with guided chunks
+            when a worker has completed its chunk
+            when results are streamed in order the number of buffered and in-flight results is bounded
+        """
+        if self.guided:
+            # one chunk is kept queued ahead so a worker that frees up pulls it without waiting on the parent
+            if len(self.task_ends) > self.processes_to_start:
+                return False
+        elif self.active_processes > (self.processes_to_start - 1) * self.chunksize:
+            return False
+        if self.reorder_buffer and self.active_processes:
+            if len(self._results) + self.active_processes >= self.reorder_buffer:
+                return False
+        if self.session:
+            # the session is consulted last since it hands out a process slot
+            return self.session.acquire(self)
+        return True
+
+    def leave_session(self):
+        """ unregister from the session releasing any process slots still held
+        """
+        if self.session:
+            self.session.unregister(self)
+
+    def wake(self):
+        """ called by the session when a process slot may be available for this job
+        """
+        try:
+            put_control_message(self.message_queue, None, START, block=False)
+        except Full:
+            # a full message queue has running processes whose DONE messages start the waiting processes
+            pass
+
+    def start_waiting_processes(self):
+        """ start processes for as long as there is capacity
+        """
+        while not self.process_queue.empty() and self.can_start_process():
+            self.start_next_process()
+        if self.session and self.process_queue.empty():
+            self.session.withdraw(self)
+
+    def add_process(self, offset, process, process_data=None):
+        """ add meta-data for the process started at offset
+        """
+        self.pending_results.add(offset)
+        started = time.monotonic_ns()
+        if self.run_start_time is None:
+            self.run_start_time = started
+        self.timings[offset] = {
+            # lazy process data is pulled from the process queue as the process is started
+            'queued': self.queued_time if self.queued_time is not None else started,
+            'started': started,
+            'first_message': None,
+            'done': None,
+            'result': None,
+            'joined': None,
+            'cpu_time': None,
+            'max_rss': None
+        }
         # update processes dictionary with process meta-data for the process at offset
         self.processes[offset] = {
             'process': process,
+            'process_data': process_data,
             'start_time': datetime.datetime.now(),
             'stop_time': None,
             'duration': None
@@ -130,27 +712,77 @@ class MPmq():
         """
         for offset, meta in self.processes.items():
             process = meta['process']
-            if not meta['process'].is_alive():
+            if not process or not process.is_alive():
                 continue
             logger.info(f"terminating process at offset:{offset} with id:{process.pid} name:{process.name}")
             process.terminate()
+        for worker in self.workers:
+            if not worker.is_alive():
+                continue
+            logger.info(f'terminating pool worker process with id:{worker.pid} name:{worker.name}')
+            worker.terminate()
+        self.leave_session()
+        self.active_processes = 0
+
+    def stop_on_error(self):
+        """ stop starting new processes after an error
+            with fail_fast the running processes are also asked to stop and lost offsets are no longer retried
+        """
+        self.purge_process_queue()
+        if not self.fail_fast or self.stop_deadline is not None:
+            return
+        logger.info(f'failing fast - asking active processes to stop within {self.grace_period} seconds')
+        self.stop_event.set()
+        self.stop_deadline = time.monotonic_ns() + int(self.grace_period * 1e9)
+        self.retry_queue = []
+
+    def check_stopping(self, now):
+        """ end execution once the processes asked to stop by fail_fast have stopped, processes still running once
+            the grace period has passed are terminated
+            raises NoActiveProcesses
+        """
+        if self.pool:
+            running = [
+                worker for index, worker in enumerate(self.workers)
+                if self.worker_status[index * WORKER_STATUS_SIZE + 2] >= 0 and worker.is_alive()
+            ]
+        else:
+            running = [self.processes[offset]['process'] for offset in self.task_ends]
+            running = [process for process in running if process.is_alive()]
+        if running and now < self.stop_deadline:
+            return
+        for process in running:
+            logger.info(f'grace period has passed - terminating process with id:{process.pid} name:{process.name}')
+            process.terminate()
+        for process in running:
+            process.join(self.timeout)
+            if process.is_alive():
+                logger.info(f'killing process with id:{process.pid} name:{process.name}')
+                process.kill()
+                process.join(self.timeout)
+        self.collect_results()
+        # offsets that were stopped or skipped have no result
+        self.pending_results.clear()
+        self.leave_session()
         self.active_processes = 0
+        raise NoActiveProcesses()
 
     def purge_process_queue(self):
         """ purge process queue
         """
         logger.info('purging all items from the to process queue')
+        if self.lazy:
+            self.process_queue.clear()
+            return
         while not self.process_queue.empty():
             logger.info(f'purged {self.process_queue.get()} from the to process queue')
 
     @staticmethod
     def get_duration(start_time, stop_time):
-        """ return duartion based off start_time and stop_time
+        """ return duration based off start_time and stop_time truncated to whole seconds
         """
-        start = start_time.time().strftime('%H:%M:%S')
-        stop = stop_time.time().strftime('%H:%M:%S')
-        duration = str(datetime.datetime.strptime(stop, '%H:%M:%S') - datetime.datetime.strptime(start, '%H:%M:%S'))
-        return duration
+        seconds = int((stop_time - start_time).total_seconds())
+        return str(datetime.timedelta(seconds=seconds))
 
     def on_complete_process(self):
         pass
@@ -158,72 +790,217 @@ class MPmq():
     def complete_process(self, offset):
         """ complete the process at offset
         """
+        timings = self.timings.get(offset)
+        if timings:
+            timings['done'] = time.monotonic_ns()
         meta = self.processes[offset]
         process = meta['process']
-        logger.info(f'process at offset:{offset} id:{process.pid} name:{process.name} has completed')
         meta['stop_time'] = datetime.datetime.now()
         meta['duration'] = self.get_duration(meta['start_time'], meta['stop_time'])
-        logger.info(f"joining process at offset:{offset} with id:{process.pid} name:{process.name}")
-        process.join(self.timeout)
+        if process:
+            logger.info(f'process at offset:{offset} id:{process.pid} name:{process.name} has completed')
+            # a process can not exit until its result has been read from the result queue
+            self.collect_results(offset)
+            logger.info(f"joining process at offset:{offset} with id:{process.pid} name:{process.name}")
+            process.join(self.timeout)
+            if timings:
+                timings['joined'] = time.monotonic_ns()
+        else:
+            logger.info(f'task at offset:{offset} has completed in the worker pool')
+            self.collect_results()
+        if offset in self.task_ends:
+            self.task_ends.discard(offset)
+            if self.session:
+                self.session.release(self)
         self.active_processes -= 1
         self.completed_processes += 1
+        if timings:
+            self.totals['queue_wait'] += timings['started'] - timings['queued']
+            self.totals['run_time'] += timings['done'] - timings['started']
+        if self.lazy:
+            # only keep meta-data for in-flight processes so memory is bounded when process data is lazy
+            del self.processes[offset]
+            self.timings.pop(offset, None)
         self.on_complete_process()
 
-    def get_results(self):
-        """ return results of function execution from all processes
+    def add_results(self, result_data):
+        """ add result data read from the result queue to results
         """
-        logger.debug('getting results from all processes using the result queue')
-        logger.debug(f'the result queue size is: {self.result_queue.qsize()}')
-        results = []
+        # results of tasks dispatched in chunks arrive as a single batch
+        batch = result_data if isinstance(result_data, list) else [result_data]
+        chunk = {}
+        if self.pool and batch:
+            chunk = dict(self.chunks.pop(batch[-1]['offset'], ()))
+        for item in batch:
+            offset = item['offset']
+            logger.debug(f'adding result of process at offset:{offset} to results')
+            self._results[offset] = item['result']
+            self.pending_results.discard(offset)
+            self.add_usage(offset, item.get('usage'))
+            if item.get('dropped'):
+                logger.debug(f"{item['dropped']} log messages of process at offset:{offset} were dropped")
+                self.dropped_messages += item['dropped']
+            if self.checkpoint or self.cache:
+                # meta-data of lazy process data is released as processes complete but the chunk is kept
+                process_data = chunk[offset] if offset in chunk else self.processes[offset]['process_data']
+                self.store_result(offset, process_data)
+
+    def add_usage(self, offset, usage):
+        """ add timing and resource usage of the process at offset whose result was received
+        """
+        timings = self.timings.get(offset)
+        if timings:
+            timings['result'] = time.monotonic_ns()
+        if not usage:
+            return
+        if timings:
+            timings['cpu_time'] = usage['cpu_time']
+            timings['max_rss'] = usage['max_rss']
+        self.totals['cpu_time'] += usage['cpu_time']
+        self.totals['max_rss'] = max(self.totals['max_rss'], usage['max_rss'])
+        if self.pool:
+            worker = self.worker_usage.setdefault(usage['pid'], {'tasks': 0, 'cpu_time': 0.0, 'max_rss': 0})
+            worker['tasks'] += 1
+            worker['cpu_time'] += usage['cpu_time']
+            worker['max_rss'] = max(worker['max_rss'], usage['max_rss'])
+
+    def collect_results(self, offset=None):
+        """ add all results available on the result queue to results without blocking
+            if offset is specified block until the result for the process at offset has been received
+        """
+        while True:
+            try:
+                block = offset in self.pending_results
+                self.add_results(self.result_queue.get(block, self.timeout))
+            except Empty:
+                break
+
+    def receive_pending_results(self):
+        """ wait for the results that have not yet been received from the result queue
+        """
+        # results are collected while processes complete so only the outstanding results need to be received
         while True:
+            pending = len(self.pending_results)
+            if not pending:
+                logger.debug('results for all processes have been received')
+                break
+            logger.debug(f'waiting for {pending} results from the result queue')
             try:
-                result_data = self.result_queue.get(True, self.timeout)
-                offset = result_data['offset']
-                result = result_data['result']
-                logger.debug(f'adding result of process at offset:{offset} to results')
-                results.insert(offset, result)
+                self.add_results(self.result_queue.get(True, self.timeout))
             except Empty:
-                logger.debug('the result queue is now empty')
+                logger.debug(f'timed out waiting for {pending} results from the result queue')
                 break
+
+    def get_results(self):
+        """ return results of function execution from all processes
+        """
+        logger.debug('getting results from all processes using the result queue')
+        self.receive_pending_results()
         self.result_queue.close()
-        return results
+        # results may arrive out of order so return them ordered by offset, the index of each result is its offset
+        # offsets purged after an error before they ran have a None result
+        if not self._results:
+            return []
+        return [load_result(self._results.get(offset)) for offset in range(max(self._results) + 1)]
 
-    def get_message(self):
-        """ return message from top of message queue
+    @staticmethod
+    def format_message(level, message):
+        """ return message prefixed with its level name as expected by process_message
         """
-        message = self.message_queue.get(False)
-        match = re.match(r'^#(?P<offset>\d+)-(?P<control>DONE|ERROR)$', message)
+        if level >= 40:
+            return f'ERROR: {message}'
+        if level >= 30:
+            return f'WARN: {message}'
+        if level == 20:
+            return f'INFO: {message}'
+        return message
+
+    @staticmethod
+    def parse_message(message):
+        """ return dict of legacy '#offset-message' string message
+        """
+        match = CONTROL_MESSAGE_REGEX.match(message)
         if match:
             return {
                 'offset': int(match.group('offset')),
                 'control': match.group('control'),
-                'message': message
+                'message': message,
+                'level': None,
+                'timestamp': None
             }
 
-        match = re.match(r'^#(?P<offset>\d+)-(?P<message>.*)$', message)
+        match = MESSAGE_REGEX.match(message)
         if match:
             return {
                 'offset': int(match.group('offset')),
                 'control': None,
-                'message': match.group('message')
+                'message': match.group('message'),
+                'level': None,
+                'timestamp': None
             }
         raise ValueError(f'message {message} is not formatted correctly')
 
+    def get_message(self, timeout=WAIT_TIMEOUT):
+        """ return message from top of message queue
+            messages are (offset, level, kind, payload, timestamp) records, log message payloads are prefixed with
+            their level name for process_message and legacy '#offset-message' strings are parsed
+            batches of records are returned one record at a time in the order they were logged
+            blocks for up to timeout seconds waiting for a message and raises Empty if none arrives
+        """
+        if self.pending_messages:
+            message = self.pending_messages.popleft()
+        else:
+            message = self.message_queue.get(True, timeout)
+            if isinstance(message, list):
+                self.pending_messages.extend(message)
+                message = self.pending_messages.popleft()
+        if not isinstance(message, tuple):
+            return self.parse_message(message)
+
+        (offset, level, kind, payload, timestamp) = message
+        if kind != CONTROL_MESSAGE:
+            timings = self.timings.get(offset)
+            if timings and timings['first_message'] is None:
+                timings['first_message'] = time.monotonic_ns()
+        if kind == CONTROL_MESSAGE:
+            return {
+                'offset': offset,
+                'control': payload,
+                'message': f'#{offset}-{payload}',
+                'level': None,
+                'timestamp': timestamp
+            }
+        return {
+            'offset': offset,
+            'control': None,
+            'message': self.format_message(level, payload),
+            'level': level,
+            'timestamp': timestamp
+        }
+
     def process_control_message(self, offset, control):
         """ process control message
         """
-        if control == 'DONE':
-            self.complete_process(offset)
+        if control == START:
+            self.start_waiting_processes()
+        elif control == DONE:
+            if offset in self.exited_offsets or self.processes.get(offset, {}).get('stop_time'):
+                # meta-data of a completed process is already released when process data is lazy
+                self.exited_offsets.discard(offset)
+                logger.debug(f'ignoring completion of process at offset:{offset} that was already ended')
+                return
+            if offset is not None:
+                self.complete_process(offset)
             if self.process_queue.empty():
                 logger.info('the to process queue is empty')
-                if not self.active_processes:
+                if not self.active_processes and not self.retry_queue:
                     raise NoActiveProcesses()
                 logger.debug(f'there are {self.active_processes} background processes still alive')
-            else:
+            elif self.can_start_process():
                 self.start_next_process()
         else:
             logger.info(f'error detected for process at offset:{offset}')
-            self.purge_process_queue()
+            self.stop_on_error()
 
     def process_message(self, offset, message):
         """ process message
@@ -231,6 +1008,208 @@ class MPmq():
         """
         pass
 
+    def process_messages(self, batch):
+        """ process the log messages received since the last refresh when messages are coalesced
+            batch is a dictionary of lists of messages by offset in the order they were received
+            to be overriden by child class, by default each message is passed to process_message
+        """
+        for offset, messages in batch.items():
+            for message in messages:
+                self.process_message(offset, message)
+
+    def coalesce_message(self, offset, message):
+        """ add log message to the messages passed to process_messages on the next refresh
+        """
+        if self.coalesce == COALESCE_LATEST:
+            self.coalesced_messages[offset] = [message]
+        else:
+            self.coalesced_messages.setdefault(offset, []).append(message)
+
+    def refresh_messages(self, force=False):
+        """ pass the coalesced messages to process_messages if refresh_interval seconds passed since the last refresh
+        """
+        if not self.coalesced_messages:
+            return
+        now = time.monotonic()
+        if not force and now < self.refresh_time:
+            return
+        self.refresh_time = now + self.refresh_interval
+        (batch, self.coalesced_messages) = (self.coalesced_messages, {})
+        self.process_messages(batch)
+
+    def get_message_timeout(self):
+        """ return seconds to wait for the next message so coalesced messages are refreshed on time
+        """
+        if not self.coalesced_messages:
+            return WAIT_TIMEOUT
+        return min(WAIT_TIMEOUT, max(0, self.refresh_time - time.monotonic()))
+
+    def check_processes(self):
+        """ end the processes and pool workers that exited or exceeded task_timeout without completing and start the
+            lost offsets that are ready to be retried
+            checks are made at most every WAIT_TIMEOUT seconds
+            raises NoActiveProcesses once all processes have completed
+        """
+        now = time.monotonic_ns()
+        if now - self.check_time < WAIT_TIMEOUT * 1e9:
+            return
+        self.check_time = now
+        if self.checkpoint:
+            self.checkpoint.write_if_due()
+        if self.stop_deadline is not None:
+            self.check_stopping(now)
+            return
+        active_processes = self.active_processes
+        if self.pool:
+            self.check_workers(now)
+        else:
+            self.check_active_processes(now)
+        if active_processes == self.active_processes and not (self.retry_queue and self.retry_queue[0][0] <= now):
+            return
+        while self.retry_queue and self.retry_queue[0][0] <= now:
+            (_, offset, process_data) = heapq.heappop(self.retry_queue)
+            self.process_queue.put((offset, process_data))
+        self.start_waiting_processes()
+        if self.process_queue.empty() and not self.active_processes and not self.retry_queue:
+            raise NoActiveProcesses()
+
+    def exceeded_task_timeout(self, started, now):
+        """ return True if the task started at the monotonic nanosecond timestamp has run longer than task_timeout
+        """
+        return bool(self.task_timeout) and started >= 0 and now - started > self.task_timeout * 1e9
+
+    def check_active_processes(self, now):
+        """ end the active processes that exited without returning a result or exceeded task_timeout
+        """
+        if not self.task_ends:
+            return
+        sentinels = {self.processes[offset]['process'].sentinel: offset for offset in self.task_ends}
+        exited = wait(list(sentinels), timeout=0)
+        if exited:
+            # a process that completed normally put its result on the result queue before it exited
+            self.collect_results()
+        for sentinel, offset in sentinels.items():
+            process = self.processes[offset]['process']
+            if sentinel in exited:
+                if offset in self.pending_results:
+                    self.lose_process(offset, f'exited with exitcode {process.exitcode}')
+                elif not self.processes[offset]['stop_time']:
+                    # the result was received but the process exited before its DONE message was processed
+                    logger.info(f'process at offset:{offset} exited after returning its result')
+                    self.exited_offsets.add(offset)
+                    self.complete_process(offset)
+            elif self.exceeded_task_timeout(self.timings[offset]['started'], now):
+                logger.info(f'terminating process at offset:{offset} with id:{process.pid} name:{process.name}')
+                process.terminate()
+                process.join(self.timeout)
+                self.lose_process(offset, f'timed out after {self.task_timeout} seconds')
+
+    def check_workers(self, now):
+        """ replace the pool workers that exited or exceeded task_timeout and end the offsets they lost
+        """
+        if not self.workers:
+            return
+        exited = wait([worker.sentinel for worker in self.workers], timeout=0)
+        for index, worker in enumerate(self.workers):
+            base = index * WORKER_STATUS_SIZE
+            (chunk_end, offset, started) = self.worker_status[base:base + WORKER_STATUS_SIZE]
+            if worker.sentinel in exited:
+                reason = f'exited with exitcode {worker.exitcode}'
+            elif self.exceeded_task_timeout(started, now):
+                logger.info(f'terminating pool worker process with id:{worker.pid} name:{worker.name}')
+                worker.terminate()
+                worker.join(self.timeout)
+                reason = f'timed out after {self.task_timeout} seconds'
+            else:
+                continue
+            logger.warning(f'pool worker process with id:{worker.pid} name:{worker.name} {reason}')
+            self.worker_status[base:base + WORKER_STATUS_SIZE] = [-1] * WORKER_STATUS_SIZE
+            self.lose_chunk(chunk_end, offset, reason)
+            self.start_worker(index)
+
+    def lose_chunk(self, chunk_end, offset, reason):
+        """ end the offsets of the chunk ending at chunk_end that were lost with their pool worker
+            the offset being executed is ended as lost, the other offsets are put back on the process queue
+        """
+        self.collect_results()
+        for (lost_offset, process_data) in self.chunks.pop(chunk_end, []):
+            if lost_offset not in self.pending_results:
+                continue
+            meta = self.processes.get(lost_offset)
+            if not meta or meta['stop_time']:
+                # the offset completed but its result was lost with the batch of the chunk
+                self.completed_processes -= 1
+                self.active_processes += 1
+            if lost_offset == offset:
+                self.lose_process(lost_offset, reason, process_data=process_data)
+            else:
+                self.lose_process(lost_offset, None, process_data=process_data)
+        if chunk_end in self.task_ends:
+            self.task_ends.discard(chunk_end)
+            if self.session:
+                self.session.release(self)
+
+    def lose_process(self, offset, reason, process_data=None):
+        """ end the process at offset that ended without returning a result
+            the offset is retried after a backoff if it has attempts left otherwise its result is a ProcessLost
+            exception; an offset without a reason was not at fault and is put back on the process queue
+        """
+        meta = self.processes.get(offset)
+        if meta:
+            meta['stop_time'] = datetime.datetime.now()
+            meta['duration'] = self.get_duration(meta['start_time'], meta['stop_time'])
+            process_data = meta['process_data']
+        timings = self.timings.get(offset)
+        if timings:
+            timings['done'] = time.monotonic_ns()
+        self.pending_results.discard(offset)
+        if offset in self.task_ends:
+            self.task_ends.discard(offset)
+            if self.session:
+                self.session.release(self)
+        self.active_processes -= 1
+        attempts = self.attempts.get(offset, 1)
+        if not reason:
+            self.process_queue.put((offset, process_data))
+        elif attempts <= self.retries:
+            backoff = self.retry_backoff * 2 ** (attempts - 1)
+            logger.warning(f'process at offset:{offset} {reason} - retrying in {backoff} seconds')
+            self.attempts[offset] = attempts + 1
+            heapq.heappush(self.retry_queue, (time.monotonic_ns() + int(backoff * 1e9), offset, process_data))
+        else:
+            logger.error(f'process at offset:{offset} {reason} - giving up after {attempts} attempts')
+            self._results[offset] = ProcessLost(offset, reason, attempts)
+            self.completed_processes += 1
+            self.stop_on_error()
+            self.on_complete_process()
+
+    def process_next_message(self):
+        """ get the next message from the message queue and process it
+            raises Empty if no message arrived within the wait timeout
+        """
+        self.check_processes()
+        if not self.coalesce:
+            message = self.get_message()
+        else:
+            self.refresh_messages()
+            message = self.get_message(self.get_message_timeout())
+        if message['control']:
+            self.process_control_message(message['offset'], message['control'])
+        elif self.coalesce:
+            self.coalesce_message(message['offset'], message['message'])
+        else:
+            self.process_message(message['offset'], message['message'])
+
+    def stop(self):
+        """ stop pool workers and close the message queue once all processes have completed
+        """
+        self.refresh_messages(force=True)
+        if self.pool:
+            self.stop_workers()
+        self.leave_session()
+        self.run_stop_time = time.monotonic_ns()
+        self.message_queue.close()
+
     def run(self):
         """ start processes and process messages
         """
@@ -238,19 +1217,77 @@ class MPmq():
         self.start_processes()
         while True:
             try:
-                message = self.get_message()
-                if message['control']:
-                    self.process_control_message(message['offset'], message['control'])
-                else:
-                    self.process_message(message['offset'], message['message'])
+                self.process_next_message()
 
             except NoActiveProcesses:
                 logger.info('there are no more active processses - quitting')
                 break
 
             except Empty:
+                # no message arrived within the wait timeout
                 pass
-        self.message_queue.close()
+        self.stop()
+
+    def pop_results(self, ordered):
+        """ remove and return the received results as a list of (offset, result) tuples
+            if ordered only the results that are next in offset order are returned
+        """
+        if not ordered:
+            results = [(offset, load_result(result)) for offset, result in self._results.items()]
+            self._results.clear()
+            return results
+        results = []
+        while self.next_result_offset in self._results:
+            results.append((self.next_result_offset, load_result(self._results.pop(self.next_result_offset))))
+            self.next_result_offset += 1
+        return results
+
+    def imap_results(self, ordered=False, buffer_size=None):
+        """ generator that starts processes and yields (offset, result) tuples as the processes complete
+            results are yielded in completion order or in offset order if ordered is set; yielded results are not
+            retained, and when ordered the number of buffered and in-flight results is bounded by buffer_size
+        """
+        if buffer_size is not None and buffer_size < 1:
+            raise ValueError('buffer_size must be a positive integer')
+        self.reorder_buffer = buffer_size if ordered else None
+        completed = False
+        try:
+            logger.debug('executing imap results task')
+            self.start_processes()
+            while True:
+                try:
+                    self.process_next_message()
+
+                except NoActiveProcesses:
+                    logger.info('there are no more active processses - quitting')
+                    break
+
+                except Empty:
+                    # no message arrived within the wait timeout
+                    pass
+
+                yield from self.pop_results(ordered)
+                # yielding results frees space in the reorder buffer
+                while self.reorder_buffer and not self.process_queue.empty() and self.can_start_process():
+                    self.start_next_process()
+            self.stop()
+            self.receive_pending_results()
+            # any results left out of order were preceded by offsets that never ran
+            yield from sorted(self.pop_results(ordered) + self.pop_results(False))
+            completed = True
+
+        finally:
+            if not completed:
+                logger.info('results are no longer being consumed - terminating all active processes')
+                # results that arrived but will not be consumed may reference shared memory that must be removed
+                self.collect_results()
+                self.terminate_processes()
+                for result in self._results.values():
+                    discard_result(result)
+            self.result_queue.close()
+            self.close_checkpoint()
+            self.release_shared_memory()
+            self.final()
 
     def execute_run(self):
         """ wraps call to run
@@ -258,6 +1295,50 @@ class MPmq():
         logger.debug('executing run task wrapper')
         self.run()
 
+    def metrics(self):
+        """ return dictionary of the timings and resource usage of the processes, the pool workers and a summary
+            times are in seconds and memory sizes in bytes, cpu time and memory are None where resource usage is not
+            available; when process data is lazy only the processes that are in flight are included
+        """
+        processes = {}
+        for offset, timings in sorted(self.timings.items()):
+            processes[offset] = dict(timings)
+            processes[offset].update({
+                'queue_wait': get_seconds(timings['queued'], timings['started']),
+                'start_latency': get_seconds(timings['started'], timings['first_message']),
+                'run_time': get_seconds(timings['started'], timings['done']),
+                'result_latency': get_seconds(timings['started'], timings['result']),
+                'join_time': get_seconds(timings['done'], timings['joined'])
+            })
+        stop_time = self.run_stop_time if self.run_stop_time is not None else time.monotonic_ns()
+        summary = {
+            'completed': self.completed_processes,
+            'active': self.active_processes,
+            'wall_time': get_seconds(self.run_start_time, stop_time),
+            'queue_wait': self.totals['queue_wait'] / 1e9,
+            'run_time': self.totals['run_time'] / 1e9,
+            'cpu_time': self.totals['cpu_time'],
+            'max_rss': self.totals['max_rss']
+        }
+        if self.cache:
+            summary.update({'cache_hits': self.cache_hits, 'cache_misses': self.cache_misses})
+        if self.max_messages:
+            summary['dropped_messages'] = self.dropped_messages
+        return {
+            'processes': processes,
+            'workers': {pid: dict(usage) for pid, usage in self.worker_usage.items()},
+            'summary': summary
+        }
+
+    def dump_metrics(self, format='json'):
+        """ return metrics as a json document or in the prometheus text exposition format
+        """
+        if format == 'json':
+            return json.dumps(self.metrics(), indent=2)
+        if format == 'prometheus':
+            return format_prometheus(self.metrics())
+        raise ValueError('format must be json or prometheus')
+
     def final(self):
         """ called in finally block
             to be overriden by child class
@@ -292,4 +1373,7 @@ class MPmq():
             sys.exit(-1)
 
         finally:
+            self.leave_session()
+            self.close_checkpoint()
+            self.release_shared_memory()
             self.final()
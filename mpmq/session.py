@@ -0,0 +1,139 @@
+
+# Copyright (c) 2021 Intel Corporation
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#      http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Session():
+    """ enforce a single limit on the number of processes running across several MPmq jobs
+        a free process slot goes to the waiting job with the highest priority, between jobs of the same priority to
+        the job holding the fewest slots so each job gets a fair share
+    """
+    def __init__(self, max_processes=None):
+        """ Session constructor
+        """
+        self.max_processes = max_processes if max_processes else os.cpu_count()
+        if not isinstance(self.max_processes, int) or self.max_processes < 1:
+            raise ValueError('max_processes must be a positive integer')
+        # jobs are called from the threads running them
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.waiting = set()
+        self.active_processes = 0
+        self.sequence = 0
+
+    def register(self, job, priority=0):
+        """ register job with the session
+        """
+        with self.lock:
+            if job in self.jobs:
+                return
+            logger.debug(f'registering job with priority {priority}')
+            self.jobs[job] = {'priority': priority, 'sequence': self.sequence, 'held': 0}
+            self.sequence += 1
+
+    def unregister(self, job):
+        """ unregister job from the session releasing any slots it still holds
+        """
+        with self.lock:
+            meta = self.jobs.pop(job, None)
+            self.waiting.discard(job)
+            if not meta:
+                return
+            logger.debug(f"unregistering job holding {meta['held']} process slots")
+            self.active_processes -= meta['held']
+            self.wake_waiting()
+
+    def rank(self, job):
+        """ return sort key of job, lower ranks go first
+        """
+        meta = self.jobs[job]
+        return (-meta['priority'], meta['held'], meta['sequence'])
+
+    def acquire(self, job):
+        """ return True if job was given a process slot
+            otherwise job is marked as waiting and is woken when a slot may be available
+        """
+        with self.lock:
+            if job not in self.jobs:
+                return True
+            if self.active_processes >= self.max_processes:
+                self.waiting.add(job)
+                return False
+            contenders = [waiting for waiting in self.waiting if waiting is not job]
+            if contenders:
+                contender = min(contenders, key=self.rank)
+                if self.rank(contender) < self.rank(job):
+                    self.waiting.add(job)
+                    contender.wake()
+                    return False
+            self.waiting.discard(job)
+            self.jobs[job]['held'] += 1
+            self.active_processes += 1
+            return True
+
+    def release(self, job):
+        """ release a process slot held by job
+        """
+        with self.lock:
+            meta = self.jobs.get(job)
+            if not meta or not meta['held']:
+                return
+            meta['held'] -= 1
+            self.active_processes -= 1
+            self.wake_waiting()
+
+    def withdraw(self, job):
+        """ job no longer waits for a process slot
+        """
+        with self.lock:
+            if job in self.waiting:
+                self.waiting.discard(job)
+                self.wake_waiting()
+
+    def wake_waiting(self):
+        """ wake waiting jobs if there is a free process slot
+            must be called with the lock held
+        """
+        if self.active_processes >= self.max_processes:
+            return
+        for job in self.waiting:
+            job.wake()
+
+    def execute(self, *jobs, raise_if_error=False):
+        """ execute jobs concurrently and return the list of their results
+            raises the first exception raised by a job once all jobs have finished
+        """
+        outcomes = [None] * len(jobs)
+
+        def execute_job(index, job):
+            try:
+                outcomes[index] = (job.execute(raise_if_error=raise_if_error), None)
+            except Exception as exception:
+                outcomes[index] = (None, exception)
+
+        threads = [threading.Thread(target=execute_job, args=(index, job)) for index, job in enumerate(jobs)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for (_, exception) in outcomes:
+            if exception:
+                raise exception
+        return [results for (results, _) in outcomes]
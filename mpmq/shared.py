@@ -0,0 +1,191 @@
+
+# Copyright (c) 2021 Intel Corporation
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#      http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import array
+import logging
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+logger = logging.getLogger(__name__)
+
+# shared memory segments attached by this process are kept open for the lifetime of the process
+# since the views handed to the function reference their buffers
+ATTACHED_SEGMENTS = {}
+
+
+class SharedBuffer():
+    """ picklable handle to a value that was copied into a shared memory segment
+    """
+    def __init__(self, name, kind, size, typecode=None, dtype=None, shape=None):
+        """ SharedBuffer constructor
+        """
+        self.name = name
+        self.kind = kind
+        self.size = size
+        self.typecode = typecode
+        self.dtype = dtype
+        self.shape = shape
+
+
+def open_segment(name=None, size=0, track=True):
+    """ return a new shared memory segment of size if name is not specified otherwise attach to the named segment
+        an untracked segment is not removed by the resource tracker of this process when the process exits, this is
+        required for segments that are owned by another process
+    """
+    create = name is None
+    if track:
+        return SharedMemory(name=name, create=create, size=size)
+    try:
+        return SharedMemory(name=name, create=create, size=size, track=False)
+    except TypeError:
+        # the track parameter was added in python 3.13, before that attaching registers the segment again with the
+        # resource tracker shared with the parent process which is harmless, but a created segment must be
+        # unregistered so it is not removed when this process exits
+        segment = SharedMemory(name=name, create=create, size=size)
+        if create and os.name == 'posix':
+            resource_tracker.unregister(segment._name, 'shared_memory')
+        return segment
+
+
+def is_ndarray(value):
+    """ return True if value is a numpy ndarray without importing numpy
+    """
+    return type(value).__module__ == 'numpy' and type(value).__name__ == 'ndarray'
+
+
+def share_value(value, track=True):
+    """ copy value into a new shared memory segment
+        return a tuple of the SharedBuffer handle and the segment or None if the value type can not be shared
+    """
+    typecode = dtype = shape = None
+    if isinstance(value, bytes):
+        kind = 'bytes'
+        data = value
+    elif isinstance(value, bytearray):
+        kind = 'bytearray'
+        data = value
+    elif isinstance(value, array.array):
+        kind = 'array'
+        typecode = value.typecode
+        data = memoryview(value).cast('B')
+    elif is_ndarray(value):
+        import numpy
+        kind = 'ndarray'
+        value = numpy.ascontiguousarray(value)
+        (dtype, shape) = (value.dtype.str, value.shape)
+        data = memoryview(value).cast('B')
+    else:
+        return None
+    size = len(data)
+    # shared memory segments can not be empty
+    segment = open_segment(size=max(size, 1), track=track)
+    segment.buf[:size] = data
+    logger.debug(f'copied {kind} of {size} bytes into shared memory segment {segment.name}')
+    return SharedBuffer(segment.name, kind, size, typecode=typecode, dtype=dtype, shape=shape), segment
+
+
+def attach_segment(name):
+    """ return the shared memory segment with name attaching to it if not already attached by this process
+    """
+    segment = ATTACHED_SEGMENTS.get(name)
+    if not segment:
+        # the creating process owns the segment so it should not be tracked by the attaching process
+        segment = open_segment(name=name, track=False)
+        ATTACHED_SEGMENTS[name] = segment
+    return segment
+
+
+def attach_value(handle):
+    """ return a zero-copy view of the value referenced by the SharedBuffer handle
+        bytes are returned as a read-only memoryview, bytearrays as a writable memoryview, arrays as a memoryview
+        cast to the array typecode and numpy arrays as an ndarray backed by the shared memory segment
+    """
+    segment = attach_segment(handle.name)
+    view = segment.buf[:handle.size]
+    if handle.kind == 'bytes':
+        return view.toreadonly()
+    if handle.kind == 'array':
+        return view.cast(handle.typecode)
+    if handle.kind == 'ndarray':
+        import numpy
+        return numpy.ndarray(handle.shape, dtype=handle.dtype, buffer=view)
+    return view
+
+
+def attach_data(data):
+    """ return data with any SharedBuffer handles replaced by their views
+    """
+    if isinstance(data, SharedBuffer):
+        return attach_value(data)
+    if isinstance(data, dict) and any(isinstance(value, SharedBuffer) for value in data.values()):
+        return {key: attach_data(value) for key, value in data.items()}
+    return data
+
+
+def attach_arguments(args, kwargs):
+    """ return args and kwargs with any SharedBuffer handles replaced by their views
+    """
+    args = tuple(attach_data(arg) for arg in args)
+    kwargs = {key: attach_data(value) for key, value in kwargs.items()}
+    return args, kwargs
+
+
+def share_result(result, threshold):
+    """ return a SharedBuffer handle to a copy of result in shared memory if result is a str, bytes or bytearray
+        whose length is at least threshold otherwise return result
+        the segment is removed by the process that loads the result
+    """
+    if threshold is None or not isinstance(result, (str, bytes, bytearray)) or len(result) < threshold:
+        return result
+    # the process loading the result owns the segment so it should not be tracked by this process
+    if isinstance(result, str):
+        (handle, segment) = share_value(result.encode(), track=False)
+        handle.kind = 'str'
+    else:
+        (handle, segment) = share_value(result, track=False)
+    # the segment outlives this process until it is unlinked by the process that loads the result
+    segment.close()
+    return handle
+
+
+def load_result(result):
+    """ return a copy of the result referenced by a SharedBuffer handle and remove its shared memory segment
+        results that are not SharedBuffer handles are returned as is
+    """
+    if not isinstance(result, SharedBuffer):
+        return result
+    segment = open_segment(name=result.name)
+    try:
+        data = bytes(segment.buf[:result.size])
+    finally:
+        segment.close()
+        segment.unlink()
+    logger.debug(f'loaded {result.kind} result of {result.size} bytes from shared memory segment {result.name}')
+    if result.kind == 'str':
+        return data.decode()
+    if result.kind == 'bytearray':
+        return bytearray(data)
+    return data
+
+
+def discard_result(result):
+    """ remove the shared memory segment of a result that will not be loaded
+    """
+    if not isinstance(result, SharedBuffer):
+        return
+    segment = open_segment(name=result.name)
+    segment.close()
+    segment.unlink()
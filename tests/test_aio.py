@@ -0,0 +1,155 @@
+
+# Copyright (c) 2021 Intel Corporation
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#      http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import unittest
+from mock import patch
+from mock import call
+from mock import Mock
+
+from mpmq.aio import AsyncMPmq
+from mpmq.mpmq import NoActiveProcesses
+from queue import Empty
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class TestAsyncMPmq(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        """
+        """
+        pass
+
+    def tearDown(self):
+        """
+        """
+        pass
+
+    async def collect(self, generator):
+        return [item async for item in generator]
+
+    @patch('mpmq.aio.AsyncMPmq.stop')
+    @patch('mpmq.aio.AsyncMPmq.process_control_message')
+    @patch('mpmq.aio.AsyncMPmq.get_message')
+    @patch('mpmq.aio.AsyncMPmq.start_processes')
+    async def test__messages_Should_YieldLogMessages_When_Called(self, start_processes_patch, get_message_patch, process_control_message_patch, stop_patch, *patches):
+        get_message_patch.side_effect = [
+            {'offset': 0, 'control': None, 'message': 'message1'},
+            Empty('empty'),
+            {'offset': 0, 'control': 'DONE', 'message': '#0-DONE'},
+            {'offset': 1, 'control': None, 'message': 'message2'},
+            {'offset': 1, 'control': 'DONE', 'message': '#1-DONE'}
+        ]
+        process_control_message_patch.side_effect = [None, NoActiveProcesses()]
+        client = AsyncMPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}])
+        result = await self.collect(client.messages())
+        self.assertEqual(result, [(0, 'message1'), (1, 'message2')])
+        start_processes_patch.assert_called_once_with()
+        self.assertEqual(process_control_message_patch.mock_calls, [call(0, 'DONE'), call(1, 'DONE')])
+        stop_patch.assert_called_once_with()
+        self.assertTrue(client.completed)
+
+    @patch('mpmq.aio.AsyncMPmq.process_control_message')
+    @patch('mpmq.aio.AsyncMPmq.get_message')
+    @patch('mpmq.aio.AsyncMPmq.start_processes')
+    async def test__messages_Should_NotStartProcessesAgain_When_Resumed(self, start_processes_patch, get_message_patch, *patches):
+        get_message_patch.return_value = {'offset': 0, 'control': None, 'message': 'message1'}
+        client = AsyncMPmq(function=Mock(__name__='mockfunc'))
+        async for message in client.messages():
+            break
+        async for message in client.messages():
+            break
+        start_processes_patch.assert_called_once_with()
+
+    @patch('mpmq.aio.AsyncMPmq.final')
+    @patch('mpmq.aio.AsyncMPmq.release_shared_memory')
+    @patch('mpmq.aio.AsyncMPmq.get_results')
+    @patch('mpmq.aio.AsyncMPmq.process_message')
+    @patch('mpmq.aio.AsyncMPmq.messages')
+    async def test__execute_async_Should_ProcessMessagesAndReturnResults_When_Called(self, messages_patch, process_message_patch, get_results_patch, release_shared_memory_patch, final_patch, *patches):
+
+        async def messages():
+            yield 0, 'message1'
+
+        messages_patch.side_effect = messages
+        get_results_patch.return_value = ['--result--']
+        client = AsyncMPmq(function=Mock(__name__='mockfunc'))
+        result = await client.execute_async()
+        self.assertEqual(result, ['--result--'])
+        process_message_patch.assert_called_once_with(0, 'message1')
+        release_shared_memory_patch.assert_called_once_with()
+        final_patch.assert_called_once_with()
+
+    @patch('mpmq.aio.AsyncMPmq.get_results')
+    @patch('mpmq.aio.AsyncMPmq.messages')
+    async def test__execute_async_Should_Raise_When_RaiseIfErrorAndResultIsException(self, messages_patch, get_results_patch, *patches):
+
+        async def messages():
+            return
+            yield
+
+        messages_patch.side_effect = messages
+        get_results_patch.return_value = ['--result--', Exception('error')]
+        client = AsyncMPmq(function=Mock(__name__='mockfunc'))
+        with self.assertRaises(Exception):
+            await client.execute_async(raise_if_error=True)
+
+    @patch('mpmq.aio.AsyncMPmq.terminate_processes')
+    @patch('mpmq.aio.AsyncMPmq.messages')
+    async def test__execute_async_Should_TerminateProcesses_When_Cancelled(self, messages_patch, terminate_processes_patch, *patches):
+
+        async def messages():
+            await asyncio.sleep(60)
+            yield
+
+        messages_patch.side_effect = messages
+        client = AsyncMPmq(function=Mock(__name__='mockfunc'))
+        task = asyncio.create_task(client.execute_async())
+        await asyncio.sleep(0)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        terminate_processes_patch.assert_called_once_with()
+
+    @patch('mpmq.aio.AsyncMPmq.get_results')
+    @patch('mpmq.aio.AsyncMPmq.process_message')
+    @patch('mpmq.aio.AsyncMPmq.messages')
+    async def test__results_Should_ReturnResults_When_MessagesConsumed(self, messages_patch, process_message_patch, get_results_patch, *patches):
+
+        async def messages():
+            return
+            yield
+
+        messages_patch.side_effect = messages
+        get_results_patch.return_value = ['--result--']
+        client = AsyncMPmq(function=Mock(__name__='mockfunc'))
+        self.assertEqual(await client.results(), ['--result--'])
+        process_message_patch.assert_not_called()
+
+    @patch('mpmq.aio.AsyncMPmq.process_message')
+    @patch('mpmq.aio.AsyncMPmq.messages')
+    async def test__execute_async_Should_LeaveSession_When_ProcessMessageRaises(self, messages_patch, process_message_patch, *patches):
+
+        async def messages():
+            yield 0, 'message1'
+
+        messages_patch.side_effect = messages
+        process_message_patch.side_effect = ValueError('display error')
+        session_mock = Mock()
+        client = AsyncMPmq(function=Mock(__name__='mockfunc'), session=session_mock)
+        with self.assertRaises(ValueError):
+            await client.execute_async()
+        session_mock.unregister.assert_called_once_with(client)
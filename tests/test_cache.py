@@ -0,0 +1,96 @@
+# Copyright (c) 2021 Intel Corporation
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#      http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import tempfile
+import unittest
+
+from mpmq.cache import ResultCache
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def function1():
+    pass
+
+
+def function2():
+    pass
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        """
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'cache')
+
+    def tearDown(self):
+        """
+        """
+        self.directory.cleanup()
+
+    def test__init_Should_RaiseValueError_When_MaxSizeNotValid(self, *patches):
+        with self.assertRaises(ValueError):
+            ResultCache(self.path, max_size=0)
+
+    def test__get_namespace_Should_ReturnDifferentNamespaces_When_FunctionVersionOrSharedDataDiffer(self, *patches):
+        cache = ResultCache(self.path)
+        namespace = cache.get_namespace(function1, {'key': 'value'})
+        self.assertEqual(namespace, cache.get_namespace(function1, {'key': 'value'}))
+        self.assertNotEqual(namespace, cache.get_namespace(function2, {'key': 'value'}))
+        self.assertNotEqual(namespace, cache.get_namespace(function1, {'key': 'other'}))
+        self.assertNotEqual(namespace, ResultCache(self.path, version='2').get_namespace(function1, {'key': 'value'}))
+
+    def test__get_Should_ReturnMiss_When_NotCached(self, *patches):
+        cache = ResultCache(self.path)
+        self.assertEqual(cache.get(ResultCache.get_key('namespace', {'range': '0-1'})), (False, None))
+        self.assertTrue(os.path.isdir(self.path))
+
+    def test__get_Should_ReturnHit_When_Put(self, *patches):
+        key = ResultCache.get_key('namespace', {'range': '0-1'})
+        ResultCache(self.path).put(key, {'result': [1, 2]})
+        self.assertEqual(ResultCache(self.path).get(key), (True, {'result': [1, 2]}))
+
+    def test__load_index_Should_IndexCachedResults_When_DirectoryHasResults(self, *patches):
+        cache = ResultCache(self.path)
+        cache.put('key1', b'1' * 100)
+        cache.put('key2', b'2' * 100)
+        cache = ResultCache(self.path)
+        cache.load_index()
+        self.assertEqual(sorted(cache.index), ['key1.pickle', 'key2.pickle'])
+        self.assertEqual(cache.size, sum(os.path.getsize(cache.get_path(key)) for key in ['key1', 'key2']))
+
+    def test__put_Should_EvictLeastRecentlyUsed_When_MaxSizeExceeded(self, *patches):
+        cache = ResultCache(self.path)
+        cache.put('key1', b'1' * 100)
+        size = cache.size
+        cache = ResultCache(self.path, max_size=int(size * 2.5))
+        cache.put('key2', b'2' * 100)
+        os.utime(cache.get_path('key1'), (1, 1))
+        os.utime(cache.get_path('key2'), (2, 2))
+        cache.index = None
+        # using key1 makes key2 the least recently used
+        self.assertTrue(cache.get('key1')[0])
+        cache.put('key3', b'3' * 100)
+        self.assertEqual(sorted(cache.index), ['key1.pickle', 'key3.pickle'])
+        self.assertFalse(os.path.exists(cache.get_path('key2')))
+        self.assertEqual(cache.size, size * 2)
+
+    def test__put_Should_NotCache_When_ResultLargerThanMaxSize(self, *patches):
+        cache = ResultCache(self.path, max_size=10)
+        cache.put('key1', b'1' * 100)
+        self.assertEqual(cache.get('key1'), (False, None))
+        self.assertEqual(cache.size, 0)
@@ -0,0 +1,98 @@
+# Copyright (c) 2021 Intel Corporation
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#      http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import pickle
+import tempfile
+import unittest
+from mock import patch
+
+from mpmq.checkpoint import Checkpoint
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        """
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'run.ckpt')
+
+    def tearDown(self):
+        """
+        """
+        self.directory.cleanup()
+
+    def test__init_Should_RaiseValueError_When_BatchSizeNotValid(self, *patches):
+        with self.assertRaises(ValueError):
+            Checkpoint(self.path, batch_size=0)
+
+    def test__get_digest_Should_ReturnSameDigest_When_SameProcessData(self, *patches):
+        self.assertEqual(Checkpoint.get_digest({'range': '0-1'}), Checkpoint.get_digest({'range': '0-1'}))
+        self.assertNotEqual(Checkpoint.get_digest({'range': '0-1'}), Checkpoint.get_digest({'range': '2-3'}))
+
+    def test__load_Should_ReturnEmpty_When_FileDoesNotExist(self, *patches):
+        self.assertEqual(Checkpoint(self.path).load(), {})
+
+    def test__add_Should_BufferResults_When_BatchNotFull(self, *patches):
+        checkpoint = Checkpoint(self.path, batch_size=3)
+        checkpoint.add(0, {'range': '0-1'}, 'result0')
+        checkpoint.add(1, {'range': '2-3'}, 'result1')
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(len(checkpoint.buffer), 2)
+
+    def test__add_Should_WriteBatch_When_BatchFull(self, *patches):
+        checkpoint = Checkpoint(self.path, batch_size=2)
+        checkpoint.add(0, {'range': '0-1'}, 'result0')
+        checkpoint.add(1, {'range': '2-3'}, b'result1')
+        self.assertEqual(checkpoint.buffer, [])
+        self.assertEqual(Checkpoint(self.path).load(), {
+            0: (Checkpoint.get_digest({'range': '0-1'}), 'result0'),
+            1: (Checkpoint.get_digest({'range': '2-3'}), b'result1')
+        })
+        checkpoint.close()
+
+    @patch('mpmq.checkpoint.time.monotonic')
+    def test__write_if_due_Should_WriteBuffer_When_IntervalElapsed(self, monotonic_patch, *patches):
+        monotonic_patch.return_value = 100
+        checkpoint = Checkpoint(self.path, interval=1)
+        checkpoint.add(0, {}, 'result0')
+        checkpoint.write_if_due()
+        self.assertEqual(len(checkpoint.buffer), 1)
+        monotonic_patch.return_value = 101
+        checkpoint.write_if_due()
+        self.assertEqual(checkpoint.buffer, [])
+        checkpoint.close()
+        self.assertEqual(list(Checkpoint(self.path).load()), [0])
+
+    def test__close_Should_WriteBufferAndAppend_When_Reopened(self, *patches):
+        checkpoint = Checkpoint(self.path)
+        checkpoint.add(0, {}, 'result0')
+        checkpoint.close()
+        checkpoint = Checkpoint(self.path)
+        checkpoint.add(1, {}, 'result1')
+        checkpoint.close()
+        self.assertEqual(sorted(Checkpoint(self.path).load()), [0, 1])
+
+    def test__load_Should_TruncateIncompleteRecord_When_Interrupted(self, *patches):
+        checkpoint = Checkpoint(self.path)
+        checkpoint.add(0, {}, 'result0')
+        checkpoint.close()
+        size = os.path.getsize(self.path)
+        with open(self.path, 'ab') as file:
+            file.write(pickle.dumps((1, 'digest', 'result1'))[:-5])
+        self.assertEqual(list(Checkpoint(self.path).load()), [0])
+        self.assertEqual(os.path.getsize(self.path), size)
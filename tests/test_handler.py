@@ -18,12 +18,25 @@ from mock import patch
 from mock import call
 from mock import Mock
 from mock import MagicMock
+from mock import ANY
 
 from mpmq.handler import QueueHandler
 from mpmq.handler import queue_handler
 from mpmq.handler import QueueHandlerDecorator
+from mpmq.handler import BufferedQueueHandler
+from mpmq.handler import LoggerFilter
+from mpmq.handler import stop_requested
+from mpmq.handler import set_stop_event
+from mpmq.handler import LOG_MESSAGE
+from mpmq.handler import CONTROL_MESSAGE
+from mpmq.handler import DROP_OLDEST
+from mpmq.handler import SAMPLE
+from mpmq.mpmq import ResultBatch
 
 import sys
+import time
+from queue import Queue
+from queue import Full
 import logging
 logger = logging.getLogger(__name__)
 
@@ -59,6 +72,50 @@ class TestQueueHandlerDecorator(unittest.TestCase):
         qhd()
         queue_handler_patch.assert_called_once()
 
+    @patch('mpmq.handler.queue_handler')
+    def test__call_Should_PassResultThreshold_When_Called(self, queue_handler_patch, *patches):
+        mock_function = Mock(__name__='mock_function')
+        qhd = QueueHandlerDecorator(mock_function, result_threshold=1024, message_batch_size=100, message_batch_interval=.5)
+        qhd()
+        queue_handler_patch.assert_called_once_with(
+            mock_function, result_threshold=1024, message_batch_size=100, message_batch_interval=.5,
+            message_level=logging.DEBUG, include_loggers=None, exclude_loggers=None, message_policy='block',
+            max_messages=None)
+
+    @patch('mpmq.handler.queue_handler')
+    def test__call_Should_PassMessageFilters_When_Called(self, queue_handler_patch, *patches):
+        mock_function = Mock(__name__='mock_function')
+        qhd = QueueHandlerDecorator(mock_function, message_level=logging.INFO, include_loggers=['app'], exclude_loggers=['app.db'])
+        qhd()
+        self.assertEqual(queue_handler_patch.mock_calls[0].kwargs['message_level'], logging.INFO)
+        self.assertEqual(queue_handler_patch.mock_calls[0].kwargs['include_loggers'], ['app'])
+        self.assertEqual(queue_handler_patch.mock_calls[0].kwargs['exclude_loggers'], ['app.db'])
+
+    @patch('mpmq.handler.attach_arguments')
+    @patch('mpmq.handler.queue_handler')
+    def test__call_Should_AttachSharedMemoryArguments_When_Called(self, queue_handler_patch, attach_arguments_patch, *patches):
+        attach_arguments_patch.return_value = (('--arg--',), {'key': '--view--'})
+        mock_function = Mock(__name__='mock_function')
+        qhd = QueueHandlerDecorator(mock_function)
+        qhd('--handle--', key='--handle--')
+        attach_arguments_patch.assert_called_once_with(('--handle--',), {'key': '--handle--'})
+        queue_handler_patch.return_value.assert_called_once_with('--arg--', key='--view--')
+
+    @patch('mpmq.handler.queue_handler')
+    def test__call_Should_DecorateFunctionOnce_When_CalledRepeatedly(self, queue_handler_patch, *patches):
+        qhd = QueueHandlerDecorator(Mock(__name__='mock_function'))
+        qhd(offset=0)
+        qhd(offset=1)
+        queue_handler_patch.assert_called_once()
+        self.assertEqual(queue_handler_patch.return_value.call_count, 2)
+
+    def test__getstate_Should_ExcludeDecoratedFunction_When_Called(self, *patches):
+        qhd = QueueHandlerDecorator(Mock(__name__='mock_function'))
+        qhd.decorated = Mock()
+        state = qhd.__getstate__()
+        self.assertIsNone(state['decorated'])
+        self.assertIsNotNone(qhd.decorated)
+
 
 class TestHandler(unittest.TestCase):
 
@@ -70,12 +127,17 @@ class TestHandler(unittest.TestCase):
     def tearDown(self):
         """
         """
-        pass
+        # queue handlers installed by queue_handler stay on the root logger between calls
+        root_logger = logging.getLogger()
+        for handler in list(root_logger.handlers):
+            if isinstance(handler, QueueHandler):
+                root_logger.removeHandler(handler)
+                handler.close()
 
     @patch('mpmq.handler.logging.Formatter')
     @patch('mpmq.handler.logging.getLogger')
     @patch('mpmq.handler.QueueHandler')
-    def test__queue_handler_Should_AddAndRemoveQueueHandler_When_DecoratedFunctionIsPassedMessageQueue(self, queue_handler_class, get_logger_mock, *patches):
+    def test__queue_handler_Should_AddQueueHandler_When_DecoratedFunctionIsPassedMessageQueue(self, queue_handler_class, get_logger_mock, *patches):
         root_logger_mock = Mock()
         get_logger_mock.return_value = root_logger_mock
 
@@ -91,7 +153,76 @@ class TestHandler(unittest.TestCase):
         queue_handler_object.setFormatter.assert_called()
         root_logger_mock.addHandler.assert_called_with(queue_handler_object)
         root_logger_mock.setLevel.assert_called_with(logging.DEBUG)
-        root_logger_mock.removeHandler.assert_called_with(queue_handler_object)
+        root_logger_mock.removeHandler.assert_not_called()
+        self.assertIsNone(queue_handler_object.offset)
+
+    @patch('mpmq.handler.logging.Formatter')
+    @patch('mpmq.handler.logging.getLogger')
+    @patch('mpmq.handler.QueueHandler')
+    def test__queue_handler_Should_ReuseQueueHandler_When_CalledAgainWithSameMessageQueue(self, queue_handler_class, get_logger_mock, formatter_patch, *patches):
+        root_logger_mock = get_logger_mock.return_value
+        function_mock = Mock(__name__='fn1')
+        offsets = []
+        function_mock.side_effect = lambda: offsets.append(queue_handler_class.return_value.offset)
+        message_queue_mock = Mock()
+        queue_handler_class.return_value.message_queue = message_queue_mock
+        decorated = queue_handler(function_mock)
+        for offset in range(3):
+            decorated(message_queue=message_queue_mock, offset=offset)
+        self.assertEqual(offsets, [0, 1, 2])
+        queue_handler_class.assert_called_once_with(message_queue_mock, None, message_policy='block', max_messages=None)
+        formatter_patch.assert_called_once()
+        root_logger_mock.addHandler.assert_called_once_with(queue_handler_class.return_value)
+
+    @patch('mpmq.handler.logging.getLogger')
+    @patch('mpmq.handler.QueueHandler')
+    def test__queue_handler_Should_ReplaceQueueHandler_When_CalledWithOtherMessageQueue(self, queue_handler_class, get_logger_mock, *patches):
+        root_logger_mock = get_logger_mock.return_value
+        message_queue1_mock = Mock()
+        message_queue2_mock = Mock()
+        handler1 = Mock(message_queue=message_queue1_mock)
+        handler2 = Mock(message_queue=message_queue2_mock)
+        queue_handler_class.side_effect = [handler1, handler2]
+        decorated = queue_handler(Mock(__name__='fn1'))
+        decorated(message_queue=message_queue1_mock, offset=0)
+        decorated(message_queue=message_queue2_mock, offset=1)
+        root_logger_mock.removeHandler.assert_called_once_with(handler1)
+        handler1.close.assert_called_once_with()
+        self.assertEqual(root_logger_mock.addHandler.mock_calls, [call(handler1), call(handler2)])
+
+    def test__queue_handler_Should_SetStopEvent_When_PassedStopEvent(self, *patches):
+        stop_event_mock = Mock()
+        stop_event_mock.is_set.return_value = True
+        requested = []
+        function_mock = Mock(__name__='fn1', side_effect=lambda: requested.append(stop_requested()))
+        try:
+            queue_handler(function_mock)(offset=3, stop_event=stop_event_mock)
+        finally:
+            set_stop_event(None)
+        function_mock.assert_called_once_with()
+        self.assertEqual(requested, [True])
+        self.assertFalse(stop_requested())
+
+    def test__queue_handler_Should_RemoveQueueHandler_When_RemoveHandlerCalled(self, *patches):
+        message_queue_mock = Mock()
+        decorated = queue_handler(Mock(__name__='fn1'))
+        decorated(offset=3, message_queue=message_queue_mock)
+        handlers = [handler for handler in logging.getLogger().handlers if isinstance(handler, QueueHandler)]
+        self.assertEqual(len(handlers), 1)
+        decorated.remove_handler()
+        self.assertNotIn(handlers[0], logging.getLogger().handlers)
+        decorated.remove_handler()
+
+    def test__queue_handler_Should_NotSendMessages_When_LoggedBetweenCalls(self, *patches):
+        function_mock = Mock(__name__='fn1')
+        message_queue_mock = Mock()
+        decorated = queue_handler(function_mock)
+        decorated(offset=3, message_queue=message_queue_mock)
+        message_queue_mock.reset_mock()
+        logger.debug('logged between calls')
+        message_queue_mock.put.assert_not_called()
+        decorated(offset=4, message_queue=message_queue_mock)
+        self.assertTrue(call((4, logging.DEBUG, LOG_MESSAGE, 'execution of fn1 offset:4 ended', ANY)) in message_queue_mock.put.mock_calls)
 
     def test__queue_handler_Should_AddResultToResultQueue_When_DecoratedFunctionIsPassedResultQueue(self, *patches):
         function_mock = Mock(__name__='fn1')
@@ -99,7 +230,23 @@ class TestHandler(unittest.TestCase):
         result_queue_mock = Mock()
         result = queue_handler(function_mock)(offset=3, result_queue=result_queue_mock)
         self.assertEqual(result, function_mock.return_value)
-        result_queue_mock.put.assert_called_once_with({'offset': 3, 'result': function_mock.return_value})
+        result_queue_mock.put.assert_called_once_with({'offset': 3, 'result': function_mock.return_value, 'usage': ANY})
+
+    def test__queue_handler_Should_AddResultToResultQueue_When_ResultQueueIsEmptyBatch(self, *patches):
+        function_mock = Mock(__name__='fn1')
+        function_mock.return_value = 'function return value'
+        result_batch = ResultBatch()
+        queue_handler(function_mock)(offset=3, result_queue=result_batch)
+        self.assertEqual(result_batch, [{'offset': 3, 'result': function_mock.return_value, 'usage': ANY}])
+
+    @patch('mpmq.handler.share_result')
+    def test__queue_handler_Should_AddSharedResultToResultQueue_When_ResultThreshold(self, share_result_patch, *patches):
+        function_mock = Mock(__name__='fn1')
+        function_mock.return_value = 'function return value'
+        result_queue_mock = Mock()
+        queue_handler(function_mock, result_threshold=10)(offset=3, result_queue=result_queue_mock)
+        share_result_patch.assert_called_once_with(function_mock.return_value, 10)
+        result_queue_mock.put.assert_called_once_with({'offset': 3, 'result': share_result_patch.return_value, 'usage': ANY})
 
     def test__queue_handler_Should_AddDoneToMessageQueue_When_DecoratedFunctionIsPassedMessageQueueAndCompletes(self, *patches):
         function_mock = Mock(__name__='fn1')
@@ -107,19 +254,44 @@ class TestHandler(unittest.TestCase):
         message_queue_mock = Mock()
         result = queue_handler(function_mock)(offset=3, message_queue=message_queue_mock)
         self.assertEqual(result, function_mock.return_value)
-        self.assertTrue(call('#3-execution of fn1 offset:3 ended') in message_queue_mock.put.mock_calls)
-        self.assertTrue(call('#3-DONE') in message_queue_mock.put.mock_calls)
+        self.assertTrue(call((3, logging.DEBUG, LOG_MESSAGE, 'execution of fn1 offset:3 ended', ANY)) in message_queue_mock.put.mock_calls)
+        self.assertEqual(message_queue_mock.put.mock_calls[-1], call((3, None, CONTROL_MESSAGE, 'DONE', ANY)))
+
+    def test__queue_handler_Should_AddDroppedCountToResultAndPutControlMessages_When_MessageQueueFull(self, *patches):
+        function_mock = Mock(__name__='fn1')
+        function_mock.side_effect = lambda: [logger.debug('message1'), logger.debug('message2')]
+        message_queue_mock = Mock()
+
+        def put(item, block=True):
+            if not block:
+                raise Full()
+
+        message_queue_mock.put.side_effect = put
+        result_queue_mock = Mock()
+        queue_handler(function_mock, message_policy=SAMPLE, max_messages=1)(
+            offset=3, message_queue=message_queue_mock, result_queue=result_queue_mock)
+        # the two messages of the function and the debug messages of adding the result and of the execution ending
+        result_queue_mock.put.assert_called_once_with({'offset': 3, 'result': ANY, 'usage': ANY, 'dropped': 4})
+        message_queue_mock.put.assert_called_with((3, None, CONTROL_MESSAGE, 'DONE', ANY))
 
     def test__queue_handler_Should_AddErrorMessagesToMessageQueue_When_FunctionThrowsException(self, *patches):
         function_mock = Mock(__name__='fn1')
         function_mock.side_effect = Exception('function exception')
         message_queue_mock = Mock()
         queue_handler(function_mock)(offset=3, message_queue=message_queue_mock)
-        call1 = call('#3-ERROR: function exception')
-        call2 = call('#3-ERROR')
-        call4 = call('#3-execution of fn1 offset:3 ended')
-        call3 = call('#3-DONE')
-        self.assertEqual(message_queue_mock.put.mock_calls, [call1, call2, call4, call3])
+        call1 = call((3, logging.ERROR, LOG_MESSAGE, 'function exception', ANY))
+        call2 = call((3, None, CONTROL_MESSAGE, 'ERROR', ANY))
+        call3 = call((3, logging.DEBUG, LOG_MESSAGE, 'execution of fn1 offset:3 ended', ANY))
+        call4 = call((3, None, CONTROL_MESSAGE, 'DONE', ANY))
+        self.assertEqual(message_queue_mock.put.mock_calls, [call1, call2, call3, call4])
+
+    def test__queue_handler_Should_NotPassControlMessagesAsLogMessages_When_FunctionLogsControlText(self, *patches):
+        function_mock = Mock(__name__='fn1')
+        function_mock.side_effect = lambda: logger.debug('DONE')
+        message_queue_mock = Mock()
+        queue_handler(function_mock)(offset=3, message_queue=message_queue_mock)
+        self.assertTrue(call((3, logging.DEBUG, LOG_MESSAGE, 'DONE', ANY)) in message_queue_mock.put.mock_calls)
+        self.assertEqual(message_queue_mock.put.mock_calls.count(call((3, None, CONTROL_MESSAGE, 'DONE', ANY))), 1)
 
     def test__queue_handler_Should_AddExceptionToResultQueue_When_FunctionThrowsException(self, *patches):
         function_mock = Mock(__name__='fn1')
@@ -127,7 +299,163 @@ class TestHandler(unittest.TestCase):
         message_queue_mock = Mock()
         result_queue_mock = Mock()
         queue_handler(function_mock)(offset=3, message_queue=message_queue_mock, result_queue=result_queue_mock)
-        result_queue_mock.put.assert_called_once_with({'offset': 3, 'result': function_mock.side_effect})
+        result_queue_mock.put.assert_called_once_with({'offset': 3, 'result': function_mock.side_effect, 'usage': ANY})
+
+    def test__queue_handler_Should_SendBatchBeforeControlMessages_When_MessageBatchSize(self, *patches):
+        function_mock = Mock(__name__='fn1')
+        function_mock.side_effect = lambda: logger.debug('message')
+        message_queue_mock = Mock()
+        queue_handler(function_mock, message_batch_size=100)(offset=3, message_queue=message_queue_mock)
+        self.assertEqual(len(message_queue_mock.put.mock_calls), 2)
+        batch = message_queue_mock.put.mock_calls[0].args[0]
+        self.assertIsInstance(batch, list)
+        self.assertTrue((3, logging.DEBUG, LOG_MESSAGE, 'message', ANY) in batch)
+        self.assertEqual(batch[-1], (3, logging.DEBUG, LOG_MESSAGE, 'execution of fn1 offset:3 ended', ANY))
+        self.assertEqual(message_queue_mock.put.mock_calls[1], call((3, None, CONTROL_MESSAGE, 'DONE', ANY)))
+
+    def test__queue_handler_Should_SendBatchBeforeErrorControlMessage_When_MessageBatchSizeAndFunctionThrowsException(self, *patches):
+        function_mock = Mock(__name__='fn1')
+        function_mock.side_effect = Exception('function exception')
+        message_queue_mock = Mock()
+        queue_handler(function_mock, message_batch_size=100)(offset=3, message_queue=message_queue_mock)
+        puts = [put_call.args[0] for put_call in message_queue_mock.put.mock_calls]
+        self.assertEqual(len(puts), 4)
+        self.assertTrue((3, logging.ERROR, LOG_MESSAGE, 'function exception', ANY) in puts[0])
+        self.assertEqual(puts[1], (3, None, CONTROL_MESSAGE, 'ERROR', ANY))
+        self.assertEqual(puts[2], [(3, logging.DEBUG, LOG_MESSAGE, 'execution of fn1 offset:3 ended', ANY)])
+        self.assertEqual(puts[3], (3, None, CONTROL_MESSAGE, 'DONE', ANY))
+
+    def test__queue_handler_Should_OnlySendMessagesAtLevel_When_MessageLevel(self, *patches):
+        def function():
+            logger.debug('debug message')
+            logger.info('info message')
+
+        message_queue_mock = Mock()
+        queue_handler(function, message_level=logging.INFO)(offset=3, message_queue=message_queue_mock)
+        self.assertEqual(message_queue_mock.put.mock_calls, [
+            call((3, logging.INFO, LOG_MESSAGE, 'info message', ANY)),
+            call((3, None, CONTROL_MESSAGE, 'DONE', ANY))
+        ])
+
+    def test__queue_handler_Should_SendErrorControlMessage_When_MessageLevelAboveError(self, *patches):
+        function_mock = Mock(__name__='fn1')
+        function_mock.side_effect = Exception('function exception')
+        message_queue_mock = Mock()
+        queue_handler(function_mock, message_level=logging.CRITICAL)(offset=3, message_queue=message_queue_mock)
+        self.assertEqual(message_queue_mock.put.mock_calls, [
+            call((3, None, CONTROL_MESSAGE, 'ERROR', ANY)),
+            call((3, None, CONTROL_MESSAGE, 'DONE', ANY))
+        ])
+
+    def test__queue_handler_Should_FilterMessagesByLogger_When_IncludeAndExcludeLoggers(self, *patches):
+        def function():
+            logging.getLogger('app').debug('app message')
+            logging.getLogger('app.db').debug('db message')
+            logging.getLogger('other').debug('other message')
+
+        message_queue_mock = Mock()
+        queue_handler(function, include_loggers=['app'], exclude_loggers=['app.db'])(offset=3, message_queue=message_queue_mock)
+        self.assertEqual(message_queue_mock.put.mock_calls, [
+            call((3, logging.DEBUG, LOG_MESSAGE, 'app message', ANY)),
+            call((3, None, CONTROL_MESSAGE, 'DONE', ANY))
+        ])
+
+    def test__LoggerFilter_Should_ReturnExpected_When_Include(self, *patches):
+        logger_filter = LoggerFilter(include=['app'])
+        self.assertTrue(logger_filter.filter(logging.makeLogRecord({'name': 'app'})))
+        self.assertTrue(logger_filter.filter(logging.makeLogRecord({'name': 'app.db'})))
+        self.assertFalse(logger_filter.filter(logging.makeLogRecord({'name': 'application'})))
+        self.assertFalse(logger_filter.filter(logging.makeLogRecord({'name': 'other'})))
+
+    def test__LoggerFilter_Should_ReturnExpected_When_Exclude(self, *patches):
+        logger_filter = LoggerFilter(exclude=['urllib3'])
+        self.assertFalse(logger_filter.filter(logging.makeLogRecord({'name': 'urllib3.connectionpool'})))
+        self.assertTrue(logger_filter.filter(logging.makeLogRecord({'name': 'app'})))
+
+    def test__BufferedQueueHandler_Should_PutBatch_When_BatchSizeReached(self, *patches):
+        message_queue_mock = Mock()
+        handler = BufferedQueueHandler(message_queue_mock, 1, 2, interval=60)
+        handler.emit(Mock(msg='message1', levelno=20, created=1.5))
+        message_queue_mock.put.assert_not_called()
+        handler.emit(Mock(msg='message2', levelno=10, created=2.5))
+        message_queue_mock.put.assert_called_once_with([(1, 20, LOG_MESSAGE, 'message1', 1.5), (1, 10, LOG_MESSAGE, 'message2', 2.5)])
+        self.assertEqual(handler.buffer, [])
+        self.assertIsNone(handler.timer)
+
+    def test__BufferedQueueHandler_Should_PutBatch_When_IntervalElapsed(self, *patches):
+        message_queue_mock = Mock()
+        handler = BufferedQueueHandler(message_queue_mock, 1, 100, interval=.01)
+        handler.emit(Mock(msg='message1', levelno=20, created=1.5))
+        for _ in range(100):
+            if message_queue_mock.put.called:
+                break
+            time.sleep(.01)
+        message_queue_mock.put.assert_called_once_with([(1, 20, LOG_MESSAGE, 'message1', 1.5)])
+
+    def test__BufferedQueueHandler_Should_PutBatch_When_Closed(self, *patches):
+        message_queue_mock = Mock()
+        handler = BufferedQueueHandler(message_queue_mock, 1, 100, interval=60)
+        handler.emit(Mock(msg='message1', levelno=20, created=1.5))
+        handler.close()
+        message_queue_mock.put.assert_called_once_with([(1, 20, LOG_MESSAGE, 'message1', 1.5)])
+        self.assertIsNone(handler.timer)
+
+    def test__BufferedQueueHandler_Should_NotPutEmptyBatch_When_Flushed(self, *patches):
+        message_queue_mock = Mock()
+        handler = BufferedQueueHandler(message_queue_mock, 1, 100)
+        handler.flush()
+        message_queue_mock.put.assert_not_called()
+
+    def test__QueueHandler_Should_DropNewRecords_When_SamplePolicyAndQueueFull(self, *patches):
+        message_queue = Queue(2)
+        handler = QueueHandler(message_queue, 1, message_policy=SAMPLE, max_messages=2)
+        for index in range(5):
+            handler.emit(Mock(msg=f'message{index}', levelno=20, created=1.5))
+        self.assertEqual([message_queue.get()[3] for _ in range(2)], ['message0', 'message1'])
+        handler.emit(Mock(msg='message5', levelno=20, created=1.5))
+        self.assertEqual(message_queue.get()[3], 'message5')
+        self.assertEqual(handler.drain(), 3)
+        self.assertEqual(handler.dropped, 0)
+
+    def test__QueueHandler_Should_HoldLatestRecords_When_DropOldestPolicyAndQueueFull(self, *patches):
+        message_queue = Queue(2)
+        handler = QueueHandler(message_queue, 1, message_policy=DROP_OLDEST, max_messages=2)
+        for index in range(6):
+            handler.emit(Mock(msg=f'message{index}', levelno=20, created=1.5))
+        self.assertEqual([record[3] for record in handler.pending], ['message4', 'message5'])
+        self.assertEqual([message_queue.get()[3] for _ in range(2)], ['message0', 'message1'])
+        handler.emit(Mock(msg='message6', levelno=20, created=1.5))
+        self.assertEqual([message_queue.get()[3] for _ in range(2)], ['message4', 'message5'])
+        self.assertEqual([record[3] for record in handler.pending], ['message6'])
+        self.assertEqual(handler.drain(), 2)
+        self.assertEqual(message_queue.get()[3], 'message6')
+        self.assertEqual(len(handler.pending), 0)
+
+    def test__QueueHandler_Should_SendLatestRecords_When_DrainedAndQueueFull(self, *patches):
+        message_queue_mock = Mock()
+        sent = []
+
+        def put(item, block=True):
+            if not block:
+                raise Full()
+            sent.append(item[3])
+
+        message_queue_mock.put.side_effect = put
+        handler = QueueHandler(message_queue_mock, 1, message_policy=DROP_OLDEST, max_messages=2)
+        for index in range(5):
+            handler.emit(Mock(msg=f'message{index}', levelno=20, created=1.5))
+        self.assertEqual(sent, [])
+        self.assertEqual(handler.drain(), 3)
+        self.assertEqual(sent, ['message3', 'message4'])
+        self.assertEqual(len(handler.pending), 0)
+
+    def test__BufferedQueueHandler_Should_CountBatchRecords_When_SamplePolicyDropsBatch(self, *patches):
+        message_queue = Queue(1)
+        handler = BufferedQueueHandler(message_queue, 1, 2, interval=60, message_policy=SAMPLE, max_messages=1)
+        for index in range(4):
+            handler.emit(Mock(msg=f'message{index}', levelno=20, created=1.5))
+        self.assertEqual([record[3] for record in message_queue.get()], ['message0', 'message1'])
+        self.assertEqual(handler.drain(), 2)
 
     @patch('mpmq.handler.Handler')
     def test__QueueHandler_Should_PutInfoMessageToMessageQueue_When_EmitInfoRecord(self, *patches):
@@ -135,10 +463,10 @@ class TestHandler(unittest.TestCase):
         process_number = 1
         queue_handler_object = QueueHandler(message_queue_mock, process_number)
 
-        record_mock = Mock(msg='some message', levelno=20)
+        record_mock = Mock(msg='some message', levelno=20, created=1.5)
 
         queue_handler_object.emit(record_mock)
-        message_queue_mock.put.assert_called_with('#1-INFO: some message')
+        message_queue_mock.put.assert_called_with((1, 20, LOG_MESSAGE, 'some message', 1.5))
 
     @patch('mpmq.handler.Handler')
     def test__QueueHandler_Should_PutInfoMessageToMessageQueue_When_EmitWarnRecord(self, *patches):
@@ -146,10 +474,10 @@ class TestHandler(unittest.TestCase):
         process_number = 1
         queue_handler_object = QueueHandler(message_queue_mock, process_number)
 
-        record_mock = Mock(msg='some message', levelno=30)
+        record_mock = Mock(msg='some message', levelno=30, created=1.5)
 
         queue_handler_object.emit(record_mock)
-        message_queue_mock.put.assert_called_with('#1-WARN: some message')
+        message_queue_mock.put.assert_called_with((1, 30, LOG_MESSAGE, 'some message', 1.5))
 
     @patch('mpmq.handler.Handler')
     def test__QueueHandler_Should_PutErrorMessageToMessageQueue_When_EmitErrorRecord(self, *patches):
@@ -157,7 +485,7 @@ class TestHandler(unittest.TestCase):
         process_number = 1
         queue_handler_object = QueueHandler(message_queue_mock, process_number)
 
-        record_mock = Mock(msg='some message', levelno=40)
+        record_mock = Mock(msg='some message', levelno=40, created=1.5)
 
         queue_handler_object.emit(record_mock)
-        message_queue_mock.put.assert_called_with('#1-ERROR: some message')
+        message_queue_mock.put.assert_called_with((1, 40, LOG_MESSAGE, 'some message', 1.5))
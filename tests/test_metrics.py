@@ -0,0 +1,83 @@
+
+# Copyright (c) 2021 Intel Corporation
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#      http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import unittest
+from mock import patch
+from mock import Mock
+
+from mpmq.metrics import get_usage
+from mpmq.metrics import get_usage_since
+from mpmq.metrics import get_seconds
+from mpmq.metrics import format_prometheus
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        """
+        """
+        pass
+
+    def tearDown(self):
+        """
+        """
+        pass
+
+    @patch('mpmq.metrics.sys')
+    @patch('mpmq.metrics.resource')
+    def test__get_usage_Should_ReturnCpuTimeAndMaxRssInBytes_When_Linux(self, resource_patch, sys_patch, *patches):
+        sys_patch.platform = 'linux'
+        resource_patch.getrusage.return_value = Mock(ru_utime=1.5, ru_stime=.5, ru_maxrss=1000)
+        self.assertEqual(get_usage(), (2.0, 1024000))
+
+    @patch('mpmq.metrics.sys')
+    @patch('mpmq.metrics.resource')
+    def test__get_usage_Should_ReturnMaxRssInBytes_When_Darwin(self, resource_patch, sys_patch, *patches):
+        sys_patch.platform = 'darwin'
+        resource_patch.getrusage.return_value = Mock(ru_utime=1.5, ru_stime=.5, ru_maxrss=1000)
+        self.assertEqual(get_usage(), (2.0, 1000))
+
+    @patch('mpmq.metrics.resource', None)
+    def test__get_usage_Should_ReturnNone_When_ResourceNotAvailable(self, *patches):
+        self.assertIsNone(get_usage())
+
+    @patch('mpmq.metrics.get_usage', return_value=(3.5, 2048))
+    def test__get_usage_since_Should_ReturnExpected_When_Called(self, *patches):
+        self.assertEqual(get_usage_since((1.0, 1024)), {'pid': os.getpid(), 'cpu_time': 2.5, 'max_rss': 2048})
+
+    @patch('mpmq.metrics.get_usage', return_value=None)
+    def test__get_usage_since_Should_ReturnNone_When_ResourceNotAvailable(self, *patches):
+        self.assertIsNone(get_usage_since(None))
+
+    def test__get_seconds_Should_ReturnExpected_When_Called(self, *patches):
+        self.assertEqual(get_seconds(1000000000, 3500000000), 2.5)
+        self.assertIsNone(get_seconds(1000000000, None))
+
+    def test__format_prometheus_Should_ReturnExpected_When_Called(self, *patches):
+        metrics = {
+            'processes': {0: {'run_time': 1.5, 'cpu_time': None}},
+            'workers': {123: {'tasks': 2, 'cpu_time': 1.25, 'max_rss': 4096}},
+            'summary': {'completed': 1, 'wall_time': None}
+        }
+        result = format_prometheus(metrics)
+        self.assertIn('# TYPE mpmq_processes_completed_total counter\nmpmq_processes_completed_total 1\n', result)
+        self.assertNotIn('mpmq_wall_time_seconds', result)
+        self.assertIn('mpmq_process_run_time_seconds{offset="0"} 1.5\n', result)
+        self.assertNotIn('mpmq_process_cpu_time_seconds', result)
+        self.assertIn('# TYPE mpmq_worker_tasks_total counter\nmpmq_worker_tasks_total{pid="123"} 2\n', result)
+        self.assertIn('mpmq_worker_max_rss_bytes{pid="123"} 4096\n', result)
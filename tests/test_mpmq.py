@@ -18,15 +18,26 @@ from mock import patch
 from mock import call
 from mock import Mock
 from mock import MagicMock
+from mock import ANY
 
 from queue import Empty
+from queue import Full
 
 from mpmq.mpmq import MPmq
 from mpmq.mpmq import NoActiveProcesses
+from mpmq.mpmq import ProcessLost
 from mpmq.mpmq import TIMEOUT
+from mpmq.mpmq import WAIT_TIMEOUT
+from mpmq.mpmq import pool_worker
+from mpmq.mpmq import LazyQueue
+from mpmq.checkpoint import Checkpoint
+from mpmq.cache import ResultCache
 from mpmq.handler import queue_handler
+from mpmq.handler import LOG_MESSAGE
+from mpmq.handler import CONTROL_MESSAGE
 
 import sys
+import json
 import datetime
 import logging
 logger = logging.getLogger(__name__)
@@ -65,6 +76,105 @@ class TestMPmq(unittest.TestCase):
         client.populate_process_queue()
         self.assertEqual(client.process_queue.qsize(), 3)
 
+    @patch('mpmq.mpmq.os.cpu_count', return_value=8)
+    def test__init_Should_SetDefaults_When_ProcessDataIsIterator(self, *patches):
+        process_data = ({'range': index} for index in range(3))
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=process_data)
+        self.assertTrue(client.lazy)
+        self.assertEqual(client.processes_to_start, 8)
+        self.assertIsInstance(client.process_queue, LazyQueue)
+
+    def test__init_Should_RaiseValueError_When_ProcessDataIsIteratorAndChunksizeAuto(self, *patches):
+        process_data = iter([{}, {}])
+        with self.assertRaises(ValueError):
+            MPmq(function=Mock(__name__='mockfunc'), process_data=process_data, pool=True, chunksize='auto')
+
+    def test__populate_process_queue_Should_NotConsumeProcessData_When_Lazy(self, *patches):
+        consumed = []
+
+        def get_process_data():
+            for index in range(3):
+                consumed.append(index)
+                yield {'range': index}
+
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=get_process_data(), processes_to_start=2)
+        client.populate_process_queue()
+        self.assertEqual(consumed, [])
+        self.assertEqual(client.process_queue.get(), (0, {'range': 0}))
+        self.assertEqual(consumed, [0])
+
+    @patch('mpmq.MPmq.start_next_process')
+    def test__purge_process_queue_Should_ClearLazyQueue_When_Lazy(self, *patches):
+        process_data = iter([{'range': '0-1'}, {'range': '2-3'}])
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=process_data, processes_to_start=1)
+        client.purge_process_queue()
+        self.assertTrue(client.process_queue.empty())
+
+    @patch('mpmq.MPmq.collect_results')
+    @patch('mpmq.MPmq.on_complete_process')
+    def test__complete_process_Should_RemoveProcessMetaData_When_Lazy(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=iter([{}]), processes_to_start=1)
+        client.processes[0] = {'process': Mock(), 'start_time': datetime.datetime.now(), 'stop_time': None, 'duration': None}
+        client.active_processes = 1
+        client.complete_process(0)
+        self.assertEqual(client.processes, {})
+        self.assertEqual(client.completed_processes, 1)
+
+    def test__LazyQueue_Should_PullItemsOnDemand_When_Called(self, *patches):
+        lazy_queue = LazyQueue(enumerate(['a', 'b']))
+        self.assertEqual(lazy_queue.qsize(), 0)
+        self.assertFalse(lazy_queue.empty())
+        self.assertEqual(lazy_queue.qsize(), 1)
+        self.assertEqual(lazy_queue.get(), (0, 'a'))
+        lazy_queue.put((5, 'z'))
+        self.assertEqual(lazy_queue.get(), (5, 'z'))
+        self.assertEqual(lazy_queue.get(), (1, 'b'))
+        self.assertTrue(lazy_queue.empty())
+        with self.assertRaises(Empty):
+            lazy_queue.get()
+
+    @patch('mpmq.mpmq.share_value')
+    def test__share_shared_data_Should_ReplaceShareableValuesWithHandles_When_Called(self, share_value_patch, *patches):
+        segment_mock = Mock()
+        share_value_patch.side_effect = [('--handle--', segment_mock), None]
+        shared_data = {'blob': b'abc', 'count': 3}
+        client = MPmq(function=Mock(__name__='mockfunc'), shared_data=shared_data, shared_memory=True)
+        client.share_shared_data()
+        self.assertEqual(client.shared_data, {'blob': '--handle--', 'count': 3})
+        self.assertEqual(shared_data, {'blob': b'abc', 'count': 3})
+        self.assertEqual(client.shared_segments, [segment_mock])
+
+    @patch('mpmq.mpmq.share_value')
+    def test__share_shared_data_Should_DoNothing_When_SharedDataNotDict(self, share_value_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), shared_data='--shared-data--', shared_memory=True)
+        client.share_shared_data()
+        share_value_patch.assert_not_called()
+
+    def test__release_shared_memory_Should_CloseAndUnlinkSegments_When_Called(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'))
+        segment_mock = Mock()
+        client.shared_segments = [segment_mock]
+        client.release_shared_memory()
+        segment_mock.close.assert_called_once_with()
+        segment_mock.unlink.assert_called_once_with()
+        self.assertEqual(client.shared_segments, [])
+
+    @patch('mpmq.MPmq.start_next_process')
+    @patch('mpmq.MPmq.share_shared_data')
+    def test__start_processes_Should_ShareSharedData_When_SharedMemory(self, share_shared_data_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), shared_memory=True)
+        client.start_processes()
+        share_shared_data_patch.assert_called_once_with()
+
+    @patch('mpmq.MPmq.final')
+    @patch('mpmq.MPmq.get_results')
+    @patch('mpmq.MPmq.execute_run')
+    @patch('mpmq.MPmq.release_shared_memory')
+    def test__execute_Should_ReleaseSharedMemory_When_Called(self, release_shared_memory_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), shared_memory=True)
+        client.execute()
+        release_shared_memory_patch.assert_called_once_with()
+
     @patch('mpmq.MPmq.start_next_process')
     def test__start_processes_Should_CallStartNextProcess_When_Called(self, start_next_process_patch, *patches):
         function_mock = Mock(__name__='mockfunc')
@@ -151,10 +261,11 @@ class TestMPmq(unittest.TestCase):
         client.purge_process_queue()
         self.assertTrue(client.process_queue.empty())
 
+    @patch('mpmq.MPmq.collect_results')
     @patch('mpmq.MPmq.on_complete_process')
     @patch('mpmq.mpmq.datetime')
     @patch('mpmq.MPmq.get_duration')
-    def test__complete_process_Should_CallExpected_When_Called(self, get_duration_patch, datetime_patch, on_complete_process_patch, *patches):
+    def test__complete_process_Should_CallExpected_When_Called(self, get_duration_patch, datetime_patch, on_complete_process_patch, collect_results_patch, *patches):
         function_mock = Mock(__name__='mockfunc')
         process_data = [{'range': '0-1'}, {'range': '2-3'}, {'range': '4-5'}]
         client = MPmq(function=function_mock, process_data=process_data)
@@ -164,6 +275,7 @@ class TestMPmq(unittest.TestCase):
         client.complete_process('0')
         self.assertEqual(client.processes['0'], {'process': process_mock, 'start_time': '--time--', 'stop_time': datetime_patch.datetime.now.return_value, 'duration': get_duration_patch.return_value})
         on_complete_process_patch.assert_called_once_with()
+        collect_results_patch.assert_called_once_with('0')
 
     def test__get_results_Should_CallExpected_When_Called(self, *patches):
         result_queue_mock = Mock()
@@ -177,10 +289,337 @@ class TestMPmq(unittest.TestCase):
         process_data = [{'range': '0-1'}, {'range': '2-3'}, {'range': '4-5'}]
         client = MPmq(function=function_mock, process_data=process_data)
         client.result_queue = result_queue_mock
+        client.pending_results = set(range(len(process_data)))
         results = client.get_results()
         expected_results = ['--result0--', '--result1--', '--result2--']
         self.assertEqual(results, expected_results)
 
+    def test__get_results_Should_ReturnResultsInOffsetOrder_When_ResultsArriveOutOfOrder(self, *patches):
+        result_queue_mock = Mock()
+        result_queue_mock.get.side_effect = [
+            {'offset': 2, 'result': '--result2--'},
+            {'offset': 1, 'result': '--result1--'},
+            {'offset': 0, 'result': '--result0--'},
+            Empty('empty')
+        ]
+        function_mock = Mock(__name__='mockfunc')
+        process_data = [{'range': '0-1'}, {'range': '2-3'}, {'range': '4-5'}]
+        client = MPmq(function=function_mock, process_data=process_data)
+        client.result_queue = result_queue_mock
+        client.pending_results = set(range(len(process_data)))
+        results = client.get_results()
+        expected_results = ['--result0--', '--result1--', '--result2--']
+        self.assertEqual(results, expected_results)
+
+    @patch('mpmq.mpmq.Queue')
+    def test__init_Should_CreateTaskQueue_When_Pool(self, queue_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), pool=True)
+        self.assertTrue(client.pool)
+        self.assertEqual(client.task_queue, queue_patch.return_value)
+        self.assertEqual(client.workers, [])
+
+    @patch('mpmq.mpmq.Process')
+    def test__start_worker_Should_StartWorkerProcess_When_Called(self, process_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), pool=True)
+        client.start_worker()
+        process_patch.assert_called_once_with(
+            target=pool_worker,
+            args=(client.function, client.task_queue, client.message_queue, client.result_queue, {}, client.use_kwargs,
+                  client.worker_status, 0, None))
+        process_patch.return_value.start.assert_called_once_with()
+        self.assertEqual(client.workers, [process_patch.return_value])
+
+    @patch('mpmq.MPmq.start_worker')
+    def test__start_processes_Should_StartOneWorkerPerChunk_When_FewerChunksThanProcessesToStart(self, start_worker_patch, *patches):
+        process_data = [{'range': '0-1'}, {'range': '2-3'}, {'range': '4-5'}]
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=process_data, processes_to_start=4, pool=True, chunksize=2)
+        client.task_queue = Mock()
+
+        def start_worker():
+            client.workers.append(Mock())
+
+        start_worker_patch.side_effect = start_worker
+        client.start_processes()
+        self.assertEqual(len(start_worker_patch.mock_calls), 2)
+
+    @patch('mpmq.MPmq.start_worker')
+    def test__start_next_process_Should_NotStartWorker_When_ProcessesToStartWorkersStarted(self, start_worker_patch, *patches):
+        process_data = [{'range': '0-1'}, {'range': '2-3'}, {'range': '4-5'}]
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=process_data, processes_to_start=1, pool=True)
+        client.task_queue = Mock()
+        client.workers = [Mock()]
+        client.populate_process_queue()
+        client.start_next_process()
+        start_worker_patch.assert_not_called()
+
+    def test__stop_workers_Should_ReceivePendingResultsBeforeJoin_When_Called(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), pool=True)
+        client.task_queue = Mock()
+        parent_mock = Mock()
+        client.receive_pending_results = parent_mock.receive_pending_results
+        client.workers = [parent_mock.worker]
+        client.stop_workers()
+        self.assertEqual(parent_mock.mock_calls, [call.receive_pending_results(), call.worker.join(TIMEOUT)])
+
+    def test__stop_workers_Should_SendSentinelAndJoinWorkers_When_Called(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), pool=True)
+        client.task_queue = Mock()
+        worker1_mock = Mock()
+        worker2_mock = Mock()
+        client.workers = [worker1_mock, worker2_mock]
+        client.stop_workers()
+        self.assertEqual(client.task_queue.put.mock_calls, [call(None), call(None)])
+        worker1_mock.join.assert_called_once_with(TIMEOUT)
+        worker2_mock.join.assert_called_once_with(TIMEOUT)
+        self.assertEqual(client.workers, [])
+
+    @patch('mpmq.MPmq.on_start_process')
+    @patch('mpmq.MPmq.start_worker')
+    @patch('mpmq.mpmq.Process')
+    def test__start_next_process_Should_PutTaskOnTaskQueue_When_Pool(self, process_patch, start_worker_patch, on_start_process_patch, *patches):
+        process_data = [{'range': '0-1'}, {'range': '2-3'}, {'range': '4-5'}]
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=process_data, pool=True)
+        client.task_queue = Mock()
+        client.populate_process_queue()
+        client.start_next_process()
+        client.task_queue.put.assert_called_once_with([(0, {'range': '0-1'})])
+        start_worker_patch.assert_called_once_with()
+        process_patch.assert_not_called()
+        self.assertIsNone(client.processes[0]['process'])
+        self.assertEqual(client.active_processes, 1)
+        on_start_process_patch.assert_called_once_with()
+
+    @patch('mpmq.MPmq.collect_results')
+    @patch('mpmq.MPmq.on_complete_process')
+    def test__complete_process_Should_NotJoin_When_Pool(self, on_complete_process_patch, collect_results_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), pool=True)
+        client.processes[0] = {'process': None, 'start_time': datetime.datetime.now(), 'stop_time': None, 'duration': None}
+        client.active_processes = 1
+        client.complete_process(0)
+        self.assertIsNotNone(client.processes[0]['duration'])
+        self.assertEqual(client.active_processes, 0)
+        self.assertEqual(client.completed_processes, 1)
+        on_complete_process_patch.assert_called_once_with()
+
+    def test__terminate_processes_Should_TerminateWorkers_When_Pool(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), pool=True)
+        client.processes = {0: {'process': None}}
+        worker1_mock = Mock()
+        worker1_mock.is_alive.return_value = False
+        worker2_mock = Mock()
+        client.workers = [worker1_mock, worker2_mock]
+        client.terminate_processes()
+        worker1_mock.terminate.assert_not_called()
+        worker2_mock.terminate.assert_called_once_with()
+
+    @patch('mpmq.MPmq.start_processes')
+    @patch('mpmq.MPmq.stop_workers')
+    @patch('mpmq.MPmq.get_message')
+    def test__run_Should_StopWorkers_When_Pool(self, get_message_patch, stop_workers_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), pool=True)
+        get_message_patch.side_effect = [NoActiveProcesses()]
+        client.run()
+        stop_workers_patch.assert_called_once_with()
+
+    def test__get_arguments_Should_ReturnKwargs_When_UseKwargs(self, *patches):
+        result = MPmq.get_arguments({'range': '0-1'}, {'key1': 'value1'}, True)
+        self.assertEqual(result, ((), {'range': '0-1', 'key1': 'value1'}))
+
+    def test__get_arguments_Should_ReturnArgs_When_NotUseKwargs(self, *patches):
+        result = MPmq.get_arguments({'range': '0-1'}, {'key1': 'value1'}, False)
+        self.assertEqual(result, (({'range': '0-1'}, {'key1': 'value1'}), {}))
+
+    def test__pool_worker_Should_ExecuteTasksUntilSentinel_When_Called(self, *patches):
+        function_mock = Mock()
+        task_queue_mock = Mock()
+        task_queue_mock.get.side_effect = [[(0, {'range': '0-1'}), (1, {'range': '2-3'})], [(2, {'range': '4-5'})], None]
+        result_queue_mock = Mock()
+        pool_worker(function_mock, task_queue_mock, '--message-queue--', result_queue_mock, {'key1': 'value1'}, True)
+        self.assertEqual(function_mock.mock_calls, [
+            call(offset=0, message_queue='--message-queue--', result_queue=ANY, range='0-1', key1='value1'),
+            call(offset=1, message_queue='--message-queue--', result_queue=ANY, range='2-3', key1='value1'),
+            call(offset=2, message_queue='--message-queue--', result_queue=ANY, range='4-5', key1='value1')
+        ])
+        self.assertEqual(result_queue_mock.put.call_count, 2)
+
+    def test__pool_worker_Should_PutChunkResultsAsSingleBatch_When_Called(self, *patches):
+
+        def function_mock(*args, offset=None, message_queue=None, result_queue=None, **kwargs):
+            result_queue.put({'offset': offset, 'result': offset * 10})
+
+        task_queue_mock = Mock()
+        task_queue_mock.get.side_effect = [[(0, {}), (1, {}), (2, {})], None]
+        result_queue_mock = Mock()
+        pool_worker(function_mock, task_queue_mock, '--message-queue--', result_queue_mock, {}, True)
+        result_queue_mock.put.assert_called_once_with([
+            {'offset': 0, 'result': 0},
+            {'offset': 1, 'result': 10},
+            {'offset': 2, 'result': 20}])
+
+    @patch('mpmq.mpmq.time.monotonic_ns', return_value=100)
+    def test__pool_worker_Should_RecordStatus_When_Status(self, *patches):
+        status = [-1] * 6
+        recorded = []
+
+        def function_mock(*args, offset=None, message_queue=None, result_queue=None, **kwargs):
+            recorded.append(status[3:6])
+
+        task_queue_mock = Mock()
+        task_queue_mock.get.side_effect = [[(4, {}), (5, {})], None]
+        pool_worker(function_mock, task_queue_mock, '--message-queue--', Mock(), {}, True, status=status, index=1)
+        self.assertEqual(recorded, [[5, 4, 100], [5, 5, 100]])
+        self.assertEqual(status, [-1, -1, -1, 5, 5, -1])
+
+    def test__pool_worker_Should_SkipRemainingTasks_When_StopEventSet(self, *patches):
+        stop_event_mock = Mock()
+        stop_event_mock.is_set.side_effect = [False, True, True]
+        function_mock = Mock()
+        task_queue_mock = Mock()
+        task_queue_mock.get.side_effect = [[(0, {}), (1, {})], [(2, {})], None]
+        result_queue_mock = Mock()
+        pool_worker(function_mock, task_queue_mock, '--message-queue--', result_queue_mock, {}, True, stop_event=stop_event_mock)
+        function_mock.assert_called_once_with(
+            offset=0, message_queue='--message-queue--', result_queue=ANY, stop_event=stop_event_mock)
+        self.assertEqual(result_queue_mock.put.call_count, 2)
+
+    def test__init_Should_RaiseValueError_When_RetriesNotValid(self, *patches):
+        with self.assertRaises(ValueError):
+            MPmq(function=Mock(__name__='mockfunc'), retries=-1)
+        with self.assertRaises(ValueError):
+            MPmq(function=Mock(__name__='mockfunc'), task_timeout=0)
+
+    def test__init_Should_RaiseValueError_When_ChunksizeWithoutPool(self, *patches):
+        with self.assertRaises(ValueError):
+            MPmq(function=Mock(__name__='mockfunc'), chunksize=10)
+
+    def test__get_chunksize_Should_ReturnChunksize_When_Fixed(self, *patches):
+        self.assertEqual(MPmq.get_chunksize(10, 100, 4), 10)
+
+    def test__get_chunksize_Should_ReturnComputedChunksize_When_Auto(self, *patches):
+        self.assertEqual(MPmq.get_chunksize('auto', 100, 4), 7)
+        self.assertEqual(MPmq.get_chunksize('auto', 3, 4), 1)
+
+    def test__get_chunksize_Should_ReturnOne_When_AutoAndNoProcessData(self, *patches):
+        self.assertEqual(MPmq.get_chunksize('auto', 0, 0), 1)
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[], pool=True, chunksize='auto')
+        self.assertEqual(client.chunksize, 1)
+
+    def test__get_chunksize_Should_RaiseValueError_When_Invalid(self, *patches):
+        with self.assertRaises(ValueError):
+            MPmq.get_chunksize(0, 100, 4)
+        with self.assertRaises(ValueError):
+            MPmq.get_chunksize('big', 100, 4)
+
+    @patch('mpmq.MPmq.on_start_process')
+    @patch('mpmq.MPmq.start_worker')
+    def test__start_next_process_Should_DispatchChunk_When_PoolAndChunksize(self, start_worker_patch, on_start_process_patch, *patches):
+        process_data = [{'range': '0-1'}, {'range': '2-3'}, {'range': '4-5'}]
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=process_data, pool=True, chunksize=2)
+        client.task_queue = Mock()
+        client.populate_process_queue()
+        client.start_next_process()
+        client.task_queue.put.assert_called_once_with([(0, {'range': '0-1'}), (1, {'range': '2-3'})])
+        self.assertEqual(client.active_processes, 2)
+        self.assertEqual(len(on_start_process_patch.mock_calls), 2)
+        client.start_next_process()
+        client.task_queue.put.assert_called_with([(2, {'range': '4-5'})])
+
+    def test__can_start_process_Should_ReturnExpected_When_Chunksize(self, *patches):
+        process_data = [{} for _ in range(20)]
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=process_data, processes_to_start=2, pool=True, chunksize=4)
+        client.active_processes = 5
+        self.assertFalse(client.can_start_process())
+        client.active_processes = 4
+        self.assertTrue(client.can_start_process())
+
+    @patch('mpmq.MPmq.complete_process')
+    @patch('mpmq.MPmq.start_next_process')
+    def test__process_control_message_Should_NotStartNextProcess_When_NoCapacity(self, start_next_process_patch, *patches):
+        process_data = [{} for _ in range(20)]
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=process_data, processes_to_start=2, pool=True, chunksize=4)
+        client.populate_process_queue()
+        client.active_processes = 6
+        client.process_control_message(0, 'DONE')
+        start_next_process_patch.assert_not_called()
+
+    def test__get_results_Should_UnpackBatches_When_ResultsChunked(self, *patches):
+        result_queue_mock = Mock()
+        result_queue_mock.get.side_effect = [
+            [{'offset': 2, 'result': '--result2--'}, {'offset': 3, 'result': '--result3--'}],
+            [{'offset': 0, 'result': '--result0--'}, {'offset': 1, 'result': '--result1--'}],
+            Empty('empty')
+        ]
+        process_data = [{}, {}, {}, {}]
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=process_data, pool=True, chunksize=2)
+        client.result_queue = result_queue_mock
+        client.pending_results = set(range(len(process_data)))
+        results = client.get_results()
+        self.assertEqual(results, ['--result0--', '--result1--', '--result2--', '--result3--'])
+
+    def test__get_results_Should_NotWaitForTimeout_When_AllResultsCollected(self, *patches):
+        result_queue_mock = Mock()
+        process_data = [{'range': '0-1'}, {'range': '2-3'}]
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=process_data)
+        client.result_queue = result_queue_mock
+        client._results = {1: '--result1--', 0: '--result0--'}
+        results = client.get_results()
+        self.assertEqual(results, ['--result0--', '--result1--'])
+        result_queue_mock.get.assert_not_called()
+
+    def test__get_results_Should_WaitForPendingResults_When_Called(self, *patches):
+        result_queue_mock = Mock()
+        result_queue_mock.get.side_effect = [{'offset': 1, 'result': '--result1--'}]
+        process_data = [{'range': '0-1'}, {'range': '2-3'}]
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=process_data)
+        client.result_queue = result_queue_mock
+        client._results = {0: '--result0--'}
+        client.pending_results = {1}
+        results = client.get_results()
+        self.assertEqual(results, ['--result0--', '--result1--'])
+        result_queue_mock.get.assert_called_once_with(True, TIMEOUT)
+
+    @patch('mpmq.mpmq.load_result')
+    def test__get_results_Should_LoadSharedResults_When_Called(self, load_result_patch, *patches):
+        load_result_patch.side_effect = lambda result: f'loaded {result}'
+        client = MPmq(function=Mock(__name__='mockfunc'), result_threshold=10)
+        client.result_queue = Mock()
+        client._results = {1: '--handle1--', 0: '--result0--'}
+        self.assertEqual(client.get_results(), ['loaded --result0--', 'loaded --handle1--'])
+
+    @patch('mpmq.mpmq.load_result')
+    def test__pop_results_Should_LoadSharedResults_When_Called(self, load_result_patch, *patches):
+        load_result_patch.side_effect = lambda result: f'loaded {result}'
+        client = MPmq(function=Mock(__name__='mockfunc'), result_threshold=10)
+        client._results = {0: '--handle0--'}
+        self.assertEqual(client.pop_results(True), [(0, 'loaded --handle0--')])
+
+    def test__collect_results_Should_DrainResultQueueWithoutBlocking_When_NoOffset(self, *patches):
+        result_queue_mock = Mock()
+        result_queue_mock.get.side_effect = [
+            {'offset': 0, 'result': '--result0--'},
+            [{'offset': 1, 'result': '--result1--'}, {'offset': 2, 'result': '--result2--'}],
+            Empty('empty')
+        ]
+        client = MPmq(function=Mock(__name__='mockfunc'))
+        client.result_queue = result_queue_mock
+        client.collect_results()
+        self.assertEqual(client._results, {0: '--result0--', 1: '--result1--', 2: '--result2--'})
+        self.assertEqual(result_queue_mock.get.mock_calls, [call(False, TIMEOUT), call(False, TIMEOUT), call(False, TIMEOUT)])
+
+    def test__collect_results_Should_BlockUntilResultReceived_When_Offset(self, *patches):
+        result_queue_mock = Mock()
+        result_queue_mock.get.side_effect = [
+            {'offset': 0, 'result': '--result0--'},
+            {'offset': 1, 'result': '--result1--'},
+            Empty('empty')
+        ]
+        client = MPmq(function=Mock(__name__='mockfunc'))
+        client.result_queue = result_queue_mock
+        client.pending_results = {0, 1}
+        client.collect_results(1)
+        self.assertEqual(result_queue_mock.get.mock_calls, [call(True, TIMEOUT), call(True, TIMEOUT), call(False, TIMEOUT)])
+        self.assertEqual(client._results, {0: '--result0--', 1: '--result1--'})
+
     def test__get_message_Should_ReturnExpected_When_ControlDone(self, *patches):
         process_data = [{'range': '0-1'}]
         client = MPmq(function=Mock(__name__='mockfunc'), process_data=process_data)
@@ -193,7 +632,9 @@ class TestMPmq(unittest.TestCase):
         expected_result = {
             'offset': 0,
             'control': 'DONE',
-            'message': '#0-DONE'
+            'message': '#0-DONE',
+            'level': None,
+            'timestamp': None
         }
         self.assertEqual(result, expected_result)
 
@@ -209,7 +650,9 @@ class TestMPmq(unittest.TestCase):
         expected_result = {
             'offset': 3,
             'control': 'ERROR',
-            'message': '#3-ERROR'
+            'message': '#3-ERROR',
+            'level': None,
+            'timestamp': None
         }
         self.assertEqual(result, expected_result)
 
@@ -225,10 +668,414 @@ class TestMPmq(unittest.TestCase):
         expected_result = {
             'offset': 4,
             'control': None,
-            'message': 'This is a log message'
+            'message': 'This is a log message',
+            'level': None,
+            'timestamp': None
         }
         self.assertEqual(result, expected_result)
 
+    def test__get_message_Should_ReturnExpected_When_ControlRecord(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'))
+        client.message_queue = Mock()
+        client.message_queue.get.return_value = (3, None, CONTROL_MESSAGE, 'DONE', 1.5)
+        expected_result = {
+            'offset': 3,
+            'control': 'DONE',
+            'message': '#3-DONE',
+            'level': None,
+            'timestamp': 1.5
+        }
+        self.assertEqual(client.get_message(), expected_result)
+
+    def test__get_message_Should_ReturnExpected_When_LogRecord(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'))
+        client.message_queue = Mock()
+        client.message_queue.get.return_value = (4, logging.INFO, LOG_MESSAGE, 'This is a log message', 1.5)
+        expected_result = {
+            'offset': 4,
+            'control': None,
+            'message': 'INFO: This is a log message',
+            'level': logging.INFO,
+            'timestamp': 1.5
+        }
+        self.assertEqual(client.get_message(), expected_result)
+
+    def test__get_message_Should_NotReturnControl_When_LogRecordLooksLikeControl(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'))
+        client.message_queue = Mock()
+        client.message_queue.get.return_value = (4, logging.DEBUG, LOG_MESSAGE, 'DONE', 1.5)
+        result = client.get_message()
+        self.assertIsNone(result['control'])
+        self.assertEqual(result['message'], 'DONE')
+
+    def test__get_message_Should_ReturnRecordsInOrder_When_Batch(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'))
+        client.message_queue = Mock()
+        client.message_queue.get.side_effect = [
+            [(4, logging.INFO, LOG_MESSAGE, 'message1', 1.5), (4, logging.DEBUG, LOG_MESSAGE, 'message2', 2.5)],
+            (4, None, CONTROL_MESSAGE, 'DONE', 3.5)
+        ]
+        self.assertEqual(client.get_message()['message'], 'INFO: message1')
+        self.assertEqual(client.get_message()['message'], 'message2')
+        self.assertEqual(client.get_message()['control'], 'DONE')
+        self.assertEqual(client.message_queue.get.call_count, 2)
+
+    def test__init_Should_SetMessageFilters_When_Called(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), message_level='info', include_loggers='app', exclude_loggers=['app.db'])
+        self.assertEqual(client.function.message_level, logging.INFO)
+        self.assertEqual(client.function.include_loggers, ['app'])
+        self.assertEqual(client.function.exclude_loggers, ['app.db'])
+
+    def test__get_message_level_Should_RaiseValueError_When_Invalid(self, *patches):
+        with self.assertRaises(ValueError):
+            MPmq.get_message_level('verbose')
+
+    def test__can_start_process_Should_AcquireSessionSlot_When_Session(self, *patches):
+        session_mock = Mock()
+        session_mock.acquire.return_value = False
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}], session=session_mock)
+        self.assertFalse(client.can_start_process())
+        session_mock.acquire.assert_called_once_with(client)
+
+    def test__can_start_process_Should_NotAcquireSessionSlot_When_NoCapacity(self, *patches):
+        session_mock = Mock()
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}], processes_to_start=1, session=session_mock)
+        client.active_processes = 1
+        self.assertFalse(client.can_start_process())
+        session_mock.acquire.assert_not_called()
+
+    @patch('mpmq.MPmq.start_next_process')
+    def test__process_control_message_Should_StartWaitingProcesses_When_ControlStart(self, start_next_process_patch, *patches):
+        session_mock = Mock()
+        session_mock.acquire.side_effect = [True, False]
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}, {}], session=session_mock)
+        client.populate_process_queue()
+        start_next_process_patch.side_effect = lambda: client.process_queue.get()
+        client.process_control_message(None, 'START')
+        self.assertEqual(start_next_process_patch.call_count, 1)
+        session_mock.withdraw.assert_not_called()
+
+    def test__process_control_message_Should_WithdrawFromSession_When_ControlStartAndProcessQueueEmpty(self, *patches):
+        session_mock = Mock()
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}], session=session_mock)
+        client.process_control_message(None, 'START')
+        session_mock.withdraw.assert_called_once_with(client)
+
+    @patch('mpmq.MPmq.collect_results')
+    def test__complete_process_Should_ReleaseSessionSlot_When_TaskEnds(self, *patches):
+        session_mock = Mock()
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}], session=session_mock)
+        client.add_process(0, None)
+        client.add_process(1, None)
+        client.task_ends.add(1)
+        client.complete_process(0)
+        session_mock.release.assert_not_called()
+        client.complete_process(1)
+        session_mock.release.assert_called_once_with(client)
+        self.assertEqual(client.task_ends, set())
+
+    @patch('mpmq.mpmq.Process')
+    def test__start_next_task_Should_AddLastOffsetOfChunkToTaskEnds_When_Called(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}, {}], pool=True, chunksize=2)
+        client.task_queue = Mock()
+        client.populate_process_queue()
+        client.start_next_task()
+        client.start_next_task()
+        self.assertEqual(client.task_ends, {1, 2})
+
+    def test__get_chunksize_Should_ReturnOne_When_Guided(self, *patches):
+        self.assertEqual(MPmq.get_chunksize('guided', 100, 4), 1)
+
+    def test__get_chunksize_Should_RaiseValueError_When_GuidedAndNoTotal(self, *patches):
+        with self.assertRaises(ValueError):
+            MPmq.get_chunksize('guided', None, 4)
+
+    def test__get_guided_chunksize_Should_ReturnExpected_When_Called(self, *patches):
+        self.assertEqual(MPmq.get_guided_chunksize(100, 4), 7)
+        self.assertEqual(MPmq.get_guided_chunksize(16, 4), 1)
+        self.assertEqual(MPmq.get_guided_chunksize(3, 4), 1)
+
+    @patch('mpmq.mpmq.Process')
+    def test__start_next_task_Should_DispatchShrinkingChunks_When_Guided(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}] * 40, processes_to_start=2, pool=True, chunksize='guided')
+        client.task_queue = Mock()
+        client.populate_process_queue()
+        while not client.process_queue.empty():
+            client.start_next_task()
+        sizes = [len(put_call.args[0]) for put_call in client.task_queue.put.mock_calls]
+        self.assertEqual(sizes, [5, 5, 4, 4, 3, 3, 2, 2, 2, 2, 1, 1, 1, 1, 1, 1, 1, 1])
+        self.assertEqual(sum(sizes), 40)
+
+    def test__can_start_process_Should_ReturnExpected_When_Guided(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}] * 40, processes_to_start=2, pool=True, chunksize='guided')
+        client.active_processes = 30
+        client.task_ends = {4, 9}
+        self.assertTrue(client.can_start_process())
+        client.task_ends = {4, 9, 13}
+        self.assertFalse(client.can_start_process())
+
+    def test__init_Should_RaiseValueError_When_CostAndLazyProcessData(self, *patches):
+        with self.assertRaises(ValueError):
+            MPmq(function=Mock(__name__='mockfunc'), process_data=iter([{}]), cost=[1])
+
+    def test__populate_process_queue_Should_OrderByDecreasingCost_When_CostFunction(self, *patches):
+        process_data = [{'size': 1}, {'size': 3}, {'size': 2}, {'size': 3}]
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=process_data, cost=lambda data: data['size'])
+        client.populate_process_queue()
+        offsets = [client.process_queue.get()[0] for _ in range(4)]
+        self.assertEqual(offsets, [1, 3, 2, 0])
+
+    def test__populate_process_queue_Should_OrderByDecreasingCost_When_CostSequence(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}, {}], cost=[.1, .5, .3])
+        client.populate_process_queue()
+        offsets = [client.process_queue.get()[0] for _ in range(3)]
+        self.assertEqual(offsets, [1, 2, 0])
+
+    def test__populate_process_queue_Should_UseMeanCostForMissingOffsets_When_CostMapping(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}, {}, {}], cost={0: 1, 1: 5, 3: 3})
+        client.populate_process_queue()
+        offsets = [client.process_queue.get()[0] for _ in range(4)]
+        self.assertEqual(offsets, [1, 2, 3, 0])
+
+    def test__get_durations_Should_ReturnSecondsOfCompletedProcesses_When_Called(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}])
+        start_time = datetime.datetime(2021, 1, 1, 23, 59, 59)
+        client.processes = {
+            0: {'process': None, 'start_time': start_time, 'stop_time': start_time + datetime.timedelta(seconds=2.5), 'duration': None},
+            1: {'process': None, 'start_time': start_time, 'stop_time': None, 'duration': None}
+        }
+        self.assertEqual(client.get_durations(), {0: 2.5})
+
+    @patch('mpmq.mpmq.time.monotonic_ns', return_value=5000)
+    def test__add_process_Should_AddTimings_When_Called(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}])
+        client.queued_time = 1000
+        client.add_process(1, None)
+        self.assertEqual(client.timings[1]['queued'], 1000)
+        self.assertEqual(client.timings[1]['started'], 5000)
+        self.assertIsNone(client.timings[1]['done'])
+        self.assertEqual(client.run_start_time, 5000)
+
+    @patch('mpmq.MPmq.collect_results')
+    def test__complete_process_Should_AddTimingsAndTotals_When_Called(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}])
+        process_mock = Mock()
+        with patch('mpmq.mpmq.time.monotonic_ns', side_effect=[1000, 3000, 4000]):
+            client.queued_time = 500
+            client.add_process(0, process_mock)
+            client.complete_process(0)
+        self.assertEqual(client.timings[0]['done'], 3000)
+        self.assertEqual(client.timings[0]['joined'], 4000)
+        self.assertEqual(client.totals['queue_wait'], 500)
+        self.assertEqual(client.totals['run_time'], 2000)
+
+    @patch('mpmq.MPmq.collect_results')
+    def test__complete_process_Should_RemoveTimings_When_Lazy(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=iter([{}]))
+        client.add_process(0, None)
+        client.complete_process(0)
+        self.assertEqual(client.timings, {})
+        self.assertEqual(client.metrics()['summary']['completed'], 1)
+
+    def test__add_results_Should_AddUsage_When_ResultHasUsage(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}], pool=True)
+        client.add_process(0, None)
+        client.add_process(1, None)
+        client.add_results([
+            {'offset': 0, 'result': None, 'usage': {'pid': 11, 'cpu_time': .5, 'max_rss': 2048}},
+            {'offset': 1, 'result': None, 'usage': {'pid': 11, 'cpu_time': .25, 'max_rss': 4096}}
+        ])
+        self.assertEqual(client.timings[0]['cpu_time'], .5)
+        self.assertEqual(client.timings[1]['max_rss'], 4096)
+        self.assertIsNotNone(client.timings[1]['result'])
+        self.assertEqual(client.totals['cpu_time'], .75)
+        self.assertEqual(client.totals['max_rss'], 4096)
+        self.assertEqual(client.worker_usage, {11: {'tasks': 2, 'cpu_time': .75, 'max_rss': 4096}})
+
+    def test__add_results_Should_NotAddWorkerUsage_When_NotPool(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}])
+        client.add_process(0, None)
+        client.add_results({'offset': 0, 'result': None, 'usage': {'pid': 11, 'cpu_time': .5, 'max_rss': 2048}})
+        self.assertEqual(client.worker_usage, {})
+        self.assertEqual(client.totals['cpu_time'], .5)
+
+    def test__get_message_Should_RecordFirstMessageTime_When_LogRecord(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'))
+        client.add_process(4, None)
+        client.message_queue = Mock()
+        client.message_queue.get.return_value = (4, logging.INFO, LOG_MESSAGE, 'message', 1.5)
+        with patch('mpmq.mpmq.time.monotonic_ns', side_effect=[7000, 8000]):
+            client.get_message()
+            client.get_message()
+        self.assertEqual(client.timings[4]['first_message'], 7000)
+
+    def test__metrics_Should_ReturnExpected_When_Called(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}])
+        client.timings[0] = {
+            'queued': 1000000000, 'started': 2000000000, 'first_message': 2500000000, 'done': 4000000000,
+            'result': 3000000000, 'joined': None, 'cpu_time': 1.5, 'max_rss': 1024
+        }
+        client.run_start_time = 2000000000
+        client.run_stop_time = 5000000000
+        client.completed_processes = 1
+        client.totals = {'queue_wait': 1000000000, 'run_time': 2000000000, 'cpu_time': 1.5, 'max_rss': 1024}
+        result = client.metrics()
+        process = result['processes'][0]
+        self.assertEqual(process['queue_wait'], 1.0)
+        self.assertEqual(process['start_latency'], .5)
+        self.assertEqual(process['run_time'], 2.0)
+        self.assertEqual(process['result_latency'], 1.0)
+        self.assertIsNone(process['join_time'])
+        self.assertEqual(result['summary'], {
+            'completed': 1, 'active': 0, 'wall_time': 3.0, 'queue_wait': 1.0, 'run_time': 2.0, 'cpu_time': 1.5, 'max_rss': 1024})
+        self.assertEqual(result['workers'], {})
+
+    @patch('mpmq.MPmq.metrics', return_value={'processes': {}, 'workers': {}, 'summary': {'completed': 2}})
+    def test__dump_metrics_Should_ReturnExpected_When_Format(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'))
+        self.assertEqual(json.loads(client.dump_metrics()), {'processes': {}, 'workers': {}, 'summary': {'completed': 2}})
+        self.assertIn('mpmq_processes_completed_total 2\n', client.dump_metrics(format='prometheus'))
+        with self.assertRaises(ValueError):
+            client.dump_metrics(format='xml')
+
+    def test__get_duration_Should_ReturnExpected_When_AcrossMidnight(self, *patches):
+        stop_time = datetime.datetime(2021, 5, 6, 0, 0, 3, 100000)
+        start_time = datetime.datetime(2021, 5, 5, 23, 59, 58, 900000)
+        self.assertEqual(MPmq.get_duration(start_time, stop_time), '0:00:04')
+
+    def test__get_context_Should_ReturnNone_When_NotSpecified(self, *patches):
+        self.assertIsNone(MPmq.get_context(None, None, None))
+
+    @patch('mpmq.mpmq.multiprocessing.get_context')
+    def test__get_context_Should_ReturnContextOfStartMethod_When_StartMethod(self, get_context_patch, *patches):
+        self.assertEqual(MPmq.get_context('spawn', None, None), get_context_patch.return_value)
+        get_context_patch.assert_called_once_with('spawn')
+
+    def test__get_context_Should_RaiseValueError_When_StartMethodAndContext(self, *patches):
+        with self.assertRaises(ValueError):
+            MPmq.get_context('spawn', Mock(), None)
+
+    def test__get_context_Should_SetForkserverPreload_When_Preload(self, *patches):
+        context_mock = Mock()
+        context_mock.get_start_method.return_value = 'forkserver'
+        self.assertEqual(MPmq.get_context(None, context_mock, ('app.models', 'numpy')), context_mock)
+        context_mock.set_forkserver_preload.assert_called_once_with(['app.models', 'numpy'])
+
+    def test__get_context_Should_RaiseValueError_When_PreloadAndNotForkserver(self, *patches):
+        context_mock = Mock()
+        context_mock.get_start_method.return_value = 'spawn'
+        with self.assertRaises(ValueError):
+            MPmq.get_context(None, context_mock, ['app.models'])
+        with self.assertRaises(ValueError):
+            MPmq.get_context(None, None, ['app.models'])
+
+    def test__init_Should_CreateQueuesFromContext_When_Context(self, *patches):
+        context_mock = Mock()
+        client = MPmq(function=Mock(__name__='mockfunc'), context=context_mock, pool=True)
+        self.assertEqual(context_mock.Queue.call_count, 3)
+        self.assertEqual(client.message_queue, context_mock.Queue.return_value)
+        self.assertEqual(client.task_queue, context_mock.Queue.return_value)
+
+    def test__init_Should_CreateBoundedMessageQueue_When_MaxMessages(self, *patches):
+        context_mock = Mock()
+        client = MPmq(function=Mock(__name__='mockfunc'), context=context_mock, max_messages=100, message_policy='sample')
+        self.assertEqual(context_mock.Queue.mock_calls[0], call(100))
+        self.assertEqual(context_mock.Queue.mock_calls[1], call(0))
+        self.assertEqual(client.function.message_policy, 'sample')
+        self.assertEqual(client.function.max_messages, 100)
+
+    def test__init_Should_BlockMessages_When_MessagePolicyWithoutMaxMessages(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), message_policy='drop_oldest')
+        self.assertEqual(client.function.message_policy, 'block')
+
+    def test__init_Should_RaiseValueError_When_MaxMessagesOrMessagePolicyNotValid(self, *patches):
+        with self.assertRaises(ValueError):
+            MPmq(function=Mock(__name__='mockfunc'), max_messages=0)
+        with self.assertRaises(ValueError):
+            MPmq(function=Mock(__name__='mockfunc'), max_messages=10, message_policy='drop_newest')
+
+    def test__add_results_Should_CountDroppedMessages_When_ResultHasDropped(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}], max_messages=10, message_policy='sample')
+        client.add_process(0, None)
+        client.add_process(1, None)
+        client.add_results({'offset': 0, 'result': None, 'usage': None, 'dropped': 5})
+        client.add_results({'offset': 1, 'result': None, 'usage': None, 'dropped': 0})
+        self.assertEqual(client.dropped_messages, 5)
+        self.assertEqual(client.metrics()['summary']['dropped_messages'], 5)
+
+    def test__metrics_Should_NotIncludeDroppedMessages_When_NoMaxMessages(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'))
+        self.assertNotIn('dropped_messages', client.metrics()['summary'])
+
+    @patch('mpmq.mpmq.Process')
+    def test__start_next_process_Should_CreateProcessFromContext_When_Context(self, process_patch, *patches):
+        context_mock = Mock()
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}], context=context_mock)
+        client.populate_process_queue()
+        client.start_next_process()
+        context_mock.Process.assert_called_once_with(target=client.function, args=ANY, kwargs=ANY)
+        context_mock.Process.return_value.start.assert_called_once_with()
+        process_patch.assert_not_called()
+
+    def test__wake_Should_PutStartControlMessage_When_Called(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'))
+        client.message_queue = Mock()
+        client.wake()
+        client.message_queue.put_nowait.assert_called_once_with((None, None, CONTROL_MESSAGE, 'START', ANY))
+
+    def test__wake_Should_NotRaise_When_MessageQueueFull(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), max_messages=1)
+        client.message_queue = Mock()
+        client.message_queue.put_nowait.side_effect = [Full()]
+        client.wake()
+        client.message_queue.put_nowait.assert_called_once_with((None, None, CONTROL_MESSAGE, 'START', ANY))
+
+    @patch('mpmq.MPmq.populate_process_queue')
+    def test__start_processes_Should_RegisterWithSession_When_Session(self, *patches):
+        session_mock = Mock()
+        client = MPmq(function=Mock(__name__='mockfunc'), session=session_mock, priority=3)
+        client.start_processes()
+        session_mock.register.assert_called_once_with(client, priority=3)
+
+    def test__stop_Should_UnregisterFromSession_When_Session(self, *patches):
+        session_mock = Mock()
+        client = MPmq(function=Mock(__name__='mockfunc'), session=session_mock)
+        client.stop()
+        session_mock.unregister.assert_called_once_with(client)
+
+    def test__init_Should_RaiseValueError_When_MessageBatchSizeInvalid(self, *patches):
+        with self.assertRaises(ValueError):
+            MPmq(function=Mock(__name__='mockfunc'), message_batch_size=0)
+
+    def test__format_message_Should_ReturnExpected_When_Called(self, *patches):
+        self.assertEqual(MPmq.format_message(logging.DEBUG, 'message'), 'message')
+        self.assertEqual(MPmq.format_message(logging.INFO, 'message'), 'INFO: message')
+        self.assertEqual(MPmq.format_message(logging.WARNING, 'message'), 'WARN: message')
+        self.assertEqual(MPmq.format_message(logging.ERROR, 'message'), 'ERROR: message')
+        self.assertEqual(MPmq.format_message(logging.CRITICAL, 'message'), 'ERROR: message')
+
+    def test__get_message_Should_BlockOnMessageQueue_When_Called(self, *patches):
+        process_data = [{'range': '0-1'}]
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=process_data)
+
+        message_queue_mock = Mock()
+        message_queue_mock.get.return_value = '#0-DONE'
+        client.message_queue = message_queue_mock
+
+        client.get_message()
+        message_queue_mock.get.assert_called_once_with(True, WAIT_TIMEOUT)
+
+    def test__get_message_Should_RaiseEmpty_When_NoMessageWithinTimeout(self, *patches):
+        process_data = [{'range': '0-1'}]
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=process_data)
+
+        message_queue_mock = Mock()
+        message_queue_mock.get.side_effect = Empty('empty')
+        client.message_queue = message_queue_mock
+        with self.assertRaises(Empty):
+            client.get_message(timeout=.1)
+        message_queue_mock.get.assert_called_once_with(True, .1)
+
     def test__get_message_Should_RaiseValueError_When_Malformed(self, *patches):
         process_data = [{'range': '0-1'}]
         client = MPmq(function=Mock(__name__='mockfunc'), process_data=process_data)
@@ -284,6 +1131,346 @@ class TestMPmq(unittest.TestCase):
         client.processes = {'0': {'active': True}}
         client.process_control_message('0', 'DONE')
 
+    @patch('mpmq.MPmq.complete_process')
+    def test__process_control_message_Should_IgnoreDone_When_ProcessAlreadyEnded(self, complete_process_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}])
+        client.processes = {0: {'stop_time': datetime.datetime.now()}}
+        client.process_control_message(0, 'DONE')
+        complete_process_patch.assert_not_called()
+
+    @patch('mpmq.MPmq.purge_process_queue')
+    def test__stop_on_error_Should_OnlyPurgeProcessQueue_When_NotFailFast(self, purge_process_queue_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}])
+        client.stop_on_error()
+        purge_process_queue_patch.assert_called_once_with()
+        self.assertIsNone(client.stop_event)
+        self.assertIsNone(client.stop_deadline)
+
+    @patch('mpmq.mpmq.time.monotonic_ns', return_value=1000)
+    @patch('mpmq.MPmq.purge_process_queue')
+    def test__stop_on_error_Should_SetStopEvent_When_FailFast(self, purge_process_queue_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}], fail_fast=True, grace_period=2)
+        client.stop_event = Mock()
+        client.retry_queue = [(0, 1, {})]
+        client.stop_on_error()
+        client.stop_on_error()
+        client.stop_event.set.assert_called_once_with()
+        self.assertEqual(client.stop_deadline, 1000 + 2e9)
+        self.assertEqual(client.retry_queue, [])
+
+    @patch('mpmq.MPmq.check_stopping')
+    @patch('mpmq.MPmq.check_active_processes')
+    def test__check_processes_Should_CheckStopping_When_Stopping(self, check_active_processes_patch, check_stopping_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}], fail_fast=True)
+        client.stop_deadline = 1
+        client.check_processes()
+        check_stopping_patch.assert_called_once()
+        check_active_processes_patch.assert_not_called()
+
+    def test__check_stopping_Should_Return_When_ProcessesRunningWithinGracePeriod(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}], fail_fast=True)
+        process_mock = Mock()
+        process_mock.is_alive.return_value = True
+        client.add_process(0, process_mock)
+        client.task_ends = {0}
+        client.stop_deadline = 100
+        client.check_stopping(50)
+        process_mock.terminate.assert_not_called()
+
+    @patch('mpmq.MPmq.collect_results')
+    def test__check_stopping_Should_TerminateProcesses_When_GracePeriodPassed(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}], fail_fast=True)
+        process0_mock = Mock()
+        process0_mock.is_alive.side_effect = [True, False]
+        process1_mock = Mock()
+        process1_mock.is_alive.side_effect = [True, True]
+        client.add_process(0, process0_mock)
+        client.add_process(1, process1_mock)
+        client.task_ends = {0, 1}
+        client.stop_deadline = 100
+        with self.assertRaises(NoActiveProcesses):
+            client.check_stopping(150)
+        process0_mock.terminate.assert_called_once_with()
+        process0_mock.kill.assert_not_called()
+        process1_mock.terminate.assert_called_once_with()
+        process1_mock.kill.assert_called_once_with()
+        self.assertEqual(client.pending_results, set())
+        self.assertEqual(client.active_processes, 0)
+
+    @patch('mpmq.MPmq.collect_results')
+    def test__check_stopping_Should_RaiseNoActiveProcesses_When_PoolWorkersIdle(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}] * 4, processes_to_start=2, pool=True, fail_fast=True)
+        client.workers = [Mock(), Mock()]
+        client.worker_status[:] = [1, 1, -1, 3, 3, -1]
+        client.stop_deadline = 100
+        with self.assertRaises(NoActiveProcesses):
+            client.check_stopping(50)
+        for worker in client.workers:
+            worker.terminate.assert_not_called()
+
+    @patch('mpmq.MPmq.check_active_processes')
+    def test__check_processes_Should_NotCheck_When_CheckedWithinWaitTimeout(self, check_active_processes_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}])
+        client.check_processes()
+        client.check_processes()
+        check_active_processes_patch.assert_called_once()
+
+    @patch('mpmq.MPmq.start_waiting_processes')
+    def test__check_processes_Should_QueueRetries_When_Ready(self, start_waiting_processes_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}])
+        client.active_processes = 1
+        client.retry_queue = [(0, 1, {'range': '2-3'})]
+        client.check_processes()
+        self.assertEqual(client.process_queue.get(), (1, {'range': '2-3'}))
+        self.assertEqual(client.retry_queue, [])
+        start_waiting_processes_patch.assert_called_once_with()
+
+    def test__check_processes_Should_RaiseNoActiveProcesses_When_LastProcessLost(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}])
+        client.active_processes = 1
+
+        def check_active_processes(now):
+            client.active_processes = 0
+
+        client.check_active_processes = check_active_processes
+        with self.assertRaises(NoActiveProcesses):
+            client.check_processes()
+
+    @patch('mpmq.MPmq.lose_process')
+    @patch('mpmq.MPmq.collect_results')
+    @patch('mpmq.mpmq.wait')
+    def test__check_active_processes_Should_LoseProcess_When_ExitedWithoutResult(self, wait_patch, collect_results_patch, lose_process_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}])
+        process0_mock = Mock(sentinel=10, exitcode=-9)
+        process1_mock = Mock(sentinel=11, exitcode=0)
+        client.add_process(0, process0_mock)
+        client.add_process(1, process1_mock)
+        client.task_ends = {0, 1}
+        # the result of offset 1 was received
+        client.pending_results.discard(1)
+        wait_patch.return_value = [10, 11]
+        client.check_active_processes(client.timings[0]['started'])
+        # offset 1 returned its result so it is completed rather than lost
+        self.assertEqual(collect_results_patch.mock_calls, [call(), call(1)])
+        lose_process_patch.assert_called_once_with(0, 'exited with exitcode -9')
+
+    @patch('mpmq.MPmq.lose_process')
+    @patch('mpmq.MPmq.collect_results')
+    @patch('mpmq.mpmq.wait', return_value=[10])
+    def test__check_active_processes_Should_CompleteProcess_When_ExitedWithResultBeforeDone(self, wait_patch, collect_results_patch, lose_process_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=iter([{}, {}]))
+        client.add_process(0, Mock(sentinel=10, exitcode=9))
+        client.active_processes = 1
+        client.task_ends = {0}
+        client.pending_results.discard(0)
+        client.check_active_processes(client.timings[0]['started'])
+        lose_process_patch.assert_not_called()
+        self.assertEqual(client.active_processes, 0)
+        self.assertEqual(client.completed_processes, 1)
+        self.assertEqual(client.task_ends, set())
+        # the DONE message of the process that may still arrive is ignored although its meta-data was released
+        self.assertNotIn(0, client.processes)
+        client.process_control_message(0, 'DONE')
+        self.assertEqual(client.completed_processes, 1)
+        self.assertEqual(client.exited_offsets, set())
+
+    @patch('mpmq.MPmq.lose_process')
+    @patch('mpmq.mpmq.wait', return_value=[])
+    def test__check_active_processes_Should_TerminateProcess_When_TaskTimeoutExceeded(self, wait_patch, lose_process_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}], task_timeout=2)
+        process_mock = Mock(sentinel=10)
+        client.add_process(0, process_mock)
+        client.task_ends = {0}
+        client.check_active_processes(client.timings[0]['started'] + 1e9)
+        process_mock.terminate.assert_not_called()
+        client.check_active_processes(client.timings[0]['started'] + 3e9)
+        process_mock.terminate.assert_called_once_with()
+        lose_process_patch.assert_called_once_with(0, 'timed out after 2 seconds')
+
+    @patch('mpmq.MPmq.start_worker')
+    @patch('mpmq.MPmq.lose_chunk')
+    @patch('mpmq.mpmq.wait')
+    def test__check_workers_Should_ReplaceWorker_When_WorkerExited(self, wait_patch, lose_chunk_patch, start_worker_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}] * 4, processes_to_start=2, pool=True)
+        client.workers = [Mock(sentinel=10), Mock(sentinel=11, exitcode=-9)]
+        client.worker_status[:] = [-1, -1, -1, 3, 2, 100]
+        wait_patch.return_value = [11]
+        client.check_workers(200)
+        lose_chunk_patch.assert_called_once_with(3, 2, 'exited with exitcode -9')
+        start_worker_patch.assert_called_once_with(1)
+        self.assertEqual(list(client.worker_status), [-1] * 6)
+
+    @patch('mpmq.MPmq.start_worker')
+    @patch('mpmq.MPmq.lose_chunk')
+    @patch('mpmq.mpmq.wait', return_value=[])
+    def test__check_workers_Should_TerminateWorker_When_TaskTimeoutExceeded(self, wait_patch, lose_chunk_patch, start_worker_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}] * 4, processes_to_start=2, pool=True, task_timeout=1)
+        client.workers = [Mock(sentinel=10), Mock(sentinel=11)]
+        client.worker_status[:] = [1, 0, 0, 3, 2, -1]
+        client.check_workers(2e9)
+        client.workers[0].terminate.assert_called_once_with()
+        client.workers[1].terminate.assert_not_called()
+        lose_chunk_patch.assert_called_once_with(1, 0, 'timed out after 1 seconds')
+        start_worker_patch.assert_called_once_with(0)
+
+    @patch('mpmq.MPmq.lose_process')
+    @patch('mpmq.MPmq.collect_results')
+    def test__lose_chunk_Should_LoseOffsetAndRequeueOthers_When_Called(self, collect_results_patch, lose_process_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}] * 4, pool=True, chunksize=3)
+        chunk = [(0, {'a': 0}), (1, {'a': 1}), (2, {'a': 2})]
+        client.chunks[2] = chunk
+        client.task_ends = {2}
+        for (offset, process_data) in chunk:
+            client.add_process(offset, None, process_data)
+        # offset 0 completed but its result was lost with the chunk
+        client.processes[0]['stop_time'] = datetime.datetime.now()
+        client.active_processes = 2
+        client.completed_processes = 1
+        client.lose_chunk(2, 1, 'exited with exitcode -9')
+        self.assertEqual(lose_process_patch.mock_calls, [
+            call(0, None, process_data={'a': 0}),
+            call(1, 'exited with exitcode -9', process_data={'a': 1}),
+            call(2, None, process_data={'a': 2})
+        ])
+        self.assertEqual(client.active_processes, 3)
+        self.assertEqual(client.completed_processes, 0)
+        self.assertEqual(client.task_ends, set())
+        self.assertEqual(client.chunks, {})
+
+    def test__lose_process_Should_ScheduleRetryWithBackoff_When_AttemptsLeft(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}], retries=2, retry_backoff=.5)
+        client.add_process(0, Mock(), {'range': '0-1'})
+        client.task_ends = {0}
+        client.lose_process(0, 'exited with exitcode -9')
+        client.processes[0]['stop_time'] = None
+        client.lose_process(0, 'exited with exitcode -9')
+        (ready1, _, _) = client.retry_queue[0]
+        (ready2, offset, process_data) = client.retry_queue[1]
+        self.assertEqual((offset, process_data), (0, {'range': '0-1'}))
+        self.assertGreater(ready2 - ready1, .5e9)
+        self.assertEqual(client.attempts, {0: 3})
+        self.assertEqual(client.active_processes, -1)
+        self.assertEqual(client.task_ends, set())
+        self.assertNotIn(0, client._results)
+
+    @patch('mpmq.MPmq.purge_process_queue')
+    def test__lose_process_Should_SetProcessLostResult_When_NoAttemptsLeft(self, purge_process_queue_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}])
+        client.add_process(0, Mock())
+        client.lose_process(0, 'timed out after 2 seconds')
+        result = client._results[0]
+        self.assertIsInstance(result, ProcessLost)
+        self.assertEqual((result.offset, result.reason, result.attempts), (0, 'timed out after 2 seconds', 1))
+        self.assertEqual(client.completed_processes, 1)
+        self.assertEqual(client.pending_results, set())
+        self.assertIsNotNone(client.processes[0]['stop_time'])
+        purge_process_queue_patch.assert_called_once_with()
+
+    def test__lose_process_Should_RequeueOffset_When_NoReason(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}], pool=True)
+        client.lose_process(0, None, process_data={'range': '0-1'})
+        self.assertEqual(client.process_queue.get(), (0, {'range': '0-1'}))
+        self.assertEqual(client.attempts, {})
+        self.assertEqual(client.retry_queue, [])
+
+    def test__process_control_message_Should_RaiseNoActiveProcesses_When_ControlDoneWithoutOffset(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[])
+        with self.assertRaises(NoActiveProcesses):
+            client.process_control_message(None, 'DONE')
+
+    def test__start_processes_Should_PutDoneControlMessage_When_NothingToExecute(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[])
+        client.message_queue = Mock()
+        client.start_processes()
+        client.message_queue.put.assert_called_once_with((None, None, CONTROL_MESSAGE, 'DONE', ANY))
+
+    def test__init_Should_CreateCheckpoint_When_CheckpointIsPath(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), checkpoint='run.ckpt')
+        self.assertEqual(client.checkpoint.path, 'run.ckpt')
+        checkpoint_mock = Mock()
+        client = MPmq(function=Mock(__name__='mockfunc'), checkpoint=checkpoint_mock)
+        self.assertEqual(client.checkpoint, checkpoint_mock)
+
+    def test__populate_process_queue_Should_ResumeCheckpointedResults_When_Checkpoint(self, *patches):
+        process_data = [{'range': '0-1'}, {'range': '2-3'}, {'range': '4-5'}]
+        checkpoint_mock = Mock()
+        checkpoint_mock.load.return_value = {
+            0: (Checkpoint.get_digest({'range': '0-1'}), '--result0--'),
+            2: (Checkpoint.get_digest({'range': 'changed'}), '--result2--')
+        }
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=process_data, checkpoint=checkpoint_mock)
+        client.populate_process_queue()
+        self.assertEqual(client._results, {0: '--result0--'})
+        self.assertEqual(client.resumed_processes, 1)
+        self.assertEqual([client.process_queue.get() for _ in range(2)], [(1, {'range': '2-3'}), (2, {'range': '4-5'})])
+        self.assertTrue(client.process_queue.empty())
+
+    def test__populate_process_queue_Should_ResumeCheckpointedResults_When_ProcessDataIsIterator(self, *patches):
+        process_data = ({'range': index} for index in range(3))
+        checkpoint_mock = Mock()
+        checkpoint_mock.load.return_value = {1: (Checkpoint.get_digest({'range': 1}), '--result1--')}
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=process_data, checkpoint=checkpoint_mock)
+        client.populate_process_queue()
+        self.assertEqual([client.process_queue.get() for _ in range(2)], [(0, {'range': 0}), (2, {'range': 2})])
+        self.assertTrue(client.process_queue.empty())
+        self.assertEqual(client._results, {1: '--result1--'})
+
+    def test__populate_process_queue_Should_AddCachedResults_When_Cache(self, *patches):
+        process_data = [{'range': '0-1'}, {'range': '2-3'}]
+        cache_mock = Mock()
+        cache_mock.get.side_effect = [(True, '--result0--'), (False, None)]
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=process_data, cache=cache_mock)
+        client.cache_namespace = '--namespace--'
+        client.populate_process_queue()
+        cache_mock.get.assert_called_with(ResultCache.get_key('--namespace--', {'range': '2-3'}))
+        self.assertEqual(client._results, {0: '--result0--'})
+        self.assertEqual(client.process_queue.get(), (1, {'range': '2-3'}))
+        self.assertTrue(client.process_queue.empty())
+        self.assertEqual((client.cache_hits, client.cache_misses), (1, 1))
+        summary = client.metrics()['summary']
+        self.assertEqual((summary['cache_hits'], summary['cache_misses']), (1, 1))
+
+    def test__start_processes_Should_GetCacheNamespace_When_Cache(self, *patches):
+        cache_mock = Mock()
+        cache_mock.get.return_value = (True, '--result--')
+        cache_mock.get_namespace.return_value = '--namespace--'
+        function_mock = Mock(__name__='mockfunc')
+        client = MPmq(function=function_mock, process_data=[{}], shared_data={'key': 'value'}, cache=cache_mock)
+        client.message_queue = Mock()
+        client.start_processes()
+        cache_mock.get_namespace.assert_called_once_with(function_mock, {'key': 'value'})
+        self.assertEqual(client.cache_namespace, '--namespace--')
+
+    @patch('mpmq.mpmq.load_result', side_effect=lambda result: result)
+    def test__add_results_Should_AddToCache_When_Cache(self, *patches):
+        cache_mock = Mock()
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}], cache=cache_mock)
+        client.cache_namespace = '--namespace--'
+        client.add_process(0, None, {'range': '0-1'})
+        client.add_process(1, None, {'range': '2-3'})
+        client.add_results({'offset': 0, 'result': '--result0--'})
+        client.add_results({'offset': 1, 'result': Exception('error')})
+        cache_mock.put.assert_called_once_with(ResultCache.get_key('--namespace--', {'range': '0-1'}), '--result0--')
+
+    @patch('mpmq.mpmq.load_result', side_effect=lambda result: result)
+    def test__add_results_Should_AddToCheckpoint_When_Checkpoint(self, *patches):
+        checkpoint_mock = Mock()
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}], checkpoint=checkpoint_mock)
+        client.add_process(0, None, {'range': '0-1'})
+        client.add_process(1, None, {'range': '2-3'})
+        client.add_results({'offset': 0, 'result': '--result0--'})
+        client.add_results({'offset': 1, 'result': Exception('error')})
+        checkpoint_mock.add.assert_called_once_with(0, {'range': '0-1'}, '--result0--')
+
+    @patch('mpmq.mpmq.load_result', side_effect=lambda result: result)
+    def test__add_results_Should_AddChunkToCheckpoint_When_Pool(self, *patches):
+        checkpoint_mock = Mock()
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}], pool=True, checkpoint=checkpoint_mock)
+        client.chunks[1] = [(0, {'range': '0-1'}), (1, {'range': '2-3'})]
+        client.add_results([{'offset': 0, 'result': 0}, {'offset': 1, 'result': 1}])
+        self.assertEqual(checkpoint_mock.add.mock_calls, [call(0, {'range': '0-1'}, 0), call(1, {'range': '2-3'}, 1)])
+        self.assertEqual(client.chunks, {})
+
     def test__process_message_Should_DoNothing_When_Called(self, *patches):
         process_data = [{'range': '0-1'}]
         client = MPmq(function=Mock(__name__='mockfunc'), process_data=process_data)
@@ -321,6 +1508,196 @@ class TestMPmq(unittest.TestCase):
         process_control_message_patch.assert_called_once_with('0', 'DONE')
         self.assertTrue(call(None, '#0-this is message1') in process_message_patch.mock_calls)
 
+    @patch('mpmq.MPmq.start_processes')
+    @patch('mpmq.MPmq.process_messages')
+    @patch('mpmq.MPmq.process_message')
+    @patch('mpmq.MPmq.process_control_message')
+    @patch('mpmq.MPmq.get_message')
+    def test__run_Should_ProcessCoalescedMessages_When_Coalesce(self, get_message_patch, process_control_message_patch, process_message_patch, process_messages_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}], coalesce='all', refresh_interval=60)
+        get_message_patch.side_effect = [
+            {'offset': 0, 'control': None, 'message': 'message1'},
+            {'offset': 1, 'control': None, 'message': 'message2'},
+            {'offset': 0, 'control': None, 'message': 'message3'},
+            {'offset': 0, 'control': 'DONE', 'message': '#0-DONE'},
+            NoActiveProcesses()
+        ]
+        client.run()
+        process_message_patch.assert_not_called()
+        process_control_message_patch.assert_called_once_with(0, 'DONE')
+        # the first message is refreshed on the next message, the rest once processing stops
+        self.assertEqual(process_messages_patch.mock_calls, [
+            call({0: ['message1']}),
+            call({1: ['message2'], 0: ['message3']})
+        ])
+
+    def test__coalesce_message_Should_KeepLatestMessage_When_CoalesceLatest(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), coalesce='latest')
+        client.coalesce_message(0, 'message1')
+        client.coalesce_message(1, 'message2')
+        client.coalesce_message(0, 'message3')
+        self.assertEqual(client.coalesced_messages, {0: ['message3'], 1: ['message2']})
+
+    @patch('mpmq.MPmq.process_messages')
+    def test__refresh_messages_Should_WaitForRefreshInterval_When_NotForced(self, process_messages_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), coalesce='all', refresh_interval=60)
+        client.coalesce_message(0, 'message1')
+        client.refresh_messages()
+        client.coalesce_message(0, 'message2')
+        client.refresh_messages()
+        process_messages_patch.assert_called_once_with({0: ['message1']})
+        self.assertEqual(client.coalesced_messages, {0: ['message2']})
+        client.refresh_messages(force=True)
+        process_messages_patch.assert_called_with({0: ['message2']})
+        self.assertEqual(client.coalesced_messages, {})
+
+    @patch('mpmq.MPmq.process_messages')
+    def test__refresh_messages_Should_NotCallProcessMessages_When_NoMessages(self, process_messages_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), coalesce='all')
+        client.refresh_messages(force=True)
+        process_messages_patch.assert_not_called()
+
+    @patch('mpmq.MPmq.process_message')
+    def test__process_messages_Should_CallProcessMessage_When_NotOverriden(self, process_message_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'))
+        client.process_messages({1: ['message1', 'message2'], 0: ['message3']})
+        self.assertEqual(process_message_patch.mock_calls, [call(1, 'message1'), call(1, 'message2'), call(0, 'message3')])
+
+    def test__get_message_timeout_Should_ReturnTimeUntilRefresh_When_CoalescedMessages(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), coalesce='all', refresh_interval=.2)
+        self.assertEqual(client.get_message_timeout(), WAIT_TIMEOUT)
+        client.coalesce_message(0, 'message1')
+        with patch('mpmq.mpmq.time.monotonic', return_value=10):
+            client.refresh_time = 10.1
+            self.assertAlmostEqual(client.get_message_timeout(), .1)
+            client.refresh_time = 5
+            self.assertEqual(client.get_message_timeout(), 0)
+
+    def test__init_Should_RaiseValueError_When_CoalesceNotValid(self, *patches):
+        with self.assertRaises(ValueError):
+            MPmq(function=Mock(__name__='mockfunc'), coalesce='first')
+        with self.assertRaises(ValueError):
+            MPmq(function=Mock(__name__='mockfunc'), coalesce='all', refresh_interval=-1)
+
+    def test__pop_results_Should_ReturnAllResultsInArrivalOrder_When_NotOrdered(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'))
+        client._results = {2: '--result2--', 0: '--result0--'}
+        self.assertEqual(client.pop_results(False), [(2, '--result2--'), (0, '--result0--')])
+        self.assertEqual(client._results, {})
+
+    def test__pop_results_Should_ReturnNextResultsInOffsetOrder_When_Ordered(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'))
+        client._results = {1: '--result1--', 3: '--result3--', 0: '--result0--'}
+        self.assertEqual(client.pop_results(True), [(0, '--result0--'), (1, '--result1--')])
+        self.assertEqual(client._results, {3: '--result3--'})
+        self.assertEqual(client.next_result_offset, 2)
+
+    def test__can_start_process_Should_ReturnFalse_When_ReorderBufferFull(self, *patches):
+        process_data = [{} for _ in range(20)]
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=process_data, processes_to_start=4)
+        client.reorder_buffer = 3
+        client.active_processes = 1
+        client._results = {5: '--result5--', 6: '--result6--'}
+        self.assertFalse(client.can_start_process())
+        client._results = {5: '--result5--'}
+        self.assertTrue(client.can_start_process())
+
+    def test__can_start_process_Should_ReturnTrue_When_ReorderBufferFullAndNoActiveProcesses(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), processes_to_start=4)
+        client.reorder_buffer = 1
+        client._results = {5: '--result5--', 6: '--result6--'}
+        self.assertTrue(client.can_start_process())
+
+    @patch('mpmq.MPmq.final')
+    @patch('mpmq.MPmq.receive_pending_results')
+    @patch('mpmq.MPmq.start_processes')
+    @patch('mpmq.MPmq.process_next_message')
+    def test__imap_results_Should_CallExpected_When_Called(self, process_next_message_patch, start_processes_patch, receive_pending_results_patch, final_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}, {}])
+        client.result_queue = Mock()
+        process_next_message_patch.side_effect = [None, Empty('empty'), None, NoActiveProcesses()]
+        self.assertEqual(list(client.imap_results()), [])
+        start_processes_patch.assert_called_once_with()
+        self.assertEqual(len(process_next_message_patch.mock_calls), 4)
+        receive_pending_results_patch.assert_called_once_with()
+        client.result_queue.close.assert_called_once_with()
+        final_patch.assert_called_once_with()
+
+    @patch('mpmq.MPmq.final')
+    @patch('mpmq.MPmq.start_processes')
+    @patch('mpmq.MPmq.process_next_message')
+    def test__imap_results_Should_YieldResultsInOffsetOrder_When_Ordered(self, process_next_message_patch, start_processes_patch, final_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}, {}])
+        arrivals = [{1: '--result1--'}, {2: '--result2--'}, {0: '--result0--'}]
+
+        def process_next_message():
+            if not arrivals:
+                raise NoActiveProcesses()
+            client._results.update(arrivals.pop(0))
+
+        process_next_message_patch.side_effect = process_next_message
+        results = list(client.imap_results(ordered=True))
+        self.assertEqual(results, [(0, '--result0--'), (1, '--result1--'), (2, '--result2--')])
+
+    @patch('mpmq.MPmq.final')
+    @patch('mpmq.MPmq.start_processes')
+    @patch('mpmq.MPmq.process_next_message')
+    def test__imap_results_Should_YieldResultsInArrivalOrder_When_NotOrdered(self, process_next_message_patch, start_processes_patch, final_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}, {}])
+        arrivals = [{1: '--result1--'}, {2: '--result2--'}, {0: '--result0--'}]
+
+        def process_next_message():
+            if not arrivals:
+                raise NoActiveProcesses()
+            client._results.update(arrivals.pop(0))
+
+        process_next_message_patch.side_effect = process_next_message
+        results = list(client.imap_results())
+        self.assertEqual(results, [(1, '--result1--'), (2, '--result2--'), (0, '--result0--')])
+        self.assertEqual(client._results, {})
+
+    @patch('mpmq.MPmq.final')
+    @patch('mpmq.MPmq.terminate_processes')
+    @patch('mpmq.MPmq.start_processes')
+    @patch('mpmq.MPmq.process_next_message')
+    def test__imap_results_Should_TerminateProcesses_When_ClosedEarly(self, process_next_message_patch, start_processes_patch, terminate_processes_patch, final_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}, {}])
+
+        def process_next_message():
+            client._results[0] = '--result0--'
+
+        process_next_message_patch.side_effect = process_next_message
+        generator = client.imap_results()
+        self.assertEqual(next(generator), (0, '--result0--'))
+        generator.close()
+        terminate_processes_patch.assert_called_once_with()
+        final_patch.assert_called_once_with()
+
+    @patch('mpmq.MPmq.final')
+    @patch('mpmq.mpmq.discard_result')
+    @patch('mpmq.MPmq.terminate_processes')
+    @patch('mpmq.MPmq.start_processes')
+    @patch('mpmq.MPmq.process_next_message')
+    def test__imap_results_Should_DiscardUnconsumedResults_When_ClosedEarly(self, process_next_message_patch, start_processes_patch, terminate_processes_patch, discard_result_patch, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}, {}, {}])
+        client.result_queue = Mock()
+        client.result_queue.get.side_effect = [{'offset': 2, 'result': '--handle2--'}, Empty('empty')]
+
+        def process_next_message():
+            client._results[0] = '--result0--'
+
+        process_next_message_patch.side_effect = process_next_message
+        generator = client.imap_results(ordered=True)
+        next(generator)
+        client._results[1] = '--handle1--'
+        generator.close()
+        self.assertEqual(discard_result_patch.mock_calls, [call('--handle1--'), call('--handle2--')])
+
+    def test__imap_results_Should_RaiseValueError_When_BufferSizeInvalid(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'))
+        with self.assertRaises(ValueError):
+            next(client.imap_results(ordered=True, buffer_size=0))
+
     @patch('mpmq.MPmq.run')
     def test__execute_run_Should_CallExepcted_When_Called(self, run_patch, *patches):
         process_data = [{'range': '0-1'}]
@@ -378,6 +1755,17 @@ class TestMPmq(unittest.TestCase):
         client.execute(raise_if_error=True)
         check_results_patch.assert_called_once_with(get_results_patch.return_value)
 
+    def test__get_results_Should_ReturnNoneForOffsetsThatNeverRan_When_PurgedOutOfOrder(self, *patches):
+        client = MPmq(function=Mock(__name__='mockfunc'), process_data=[{}] * 8, cost=lambda data: 1)
+        client.receive_pending_results = Mock()
+        client._results = {5: 5, 6: ValueError('error'), 7: 7}
+        results = client.get_results()
+        self.assertEqual(len(results), 8)
+        self.assertEqual(results[:5], [None] * 5)
+        self.assertIsInstance(results[6], ValueError)
+        with self.assertRaisesRegex(Exception, 'offset 6 had errors'):
+            MPmq.check_results(results)
+
     def test__check_results_Should_RaiseException_When_ProcessResultException(self, *patches):
         results = [{}, ValueError('error'), {}, ValueError('error')]
         with self.assertRaises(Exception):
@@ -0,0 +1,147 @@
+
+# Copyright (c) 2021 Intel Corporation
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#      http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+from mock import patch
+from mock import Mock
+
+from mpmq.session import Session
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class TestSession(unittest.TestCase):
+
+    def setUp(self):
+        """
+        """
+        pass
+
+    def tearDown(self):
+        """
+        """
+        pass
+
+    @patch('mpmq.session.os.cpu_count', return_value=8)
+    def test__init__Should_DefaultMaxProcessesToCpuCount_When_NotSpecified(self, *patches):
+        session = Session()
+        self.assertEqual(session.max_processes, 8)
+
+    def test__init__Should_RaiseValueError_When_MaxProcessesInvalid(self, *patches):
+        with self.assertRaises(ValueError):
+            Session(max_processes=-1)
+
+    def test__acquire_Should_ReturnTrue_When_JobNotRegistered(self, *patches):
+        session = Session(max_processes=1)
+        self.assertTrue(session.acquire(Mock()))
+        self.assertEqual(session.active_processes, 0)
+
+    def test__acquire_Should_ReturnFalseAndWait_When_NoFreeSlots(self, *patches):
+        session = Session(max_processes=1)
+        job1 = Mock()
+        job2 = Mock()
+        session.register(job1)
+        session.register(job2)
+        self.assertTrue(session.acquire(job1))
+        self.assertFalse(session.acquire(job2))
+        self.assertEqual(session.waiting, {job2})
+
+    def test__acquire_Should_ReturnFalseAndWakeContender_When_WaitingJobHasFewerSlots(self, *patches):
+        session = Session(max_processes=3)
+        job1 = Mock()
+        job2 = Mock()
+        session.register(job1)
+        session.register(job2)
+        session.acquire(job1)
+        session.acquire(job1)
+        session.waiting.add(job2)
+        self.assertFalse(session.acquire(job1))
+        job2.wake.assert_called_once_with()
+        self.assertTrue(session.acquire(job2))
+        self.assertEqual(session.waiting, {job1})
+
+    def test__acquire_Should_PreferHigherPriority_When_Contended(self, *patches):
+        session = Session(max_processes=3)
+        job1 = Mock()
+        job2 = Mock()
+        session.register(job1, priority=1)
+        session.register(job2)
+        session.acquire(job1)
+        session.waiting.add(job2)
+        self.assertTrue(session.acquire(job1))
+        job2.wake.assert_not_called()
+
+    def test__release_Should_FreeSlotAndWakeWaiting_When_Called(self, *patches):
+        session = Session(max_processes=1)
+        job1 = Mock()
+        job2 = Mock()
+        session.register(job1)
+        session.register(job2)
+        session.acquire(job1)
+        session.acquire(job2)
+        session.release(job1)
+        self.assertEqual(session.active_processes, 0)
+        self.assertEqual(session.jobs[job1]['held'], 0)
+        job2.wake.assert_called_once_with()
+
+    def test__release_Should_DoNothing_When_NoSlotsHeld(self, *patches):
+        session = Session(max_processes=1)
+        job1 = Mock()
+        session.register(job1)
+        session.release(job1)
+        self.assertEqual(session.active_processes, 0)
+
+    def test__unregister_Should_ReleaseHeldSlotsAndWakeWaiting_When_Called(self, *patches):
+        session = Session(max_processes=2)
+        job1 = Mock()
+        job2 = Mock()
+        session.register(job1)
+        session.register(job2)
+        session.acquire(job1)
+        session.acquire(job1)
+        session.acquire(job2)
+        session.unregister(job1)
+        self.assertEqual(session.active_processes, 0)
+        self.assertNotIn(job1, session.jobs)
+        job2.wake.assert_called_once_with()
+
+    def test__withdraw_Should_WakeOtherWaitingJobs_When_JobWasWaiting(self, *patches):
+        session = Session(max_processes=2)
+        job1 = Mock()
+        job2 = Mock()
+        session.register(job1)
+        session.register(job2)
+        session.waiting.update({job1, job2})
+        session.withdraw(job1)
+        self.assertEqual(session.waiting, {job2})
+        job2.wake.assert_called_once_with()
+
+    def test__execute_Should_ReturnResultsOfAllJobs_When_Called(self, *patches):
+        session = Session(max_processes=2)
+        job1 = Mock()
+        job1.execute.return_value = ['--result1--']
+        job2 = Mock()
+        job2.execute.return_value = ['--result2--']
+        self.assertEqual(session.execute(job1, job2, raise_if_error=True), [['--result1--'], ['--result2--']])
+        job1.execute.assert_called_once_with(raise_if_error=True)
+
+    def test__execute_Should_RaiseException_When_JobRaises(self, *patches):
+        session = Session(max_processes=2)
+        job1 = Mock()
+        job1.execute.side_effect = Exception('job error')
+        job2 = Mock()
+        with self.assertRaises(Exception):
+            session.execute(job1, job2)
+        job2.execute.assert_called_once_with(raise_if_error=False)
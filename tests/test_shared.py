@@ -0,0 +1,183 @@
+
+# Copyright (c) 2021 Intel Corporation
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#      http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import array
+import unittest
+from mock import patch
+from mock import Mock
+
+from mpmq.shared import SharedBuffer
+from mpmq.shared import share_value
+from mpmq.shared import attach_value
+from mpmq.shared import attach_data
+from mpmq.shared import attach_arguments
+from mpmq.shared import share_result
+from mpmq.shared import load_result
+from mpmq.shared import discard_result
+from mpmq.shared import open_segment
+from mpmq.shared import ATTACHED_SEGMENTS
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class TestShared(unittest.TestCase):
+
+    def setUp(self):
+        """
+        """
+        self.segments = []
+
+    def tearDown(self):
+        """
+        """
+        for segment in self.segments:
+            ATTACHED_SEGMENTS.pop(segment.name, None)
+            segment.close()
+            segment.unlink()
+
+    def share(self, value):
+        (handle, segment) = share_value(value)
+        self.segments.append(segment)
+        return handle
+
+    def test__share_value_Should_ReturnNone_When_ValueNotShareable(self, *patches):
+        self.assertIsNone(share_value({'key': 'value'}))
+        self.assertIsNone(share_value('string'))
+
+    def test__attach_value_Should_ReturnReadOnlyView_When_Bytes(self, *patches):
+        handle = self.share(b'abcdef')
+        self.assertEqual(handle.kind, 'bytes')
+        self.assertEqual(handle.size, 6)
+        view = attach_value(handle)
+        self.assertIsInstance(view, memoryview)
+        self.assertTrue(view.readonly)
+        self.assertEqual(bytes(view), b'abcdef')
+
+    def test__attach_value_Should_ReturnWritableView_When_Bytearray(self, *patches):
+        handle = self.share(bytearray(b'abc'))
+        view = attach_value(handle)
+        self.assertFalse(view.readonly)
+        self.assertEqual(bytes(view), b'abc')
+
+    def test__attach_value_Should_ReturnTypedView_When_Array(self, *patches):
+        handle = self.share(array.array('i', [1, 2, 3]))
+        view = attach_value(handle)
+        self.assertEqual(view.format, 'i')
+        self.assertEqual(view.tolist(), [1, 2, 3])
+
+    def test__attach_value_Should_ReturnEmptyView_When_BytesEmpty(self, *patches):
+        handle = self.share(b'')
+        self.assertEqual(bytes(attach_value(handle)), b'')
+
+    @unittest.skipUnless(numpy, 'numpy is not installed')
+    def test__attach_value_Should_ReturnNdarray_When_Ndarray(self, *patches):
+        value = numpy.arange(6, dtype='int64').reshape(2, 3)
+        handle = self.share(value)
+        result = attach_value(handle)
+        self.assertIsInstance(result, numpy.ndarray)
+        self.assertTrue((result == value).all())
+
+    @patch('mpmq.shared.SharedMemory')
+    def test__attach_value_Should_AttachSegmentOnce_When_CalledMultipleTimes(self, shared_memory_patch, *patches):
+        shared_memory_patch.return_value.buf = bytearray(b'abc')
+        handle = SharedBuffer('--name--', 'bytearray', 3)
+        attach_value(handle)
+        attach_value(handle)
+        shared_memory_patch.assert_called_once_with(name='--name--', create=False, size=0, track=False)
+        ATTACHED_SEGMENTS.pop('--name--')
+
+    def test__attach_data_Should_ReplaceHandlesInDict_When_Called(self, *patches):
+        handle = self.share(b'abc')
+        result = attach_data({'blob': handle, 'count': 3})
+        self.assertEqual(bytes(result['blob']), b'abc')
+        self.assertEqual(result['count'], 3)
+
+    def test__attach_data_Should_ReturnData_When_NoHandles(self, *patches):
+        data = {'count': 3}
+        self.assertIs(attach_data(data), data)
+
+    def test__attach_arguments_Should_ReplaceHandles_When_Called(self, *patches):
+        handle = self.share(b'abc')
+        (args, kwargs) = attach_arguments(({'blob': handle}, 'arg'), {'blob': handle, 'offset': 0})
+        self.assertEqual(bytes(args[0]['blob']), b'abc')
+        self.assertEqual(args[1], 'arg')
+        self.assertEqual(bytes(kwargs['blob']), b'abc')
+        self.assertEqual(kwargs['offset'], 0)
+
+    def test__share_result_Should_ReturnResult_When_NoThreshold(self, *patches):
+        self.assertEqual(share_result(b'abc', None), b'abc')
+
+    def test__share_result_Should_ReturnResult_When_BelowThreshold(self, *patches):
+        self.assertEqual(share_result(b'abc', 4), b'abc')
+        self.assertEqual(share_result('abc', 4), 'abc')
+
+    def test__share_result_Should_ReturnResult_When_NotShareable(self, *patches):
+        self.assertEqual(share_result([1, 2, 3, 4, 5], 1), [1, 2, 3, 4, 5])
+
+    def test__load_result_Should_ReturnBytes_When_BytesShared(self, *patches):
+        handle = share_result(b'abcdef', 4)
+        self.assertIsInstance(handle, SharedBuffer)
+        self.assertEqual(load_result(handle), b'abcdef')
+
+    def test__load_result_Should_ReturnStr_When_StrShared(self, *patches):
+        handle = share_result('abcdéf', 4)
+        self.assertEqual(handle.kind, 'str')
+        self.assertEqual(load_result(handle), 'abcdéf')
+
+    def test__load_result_Should_ReturnBytearray_When_BytearrayShared(self, *patches):
+        handle = share_result(bytearray(b'abcdef'), 4)
+        result = load_result(handle)
+        self.assertIsInstance(result, bytearray)
+        self.assertEqual(result, bytearray(b'abcdef'))
+
+    def test__load_result_Should_RemoveSegment_When_Loaded(self, *patches):
+        handle = share_result(b'abcdef', 4)
+        load_result(handle)
+        with self.assertRaises(FileNotFoundError):
+            load_result(handle)
+
+    def test__load_result_Should_ReturnResult_When_NotSharedBuffer(self, *patches):
+        self.assertEqual(load_result('--result--'), '--result--')
+
+    def test__discard_result_Should_RemoveSegment_When_SharedBuffer(self, *patches):
+        handle = share_result(b'abcdef', 4)
+        discard_result(handle)
+        with self.assertRaises(FileNotFoundError):
+            load_result(handle)
+
+    def test__discard_result_Should_DoNothing_When_NotSharedBuffer(self, *patches):
+        discard_result('--result--')
+
+    @patch('mpmq.shared.resource_tracker')
+    @patch('mpmq.shared.SharedMemory')
+    def test__open_segment_Should_UnregisterCreatedSegment_When_UntrackedNotSupported(self, shared_memory_patch, resource_tracker_patch, *patches):
+        segment_mock = Mock(_name='/psm_name')
+        shared_memory_patch.side_effect = [TypeError('track'), segment_mock]
+        result = open_segment(size=10, track=False)
+        self.assertEqual(result, segment_mock)
+        resource_tracker_patch.unregister.assert_called_once_with('/psm_name', 'shared_memory')
+
+    @patch('mpmq.shared.resource_tracker')
+    @patch('mpmq.shared.SharedMemory')
+    def test__open_segment_Should_NotUnregisterAttachedSegment_When_UntrackedNotSupported(self, shared_memory_patch, resource_tracker_patch, *patches):
+        shared_memory_patch.side_effect = [TypeError('track'), Mock()]
+        open_segment(name='psm_name', track=False)
+        resource_tracker_patch.unregister.assert_not_called()